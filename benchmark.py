@@ -0,0 +1,197 @@
+# benchmark.py
+#
+# Offline benchmarks for the bot's hot paths. Binance is replaced by the local
+# stub in binance_stub.py and Telegram by fake_bot.FakeBot.
+#
+#   python benchmark.py                          # print results as JSON
+#   python benchmark.py -o bench.json            # save them
+#   python benchmark.py --compare bench.json     # exit 1 on >20% regressions
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import tempfile
+from datetime import datetime, timedelta
+
+import binance_api
+from binance_stub import start_stub
+from price_store import PriceStore
+from rate_limit import TokenBucket
+
+def _timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "repeat": repeat,
+        "min_ms": round(min(samples), 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+    }
+
+def _cold(func):
+    # every sample starts with empty caches and an empty price store so the
+    # full download is measured
+    def run():
+        from result_cache import RESULT_CACHE
+
+        binance_api.clear_cache()
+        RESULT_CACHE.clear()
+        binance_api.PRICE_STORE = PriceStore(tempfile.mkdtemp(prefix="dca-store-"))
+        func()
+    return run
+
+def bench_data_paths(results, repeat, years):
+    from dca_calculator import calculate_dca
+    from result_cache import RESULT_CACHE
+
+    end_dt = datetime.utcnow()
+    for interval, is_hourly in (("1d", False), ("1h", True)):
+        for n in years:
+            start_dt = end_dt - timedelta(days=365 * n)
+            results[f"get_closing_prices[{interval},{n}y,cold]"] = _timed(
+                _cold(lambda: binance_api.get_closing_prices("BTCUSDT", start_dt, end_dt, interval)),
+                repeat
+            )
+            calc = lambda: calculate_dca(1000.0, "BTCUSDT", start_dt, end_dt, 7 if not is_hourly else 24, is_hourly, 0.1)
+            results[f"calculate_dca[{interval},{n}y,cold]"] = _timed(_cold(calc), repeat)
+            results[f"calculate_dca[{interval},{n}y,warm]"] = _timed(calc, repeat)
+            memo = lambda: RESULT_CACHE.calculate(1000.0, "BTCUSDT", start_dt, end_dt, 7 if not is_hourly else 24, is_hourly, 0.1)
+            memo()
+            results[f"calculate_dca[{interval},{n}y,memoized]"] = _timed(memo, repeat)
+
+def bench_strategies(results, repeat, years):
+    from dca_calculator import compare_strategies, DEFAULT_STRATEGIES
+
+    # lump sum, plain DCA and every default strategy on one fetch; compare
+    # with calculate_dca[...,warm] for the cost of the extra strategies
+    end_dt = datetime.utcnow()
+    for interval, is_hourly in (("1d", False), ("1h", True)):
+        for n in years:
+            start_dt = end_dt - timedelta(days=365 * n)
+            run = lambda: compare_strategies(
+                1000.0, "BTCUSDT", start_dt, end_dt, 7 if not is_hourly else 24, is_hourly, 0.1
+            )
+            run()
+            results[f"compare_strategies[{interval},{n}y,x{len(DEFAULT_STRATEGIES) + 2},warm]"] = _timed(run, repeat)
+
+def bench_chart(results, repeat):
+    from chart import create_dca_plot
+    from dca_calculator import calculate_dca
+
+    end_dt = datetime.utcnow()
+    dca_result = calculate_dca(1000.0, "BTCUSDT", end_dt - timedelta(days=365), end_dt, 7, False, 0.1)
+    create_dca_plot(dca_result["purchase_history"], "BTCUSDT")  # pay the matplotlib import once
+    results["create_dca_plot[1y,weekly]"] = _timed(
+        lambda: create_dca_plot(dca_result["purchase_history"], "BTCUSDT"), repeat
+    )
+
+def bench_parsers(results, repeat, loops=2000):
+    from dca_calculator import persian_to_ascii, parse_investment_period, parse_investment_frequency
+
+    inputs = ["1 year", "۶ ماه", "هر ۲ ساعت", "every 3 days", "bi-weekly", "ماهانه"]
+
+    def run():
+        for _ in range(loops // len(inputs)):
+            for text in inputs:
+                persian_to_ascii(text)
+                parse_investment_period(text)
+                parse_investment_frequency(text)
+
+    results[f"parsers[x{loops}]"] = _timed(run, repeat)
+
+CONVERSATION = ["1000", "BTC/USDT", "period", "1 year", "no", "weekly", "0.1"]
+
+def bench_conversation(results, repeat):
+    from fake_bot import FakeBot
+    from data_store import DataStore
+    from commands import register_handlers
+
+    bot = FakeBot()
+    register_handlers(bot, DataStore())
+    chat_ids = iter(range(1, 10**9))
+
+    def run():
+        chat_id = next(chat_ids)  # fresh chat, so the per-chat rate limit never applies
+        bot.send_text(chat_id, "/start")
+        bot.press(chat_id, "lang_en")
+        for text in CONVERSATION:
+            bot.send_text(chat_id, text)
+        if bot.wait_for(chat_id, timeout=60) is None:
+            raise RuntimeError(f"No report for chat {chat_id}: {bot.sent.get(chat_id)}")
+
+    results["conversation[1y,weekly,cold]"] = _timed(_cold(run), repeat)
+    results["conversation[1y,weekly,warm]"] = _timed(run, repeat)
+
+def run_benchmarks(repeat=5, years=(1, 2, 3, 4, 5)):
+    stub = start_stub()
+    binance_api.BINANCE_API_URL = stub.url
+    # the stub is local; don't let the production weight budget throttle it
+    binance_api.WEIGHT_LIMITER = TokenBucket(rate=1e9, capacity=1e9)
+
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="dca-bench-")
+    cwd = os.getcwd()
+    os.chdir(workdir)  # charts are written relative to the working directory
+    try:
+        bench_parsers(results, repeat)
+        bench_data_paths(results, repeat, years)
+        bench_strategies(results, repeat, years)
+        bench_chart(results, repeat)
+        bench_conversation(results, repeat)
+    finally:
+        os.chdir(cwd)
+        stub.shutdown()
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "python": platform.python_version(),
+        "stub_requests": stub.request_count,
+        "results": results,
+    }
+
+def compare(report, baseline, threshold):
+    """Return names of benchmarks whose median exceeds baseline * threshold."""
+    regressions = []
+    for name, current in report["results"].items():
+        previous = baseline["results"].get(name)
+        if previous and current["median_ms"] > previous["median_ms"] * threshold:
+            regressions.append(
+                f"{name}: {previous['median_ms']:.1f} ms -> {current['median_ms']:.1f} ms"
+            )
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the DCA bot.")
+    parser.add_argument("-o", "--output", help="write the JSON report to this file")
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument("--years", default="1,2,3,4,5", help="comma-separated range lengths")
+    parser.add_argument("--compare", help="baseline JSON report to check against")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="allowed slowdown factor vs. the baseline (default 1.2)")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.repeat, [int(y) for y in args.years.split(",")])
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
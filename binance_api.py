@@ -1,114 +1,575 @@
 # binance_api.py
 
-import requests
+import os
 import time
 import logging
-from datetime import datetime
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+
+import numpy as np
+import requests
+
+from rate_limit import TokenBucket
+from metrics import Counter, Histogram
+from price_store import PRICE_STORE
 
 logger = logging.getLogger(__name__)
 
-# Simple in-memory cache: (symbol, start_ts, end_ts, interval) -> list of klines
-_KLINES_CACHE = {}
+# Overridable so benchmarks/load tests can point at a local stub (see binance_stub.py).
+BINANCE_API_URL = os.getenv("BINANCE_API_URL", "https://api.binance.com")
+
+# Binance allows 6000 request weight per minute per IP. We only budget a share
+# of it, shared by every user, so a burst of calculations can't get us banned.
+BINANCE_WEIGHT_PER_MINUTE = int(os.getenv("BINANCE_WEIGHT_PER_MINUTE", "1200"))
+KLINES_WEIGHT = 2
+TICKER_PRICE_WEIGHT = 2
+# the ticker of every symbol in one request
+ALL_TICKERS_WEIGHT = 4
+# Synthetic pairs ("SOL/TRY") are built from two USDT legs by cross_rates.py;
+# Binance's own symbols never contain the separator.
+CROSS_SEPARATOR = "/"
+# Rows per chunk when iter_closing_prices reads from the price store.
+STREAM_CHUNK_ROWS = 8192
+WEIGHT_LIMITER = TokenBucket(
+    rate=BINANCE_WEIGHT_PER_MINUTE / 60.0,
+    capacity=BINANCE_WEIGHT_PER_MINUTE / 10.0
+)
+
+# Length of every Binance kline interval. "1M" is a calendar month, so it has
+# no fixed length.
+INTERVAL_MS = {
+    "1s": 1_000,
+    "1m": 60_000, "3m": 180_000, "5m": 300_000, "15m": 900_000, "30m": 1_800_000,
+    "1h": 3_600_000, "2h": 7_200_000, "4h": 14_400_000, "6h": 21_600_000,
+    "8h": 28_800_000, "12h": 43_200_000,
+    "1d": 86_400_000, "3d": 259_200_000, "1w": 604_800_000,
+    "1M": None,
+}
+# Candle boundaries are multiples of the interval since the epoch, except
+# weeks, which start on Monday (the epoch was a Thursday).
+INTERVAL_OFFSET_MS = {"1w": 4 * 86_400_000}
+
+def interval_ms(interval: str):
+    """Length of a kline interval in ms (None for "1M"). Raises ValueError if unknown."""
+    if interval not in INTERVAL_MS:
+        raise ValueError(f"Unsupported kline interval: {interval}")
+    return INTERVAL_MS[interval]
+
+def time_key_format(interval: str) -> str:
+    """strftime format of the get_closing_prices keys for this interval."""
+    interval_ms(interval)
+    if interval.endswith("s"):
+        return "%Y-%m-%d %H:%M:%S"
+    if interval.endswith("m"):
+        return "%Y-%m-%d %H:%M"
+    if interval.endswith("h"):
+        return "%Y-%m-%d %H"
+    return "%Y-%m-%d"
+
+# Transient failures (network, 429/418 rate limits, 5xx) are retried this many times.
+MAX_RETRIES = 3
+
+KLINES_PAGE_SECONDS = Histogram(
+    "binance_klines_page_seconds", "Time to download one page of klines."
+)
+KLINES_FETCH_SECONDS = Histogram(
+    "binance_klines_fetch_seconds", "Time for fetch_historical_klines, all pages.", ["interval"]
+)
+CLOSING_PRICES_SECONDS = Histogram(
+    "get_closing_prices_seconds", "Time for get_closing_prices including the fetch.", ["interval"]
+)
+CACHE_REQUESTS = Counter(
+    "binance_cache_requests_total", "Kline cache lookups.", ["result"]
+)
+PRICE_STORE_REQUESTS = Counter(
+    "price_store_requests_total", "get_closing_prices ranges served from the local store.", ["result"]
+)
+BINANCE_ERRORS = Counter(
+    "binance_errors_total", "Failed Binance requests (after retries).", ["endpoint"]
+)
+BINANCE_RETRIES = Counter(
+    "binance_retries_total", "Retried Binance requests.", ["endpoint"]
+)
+
+class _Retryable(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def _get_json(url, params, weight, endpoint):
+    """
+    GET a Binance endpoint within the shared weight budget.
+    Retries transient failures with backoff (honoring Retry-After), raises otherwise.
+    """
+    attempt = 0
+    while True:
+        WEIGHT_LIMITER.acquire(weight)
+        try:
+            resp = requests.get(url, params=params, timeout=10)
+            if resp.status_code in (418, 429) or resp.status_code >= 500:
+                retry_after = resp.headers.get("Retry-After")
+                raise _Retryable(
+                    f"HTTP {resp.status_code} from {endpoint}",
+                    float(retry_after) if retry_after else None
+                )
+            return resp.json()
+        except (requests.ConnectionError, requests.Timeout, _Retryable) as e:
+            attempt += 1
+            if attempt > MAX_RETRIES:
+                BINANCE_ERRORS.inc(endpoint=endpoint)
+                raise
+            delay = getattr(e, "retry_after", None) or 0.5 * 2 ** (attempt - 1)
+            logger.warning(f"{e}; retry {attempt}/{MAX_RETRIES} in {delay:.1f}s")
+            BINANCE_RETRIES.inc(endpoint=endpoint)
+            time.sleep(delay)
+        except Exception:
+            BINANCE_ERRORS.inc(endpoint=endpoint)
+            raise
+
+class _Series:
+    """
+    Cached klines for one (symbol, interval), sorted by open time, plus the
+    [covered_from, covered_to] time range we know to be complete.
+    """
+    def __init__(self):
+        self.klines = []
+        self.open_times = []
+        self.covered_from = None
+        self.covered_to = None
+        self.lock = threading.Lock()
+
+    def covers(self, start_ts, end_ts):
+        return (
+            self.covered_from is not None
+            and self.covered_from <= start_ts
+            and end_ts <= self.covered_to
+        )
+
+    def slice(self, start_ts, end_ts):
+        lo = bisect_left(self.open_times, start_ts)
+        hi = bisect_right(self.open_times, end_ts)
+        return self.klines[lo:hi]
+
+# In-memory cache: (symbol, interval) -> _Series. Requests for any range are
+# served from it, and only the missing head/tail of a range is downloaded.
+_SERIES = {}
+_SERIES_LOCK = threading.Lock()
+
+def clear_cache():
+    """Drop all cached klines and ticker prices (used by benchmarks to measure cold fetches)."""
+    with _SERIES_LOCK:
+        _SERIES.clear()
+    _TICKERS.clear()
+
+def _series(symbol, interval):
+    with _SERIES_LOCK:
+        series = _SERIES.get((symbol, interval))
+        if series is None:
+            series = _SERIES[(symbol, interval)] = _Series()
+        return series
 
 def fetch_historical_klines(symbol: str, start_ts: int, end_ts: int, interval="1d"):
     """
     Fetch candlestick data from Binance for a given symbol and interval ("1h", "1d", etc.)
     Returns a list of raw klines.
 
-    We do simple caching to avoid repeated calls. If you want more robust caching,
-    consider a database or redis approach.
+    Klines are cached per (symbol, interval). A request that extends past the
+    cached range only downloads the missing head and/or tail; the still-open
+    last candle is never counted as covered, so it is refreshed next time.
     """
-    cache_key = (symbol, start_ts, end_ts, interval)
-    if cache_key in _KLINES_CACHE:
-        return _KLINES_CACHE[cache_key]
+    series = _series(symbol, interval)
+    # one download per series at a time; a concurrent request for the same
+    # range waits here and is then served from the cache
+    with series.lock:
+        if series.covers(start_ts, end_ts):
+            CACHE_REQUESTS.inc(result="hit")
+            return series.slice(start_ts, end_ts)
+        CACHE_REQUESTS.inc(result="miss" if series.covered_from is None else "partial")
 
-    url = "https://api.binance.com/api/v3/klines"
-    limit = 1000
+        try:
+            with KLINES_FETCH_SECONDS.time(interval=interval):
+                _extend_series(series, symbol, start_ts, end_ts, interval)
+        except Exception as e:
+            logger.error(f"Error fetching klines: {e}")
+        return series.slice(start_ts, end_ts)
+
+def _extend_series(series, symbol, start_ts, end_ts, interval):
+    # the cache is one gap-free run; a range that doesn't touch it (e.g. the
+    # head and the tail around what the price store has) replaces it rather
+    # than having the gap in between downloaded too
+    if series.covered_from is not None and (
+        end_ts < series.covered_from - 1 or start_ts > series.covered_to + 1
+    ):
+        series.covered_from = series.covered_to = None
+    if series.covered_from is None:
+        head = _download_klines(symbol, start_ts, end_ts, interval)
+        tail = []
+        keep = []
+        covered_from = start_ts
+    else:
+        head = []
+        if start_ts < series.covered_from:
+            head = _download_klines(symbol, start_ts, series.covered_from - 1, interval)
+        tail = []
+        keep = series.klines
+        if end_ts > series.covered_to:
+            tail = _download_klines(symbol, series.covered_to + 1, end_ts, interval)
+            # the tail re-downloads the previously open candle; drop the stale copy
+            if tail:
+                keep = keep[:bisect_left(series.open_times, tail[0][0])]
+        covered_from = min(start_ts, series.covered_from)
+
+    klines = head + keep + tail
+    covered_to = max(end_ts, series.covered_to or end_ts)
+    now_ms = int(time.time() * 1000)
+    if klines and klines[-1][6] >= now_ms:
+        # last candle is still open: its close will change
+        covered_to = min(covered_to, klines[-1][0] - 1)
+
+    series.klines = klines
+    series.open_times = [k[0] for k in klines]
+    series.covered_from = covered_from
+    series.covered_to = covered_to
+
+def _download_klines(symbol, start_ts, end_ts, interval):
+    """Page through api/v3/klines for [start_ts, end_ts]. Raises on errors."""
     all_klines = []
+    for page in iter_kline_pages(symbol, start_ts, end_ts, interval):
+        all_klines.extend(page)
+    return all_klines
+
+def iter_kline_pages(symbol, start_ts, end_ts, interval, limit=1000):
+    """Yield the raw klines of [start_ts, end_ts] one API page at a time. Raises on errors."""
+    url = f"{BINANCE_API_URL}/api/v3/klines"
     current_start = start_ts
 
     while True:
         params = {
             "symbol": symbol,
-            "interval": interval,   # "1h" or "1d" etc.
+            "interval": interval,   # any key of INTERVAL_MS
             "startTime": current_start,
             "endTime": end_ts,
             "limit": limit
         }
-        try:
-            resp = requests.get(url, params=params)
-            data = resp.json()
-
-            if isinstance(data, dict) and data.get("code"):
-                raise ValueError(f"Binance API error: {data}")
-
-            if not data or not isinstance(data, list):
-                break
-
-            all_klines.extend(data)
-            if len(data) < limit:
-                # done
-                break
-
-            last_open_time = data[-1][0]  # ms
-            # Step forward by the interval. For "1h", we add 1 hour in ms; for "1d", 1 day in ms, etc.
-            if interval.endswith("h"):
-                # e.g. "1h" => 1 hour, "2h" => 2 hours
-                hours_val = int(interval.replace("h", ""))  # handle "1h", "2h", etc.
-                current_start = last_open_time + (hours_val * 3600 * 1000)
-            else:
-                # default daily => 24 hours
-                current_start = last_open_time + (24 * 3600 * 1000)
+        with KLINES_PAGE_SECONDS.time():
+            data = _get_json(url, params, KLINES_WEIGHT, "klines")
 
-            if current_start >= end_ts:
-                break
+        if isinstance(data, dict) and data.get("code"):
+            BINANCE_ERRORS.inc(endpoint="klines")
+            raise ValueError(f"Binance API error: {data}")
 
-            # short delay to avoid hitting rate limits too fast
-            time.sleep(0.1)
+        if not data or not isinstance(data, list):
+            break
 
-        except Exception as e:
-            logger.error(f"Error fetching klines: {e}")
+        yield data
+        if len(data) < limit:
+            # done
             break
 
-    _KLINES_CACHE[cache_key] = all_klines
-    return all_klines
+        # Continue right after the last candle's close time. Unlike adding a
+        # fixed length this works for every interval, including "1M".
+        current_start = data[-1][6] + 1
 
-def get_closing_prices(symbol, start_dt, end_dt, interval="1d"):
+        if current_start >= end_ts:
+            break
+
+def to_ms(dt) -> int:
+    """ms since the epoch. Naive datetimes are UTC, as everywhere in the bot."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+# Columns a PriceSeries carries besides open_time. The klines have them
+# anyway, so keeping them costs no requests.
+SERIES_COLUMNS = ("open", "high", "low", "close")
+
+class PriceSeries:
+    """
+    Prices of one (symbol, interval) as parallel numpy arrays sorted by open
+    time: open_times (int64 ms), closes (float64) and, when the source had
+    them, opens/highs/lows (else None; rows the source lacked are NaN). When
+    the range comes from the local price store they are read-only views into
+    its memory map.
     """
-    Return a dict: {time_key -> close_price}
+    __slots__ = ("interval", "open_times", "closes", "opens", "highs", "lows")
 
-    If interval="1h", keys are "YYYY-MM-DD HH"
-    If interval="1d", keys are "YYYY-MM-DD"
+    def __init__(self, interval, open_times, closes, opens=None, highs=None, lows=None):
+        self.interval = interval
+        self.open_times = open_times
+        self.closes = closes
+        self.opens = opens
+        self.highs = highs
+        self.lows = lows
+
+    @classmethod
+    def from_columns(cls, interval, columns):
+        """From a {column: array} dict such as PriceStore.range() returns."""
+        return cls(
+            interval, columns["open_time"], columns["close"],
+            columns.get("open"), columns.get("high"), columns.get("low")
+        )
+
+    @classmethod
+    def from_klines(cls, interval, klines):
+        values = np.array([k[1:5] for k in klines], dtype=np.float64).reshape(-1, 4)
+        return cls(
+            interval, np.array([k[0] for k in klines], dtype=np.int64),
+            values[:, 3], values[:, 0], values[:, 1], values[:, 2]
+        )
+
+    def __len__(self):
+        return len(self.open_times)
+
+    def locate(self, open_times):
+        """(found, idx): for each requested open time, whether a candle opened exactly then and its row."""
+        open_times = np.asarray(open_times, dtype=np.int64)
+        if not len(self.open_times):
+            return np.zeros(len(open_times), dtype=bool), np.zeros(len(open_times), dtype=np.intp)
+        idx = np.searchsorted(self.open_times, open_times).clip(max=len(self.open_times) - 1)
+        return np.asarray(self.open_times[idx] == open_times), idx
+
+    def lookup(self, open_times):
+        """(found, closes): for each requested open time, whether a candle opened exactly then and its close."""
+        found, idx = self.locate(open_times)
+        if not len(self.open_times):
+            return found, np.empty(len(found))
+        return found, np.asarray(self.closes[idx])
+
+    def to_dict(self):
+        """{time_key: close} with keys formatted by time_key_format(interval)."""
+        key_format = time_key_format(self.interval)
+        return {
+            datetime.utcfromtimestamp(open_ms / 1000).strftime(key_format): close
+            for open_ms, close in zip(self.open_times.tolist(), self.closes.tolist())
+        }
+
+def get_closing_prices(symbol, start_dt, end_dt, interval="1d") -> PriceSeries:
+    """
+    Return the closes of every candle opening in [start_dt, end_dt] as a
+    PriceSeries. Use .to_dict() for the old {time_key -> close_price} form
+    (keys "YYYY-MM-DD" for daily and longer, "YYYY-MM-DD HH" for hourly, see
+    time_key_format).
     """
-    start_ts = int(start_dt.timestamp() * 1000)
-    end_ts = int(end_dt.timestamp() * 1000)
+    if CROSS_SEPARATOR in symbol:
+        from cross_rates import CROSS_RATES
+        return CROSS_RATES.prices(symbol, start_dt, end_dt, interval)
+    with CLOSING_PRICES_SECONDS.time(interval=interval):
+        return _closing_prices(symbol, start_dt, end_dt, interval)
 
-    klines = fetch_historical_klines(symbol, start_ts, end_ts, interval)
+def _closing_prices(symbol, start_dt, end_dt, interval):
+    interval_ms(interval)
+    start_ts = to_ms(start_dt)
+    end_ts = to_ms(end_dt)
 
-    closing_prices = {}
-    for k in klines:
-        open_ms = k[0]
-        close_price = float(k[4])
+    # Whatever the local price store has is served from disk; only the parts of
+    # the range it doesn't have, around it or in holes, go to the API.
+    stored = PRICE_STORE.range(symbol, interval, start_ts, end_ts, ("open_time",) + SERIES_COLUMNS)
+    coverage = PRICE_STORE.coverage(symbol, interval)
+    segments = _segments(symbol, interval, start_ts, end_ts, coverage, stored["open_time"])
+    complete = all(source == "store" for source, _, _ in segments)
+    PRICE_STORE_REQUESTS.inc(result="miss" if coverage is None else "hit" if complete else "partial")
+    if complete:
+        return PriceSeries.from_columns(interval, stored)
 
-        if interval.endswith("h"):
-            # store as "YYYY-MM-DD HH"
-            dt_key = datetime.utcfromtimestamp(open_ms/1000).strftime("%Y-%m-%d %H")
-        else:
-            # daily => "YYYY-MM-DD"
-            dt_key = datetime.utcfromtimestamp(open_ms/1000).strftime("%Y-%m-%d")
+    parts = []
+    for source, part_start, part_end in segments:
+        if source == "store":
+            lo = np.searchsorted(stored["open_time"], part_start, side="left")
+            hi = np.searchsorted(stored["open_time"], part_end, side="right")
+            parts.append(PriceSeries.from_columns(interval, {name: values[lo:hi] for name, values in stored.items()}))
+            continue
+        klines = fetch_historical_klines(symbol, part_start, part_end, interval)
+        if not klines:
+            _note_gap(symbol, interval, coverage, part_start, part_end)
+            continue
+        _store_klines(symbol, interval, klines, coverage, part_start, part_end)
+        parts.append(PriceSeries.from_klines(interval, klines))
+    if not parts:
+        return PriceSeries.from_columns(interval, stored)
+    return PriceSeries(
+        interval,
+        np.concatenate([p.open_times for p in parts]),
+        np.concatenate([p.closes for p in parts]),
+        *(_concat_column(parts, name) for name in ("opens", "highs", "lows"))
+    )
 
-        closing_prices[dt_key] = close_price
+# Holes in stored series that Binance has no candles for either (exchange
+# downtime), so they aren't asked for again on every request.
+_KNOWN_GAPS = set()  # (symbol, interval, start_ms, end_ms)
 
-    return closing_prices
+def _segments(symbol, interval, start_ts, end_ts, coverage, stored_times):
+    """
+    [(source, start_ms, end_ms)] covering [start_ts, end_ts] in time order:
+    "store" where the price store has every candle, "api" for the ranges
+    before, after or between its rows that it lacks. Imported archives
+    needn't be adjacent, so a stored series can have holes.
+    """
+    if coverage is None:
+        return [("api", start_ts, end_ts)]
+    first, last = coverage
+    segments = []
+    if start_ts < first:
+        segments.append(("api", start_ts, min(end_ts, first - 1)))
+    lo, hi = max(start_ts, first), min(end_ts, last)
+    if lo <= hi:
+        step = INTERVAL_MS[interval]
+        missing = []
+        # calendar months have no fixed length; their holes can't be told apart
+        if step is not None:
+            times = np.asarray(stored_times)
+            if not len(times):
+                missing.append((lo, hi))
+            else:
+                if times[0] - step >= lo:
+                    missing.append((lo, int(times[0]) - 1))
+                for i in np.flatnonzero(np.diff(times) != step):
+                    missing.append((int(times[i]) + step, int(times[i + 1]) - 1))
+                if times[-1] + step <= hi:
+                    missing.append((int(times[-1]) + step, hi))
+        cursor = lo
+        for gap_start, gap_end in missing:
+            if gap_start > gap_end or (symbol, interval, gap_start, gap_end) in _KNOWN_GAPS:
+                continue
+            if cursor < gap_start:
+                segments.append(("store", cursor, gap_start - 1))
+            segments.append(("api", gap_start, gap_end))
+            cursor = gap_end + 1
+        if cursor <= hi:
+            segments.append(("store", cursor, hi))
+    if end_ts > last:
+        segments.append(("api", max(start_ts, last + 1), end_ts))
+    return segments
+
+def _note_gap(symbol, interval, coverage, range_start, range_end):
+    # a hole inside the stored series that Binance answered completely, with nothing
+    if coverage is None or not (coverage[0] < range_start and range_end < coverage[1]):
+        return
+    with _SERIES_LOCK:
+        series = _SERIES.get((symbol, interval))
+    if series is not None and series.covers(range_start, range_end):
+        _KNOWN_GAPS.add((symbol, interval, range_start, range_end))
+
+def _concat_column(parts, name):
+    # stores written before OHLC was kept only have closes; NaN stands in
+    if all(getattr(p, name) is None for p in parts):
+        return None
+    return np.concatenate([
+        getattr(p, name) if getattr(p, name) is not None else np.full(len(p), np.nan)
+        for p in parts
+    ])
+
+def _store_klines(symbol, interval, klines, coverage, range_start, range_end):
+    """
+    Write the closed candles of a downloaded range through to the price store
+    if the range fills a hole in what it holds or is adjacent to it (a range
+    off by itself would just become another hole), then drop the in-memory
+    copy.
+    """
+    if coverage is not None and not (
+        range_end == coverage[0] - 1 or range_start == coverage[1] + 1
+        or coverage[0] < range_start <= range_end < coverage[1]
+    ):
+        return
+    now_ms = int(time.time() * 1000)
+    rows = [k for k in klines if k[6] < now_ms]
+    if rows:
+        # a concurrent request may have stored the same candles already
+        have = PRICE_STORE.range(symbol, interval, rows[0][0], rows[-1][0], ("open_time",))["open_time"]
+        if len(have):
+            keep = ~np.isin(np.array([k[0] for k in rows], dtype=np.int64), have)
+            rows = [k for k, new in zip(rows, keep) if new]
+    with _SERIES_LOCK:
+        series = _SERIES.get((symbol, interval))
+    if rows and (series is None or not series.covers(range_start, rows[-1][0])):
+        # the download failed part way; storing it would leave a gap
+        return
+    if rows:
+        values = np.array([k[1:6] for k in rows], dtype=np.float64)
+        try:
+            PRICE_STORE.merge(
+                symbol, interval, [k[0] for k in rows], values[:, 3],
+                open=values[:, 0], high=values[:, 1], low=values[:, 2], volume=values[:, 4]
+            )
+        except OSError as e:
+            logger.error(f"Could not write {symbol} {interval} to the price store: {e}")
+            return
+    # only the still-open candle isn't in the store now, and that is
+    # downloaded again next time anyway
+    with _SERIES_LOCK:
+        _SERIES.pop((symbol, interval), None)
+
+def iter_closing_prices(symbol, start_dt, end_dt, interval, chunk_rows=STREAM_CHUNK_ROWS):
+    """
+    Yield the closes of every candle opening in [start_dt, end_dt] as
+    PriceSeries chunks in time order, for ranges too large to hold at once
+    (e.g. years of 5m candles). Stored rows come in slices of the price
+    store's memory map, the rest page by page from the API; nothing is
+    cached, so only the current chunk is ever in memory.
+    """
+    if CROSS_SEPARATOR in symbol:
+        # a synthetic series is only as long as its legs' overlap; it is
+        # built whole and handed out in chunks
+        prices = get_closing_prices(symbol, start_dt, end_dt, interval)
+        for lo in range(0, len(prices), chunk_rows):
+            yield PriceSeries(interval, *(
+                None if values is None else values[lo:lo + chunk_rows]
+                for values in (prices.open_times, prices.closes, prices.opens, prices.highs, prices.lows)
+            ))
+        return
+    start_ts = to_ms(start_dt)
+    end_ts = to_ms(end_dt)
+    coverage = PRICE_STORE.coverage(symbol, interval)
+    stored_times = PRICE_STORE.range(symbol, interval, start_ts, end_ts, ("open_time",))["open_time"]
+
+    for source, part_start, part_end in _segments(symbol, interval, start_ts, end_ts, coverage, stored_times):
+        if source == "store":
+            stored = PRICE_STORE.range(symbol, interval, part_start, part_end, ("open_time",) + SERIES_COLUMNS)
+            for lo in range(0, len(stored["open_time"]), chunk_rows):
+                yield PriceSeries.from_columns(
+                    interval, {name: values[lo:lo + chunk_rows] for name, values in stored.items()}
+                )
+            continue
+        for page in iter_kline_pages(symbol, part_start, part_end, interval):
+            yield PriceSeries.from_klines(interval, page)
+
+# Ticker prices are reused for this long, so a burst of reports on the same
+# pair costs one request.
+TICKER_CACHE_SECONDS = float(os.getenv("TICKER_CACHE_SECONDS", "5"))
+_TICKERS = {}  # symbol -> (fetched_at, price)
 
 def fetch_current_price(symbol: str) -> float:
     """
     Fetch the latest market price for a symbol from Binance.
+    Prices fetched within the last TICKER_CACHE_SECONDS are reused.
     """
-    url = "https://api.binance.com/api/v3/ticker/price"
+    if CROSS_SEPARATOR in symbol:
+        from cross_rates import CROSS_RATES
+        return CROSS_RATES.current_price(symbol)
+    cached = _TICKERS.get(symbol)
+    if cached is not None and time.monotonic() - cached[0] < TICKER_CACHE_SECONDS:
+        return cached[1]
+    url = f"{BINANCE_API_URL}/api/v3/ticker/price"
     params = {"symbol": symbol}
-    r = requests.get(url, params=params)
-    data = r.json()
+    data = _get_json(url, params, TICKER_PRICE_WEIGHT, "ticker_price")
     if "price" in data:
-        return float(data["price"])
+        price = float(data["price"])
+        _TICKERS[symbol] = (time.monotonic(), price)
+        return price
     raise ValueError(f"Could not fetch current price for {symbol}")
+
+def fetch_all_prices() -> dict:
+    """
+    {symbol: latest price} for every symbol on Binance, in one request. The
+    prices also refresh the per-symbol ticker cache.
+    """
+    url = f"{BINANCE_API_URL}/api/v3/ticker/price"
+    data = _get_json(url, {}, ALL_TICKERS_WEIGHT, "ticker_price")
+    if not isinstance(data, list):
+        raise ValueError("Could not fetch current prices")
+    now = time.monotonic()
+    prices = {}
+    for ticker in data:
+        prices[ticker["symbol"]] = price = float(ticker["price"])
+        _TICKERS[ticker["symbol"]] = (now, price)
+    return prices
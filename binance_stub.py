@@ -0,0 +1,205 @@
+# binance_stub.py
+#
+# A local stand-in for the Binance REST endpoints the bot uses (klines, ticker
+# price, exchangeInfo), so benchmarks and load tests run without network
+# access.
+#
+# Data comes from recorded responses in fixtures/<SYMBOL>-<interval>.json when
+# present (record them with `python binance_stub.py record BTCUSDT ETHUSDT`),
+# otherwise from a deterministic synthetic price series.
+
+import os
+import sys
+import json
+import math
+import time
+import logging
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from binance_api import INTERVAL_MS, INTERVAL_OFFSET_MS
+from symbol_index import SNAPSHOT_FILE
+
+logger = logging.getLogger(__name__)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# First day of BTCUSDT trading on Binance; synthetic series start here.
+SYNTHETIC_EPOCH_MS = 1502928000000  # 2017-08-17 00:00 UTC
+
+BASE_PRICES = {"BTCUSDT": 30000.0, "ETHUSDT": 2000.0, "BNBUSDT": 300.0}
+
+def _noise(seed: int, i: int) -> float:
+    # cheap deterministic value in [-1, 1)
+    x = (i * 2654435761 + seed * 40503) % 4294967296
+    return x / 2147483648.0 - 1.0
+
+def synthetic_price(symbol: str, at_ms: int) -> float:
+    """Smooth cycles plus noise, a pure function of (symbol, time)."""
+    seed = sum(map(ord, symbol))
+    days = (at_ms - SYNTHETIC_EPOCH_MS) / 86_400_000
+    base = BASE_PRICES.get(symbol, 10.0 + seed % 90)
+    log_price = (
+        0.0004 * days
+        + 0.6 * math.sin(days / 365.0 * 2 * math.pi + seed)
+        + 0.1 * math.sin(days / 30.0 * 2 * math.pi)
+        + 0.02 * _noise(seed, int(at_ms // 60_000))
+    )
+    return base * math.exp(log_price)
+
+def synthetic_klines(symbol, interval, start_ms, end_ms, limit):
+    step = INTERVAL_MS[interval]
+    offset = INTERVAL_OFFSET_MS.get(interval, 0)
+    now_ms = int(time.time() * 1000)
+    first = max(start_ms, SYNTHETIC_EPOCH_MS)
+    # first candle boundary at or after `first`, aligned like Binance's
+    open_ms = offset + -(-(first - offset) // step) * step
+    rows = []
+    while open_ms <= end_ms and open_ms <= now_ms and len(rows) < limit:
+        # a candle closes at the price at its end, so coarse and fine candles
+        # that end together have the same close, as on the real exchange
+        open_price = synthetic_price(symbol, open_ms)
+        close = synthetic_price(symbol, min(open_ms + step, now_ms))
+        high, low = max(open_price, close) * 1.002, min(open_price, close) * 0.998
+        rows.append([
+            open_ms, f"{open_price:.8f}", f"{high:.8f}", f"{low:.8f}", f"{close:.8f}",
+            "100.00000000", open_ms + step - 1, f"{100 * close:.8f}", 1000,
+            "50.00000000", f"{50 * close:.8f}", "0"
+        ])
+        open_ms += step
+    return rows
+
+class FixtureSource:
+    """Serves recorded klines when a fixture exists, synthetic ones otherwise."""
+    def __init__(self, fixtures_dir=FIXTURES_DIR):
+        self.fixtures_dir = fixtures_dir
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def _fixture(self, symbol, interval):
+        key = (symbol, interval)
+        with self._lock:
+            if key not in self._loaded:
+                path = os.path.join(self.fixtures_dir, f"{symbol}-{interval}.json")
+                rows = None
+                if os.path.exists(path):
+                    with open(path) as f:
+                        rows = json.load(f)
+                self._loaded[key] = rows
+            return self._loaded[key]
+
+    def klines(self, symbol, interval, start_ms, end_ms, limit):
+        rows = self._fixture(symbol, interval)
+        if rows is None:
+            return synthetic_klines(symbol, interval, start_ms, end_ms, limit)
+        return [k for k in rows if start_ms <= k[0] <= end_ms][:limit]
+
+    def exchange_info(self):
+        # the bundled symbol snapshot, plus every pair the stub has prices for
+        with open(SNAPSHOT_FILE) as f:
+            rows = json.load(f)["symbols"]
+        known = {row[0] for row in rows}
+        rows += [
+            [symbol, symbol[:-4], "USDT", "TRADING", None]
+            for symbol in BASE_PRICES if symbol not in known
+        ]
+        return {
+            "timezone": "UTC",
+            "serverTime": int(time.time() * 1000),
+            "symbols": [
+                {"symbol": symbol, "status": status, "baseAsset": base, "quoteAsset": quote,
+                 "isSpotTradingAllowed": True}
+                for symbol, base, quote, status, _ in rows
+            ],
+        }
+
+    def price(self, symbol):
+        rows = self._fixture(symbol, "1d") or self._fixture(symbol, "1h")
+        if rows:
+            return float(rows[-1][4])
+        return synthetic_price(symbol, int(time.time() * 1000))
+
+class _StubHandler(BaseHTTPRequestHandler):
+    source = None
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self.server.request_count += 1
+        symbol = query.get("symbol", "")
+
+        if url.path == "/api/v3/klines":
+            interval = query.get("interval", "1d")
+            if not INTERVAL_MS.get(interval):  # no calendar months in the stub
+                self._reply(400, {"code": -1120, "msg": "Invalid interval."})
+                return
+            rows = self.source.klines(
+                symbol, interval,
+                int(query.get("startTime", 0)),
+                int(query.get("endTime", time.time() * 1000)),
+                min(int(query.get("limit", 500)), 1000)
+            )
+            self._reply(200, rows)
+        elif url.path == "/api/v3/exchangeInfo":
+            self._reply(200, self.source.exchange_info())
+        elif url.path == "/api/v3/ticker/price" and not symbol:
+            self._reply(200, [
+                {"symbol": s["symbol"], "price": f"{self.source.price(s['symbol']):.8f}"}
+                for s in self.source.exchange_info()["symbols"]
+            ])
+        elif url.path == "/api/v3/ticker/price":
+            self._reply(200, {"symbol": symbol, "price": f"{self.source.price(symbol):.8f}"})
+        else:
+            self._reply(404, {"code": -1, "msg": "Not found."})
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub(port=0, fixtures_dir=FIXTURES_DIR):
+    """
+    Start the stub on 127.0.0.1:<port> (0 = any free port) in a daemon thread.
+    Returns the server; its base URL is server.url.
+    """
+    handler = type("StubHandler", (_StubHandler,), {"source": FixtureSource(fixtures_dir)})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.request_count = 0
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, name="binance-stub", daemon=True).start()
+    return server
+
+def record_fixtures(symbols, intervals=("1d", "1h"), days=5 * 365, fixtures_dir=FIXTURES_DIR):
+    """Download real klines from Binance and store them as fixtures."""
+    from binance_api import fetch_historical_klines
+
+    os.makedirs(fixtures_dir, exist_ok=True)
+    end_ms = int(time.time() * 1000)
+    start_ms = end_ms - days * 86_400_000
+    for symbol in symbols:
+        for interval in intervals:
+            rows = fetch_historical_klines(symbol, start_ms, end_ms, interval)
+            path = os.path.join(fixtures_dir, f"{symbol}-{interval}.json")
+            with open(path, "w") as f:
+                json.dump(rows, f)
+            print(f"{path}: {len(rows)} klines")
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "record":
+        record_fixtures(sys.argv[2:])
+    else:
+        server = start_stub(int(sys.argv[1]) if len(sys.argv) > 1 else 8081)
+        print(f"Binance stub listening on {server.url} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
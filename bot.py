@@ -1,11 +1,19 @@
 # bot.py
 
 import os
+import sys
+import time
+import signal
 import logging
+import subprocess
 from telebot import TeleBot, types
-from credentials import telegram_bot_tokens
 from data_store import DataStore
-from commands import register_handlers
+from commands import register_handlers, recover_calculations, calc_scheduler
+from metrics import start_metrics_server
+from cache_warmer import start_cache_warmer
+from plan_tracker import start_plan_tracker
+from leaderboard import start_leaderboard
+from outbox import Outbox, OutboundBot
 
 logging.basicConfig(
     level=logging.INFO,
@@ -13,19 +21,77 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# On SIGTERM/SIGINT, running calculations and queued messages get this long
+# to finish; jobs still unfinished then are run again on the next start.
+SHUTDOWN_SECONDS = float(os.getenv("SHUTDOWN_SECONDS", "20"))
 
-TELEGRAM_BOT_TOKEN = telegram_bot_tokens
+# Modules that are imported on first use rather than at startup.
+# They are listed separately in --profile-startup so we can see what we saved.
+DEFERRED_MODULES = ["matplotlib.figure"]
 
-if not TELEGRAM_BOT_TOKEN:
-    raise ValueError("TELEGRAM_BOT_TOKEN not set. Please check your .env file.")
+def load_token():
+    from credentials import telegram_bot_tokens
+
+    if not telegram_bot_tokens:
+        raise ValueError("TELEGRAM_BOT_TOKEN not set. Please check your .env file.")
+    return telegram_bot_tokens
+
+def _import_times(statement):
+    """
+    Run `statement` in a fresh interpreter with `-X importtime` and return
+    (total_us, [(cumulative_us, module), ...]) for the modules it pulls in directly.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=here, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    total = 0
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # nesting is shown as two extra spaces per level after the "| " separator
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            total += int(cumulative)
+        elif depth == 1:
+            rows.append((int(cumulative), name.strip()))
+    rows.sort(reverse=True)
+    return total, rows
+
+def profile_startup(limit=15):
+    """Print per-module import time for the bot's startup path and exit."""
+    total, rows = _import_times("import bot")
+    print(f"Startup imports (bot.py): {total / 1000:.1f} ms")
+    for us, name in rows[:limit]:
+        print(f"  {us / 1000:9.1f} ms  {name}")
+
+    for module in DEFERRED_MODULES:
+        deferred, _ = _import_times(f"import {module}")
+        print(f"Deferred until first use: {module} {deferred / 1000:.1f} ms")
 
 def main():
+    if "--profile-startup" in sys.argv[1:]:
+        profile_startup()
+        return
+
+    metrics_port = os.getenv("METRICS_PORT")
+    if metrics_port:
+        start_metrics_server(int(metrics_port))
+
     # 1) Create bot instance
-    bot = TeleBot(TELEGRAM_BOT_TOKEN, parse_mode="Markdown")
+    bot = TeleBot(load_token(), parse_mode="Markdown")
     store = DataStore()
+    outbox = Outbox(bot)
 
-    # 2) Register conversation handlers
-    register_handlers(bot, store)
+    # 2) Register conversation handlers; their replies go through the outbox
+    outbound = OutboundBot(bot, outbox)
+    register_handlers(outbound, store)
 
     # 3) *Set your custom commands menu* (the "blue button")
     bot.set_my_commands([
@@ -34,11 +100,41 @@ def main():
         types.BotCommand("language", "تغییر زبان / Change language"),
         types.BotCommand("cancel", "لغو فرایند / Cancel current process"),
         types.BotCommand("restart", "ریست / Restart the entire flow"),
+        types.BotCommand("dca", "محاسبهٔ سریع / One-message calculation"),
+        types.BotCommand("track", "دنبال کردن طرح / Follow a DCA plan"),
+        types.BotCommand("plans", "طرح‌های من / Your followed plans"),
+        types.BotCommand("top", "برترین‌ها / Best pairs for a weekly plan"),
     ])
 
-    # 4) Start polling
+    # 4) Prefetch popular pairs, update followed plans and rebuild the
+    #    leaderboard in the background
+    start_cache_warmer()
+    outbox.start()
+    start_plan_tracker(outbox)
+    start_leaderboard()
+    # calculations a previous run didn't finish
+    recover_calculations(outbound, store)
+
+    # 5) Start polling until SIGTERM/SIGINT, then shut down gracefully
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: bot.stop_polling())
     logger.info("Bot is running... Press Ctrl+C to stop.")
     bot.infinity_polling()
+    shutdown(outbox)
+
+def shutdown(outbox, timeout=SHUTDOWN_SECONDS):
+    """
+    Let running calculations finish and the outbox deliver what they sent,
+    within `timeout`. Jobs not started yet, or cut off, stay in the job
+    queue and are recovered on the next start.
+    """
+    deadline = time.monotonic() + timeout
+    logger.info("Shutting down: finishing running calculations...")
+    if not calc_scheduler.shutdown(timeout):
+        logger.warning("Calculations still running at shutdown; they will be run again on the next start")
+    if not outbox.drain(max(0.0, deadline - time.monotonic())):
+        logger.warning(f"{outbox.depth()} messages not sent at shutdown")
+    outbox.stop()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,102 @@
+# cache_warmer.py
+#
+# Keeps the kline cache warm for the symbols most users ask about, so the first
+# user after a restart doesn't pay for the full Binance download, and
+# precomputes the standard DCA plans for them into the result cache.
+
+import os
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import binance_api
+from binance_api import get_closing_prices
+from dca_calculator import parse_investment_period, parse_investment_frequency
+from result_cache import RESULT_CACHE
+from metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+def _env_list(name, default):
+    return [item.strip() for item in os.getenv(name, default).split(",") if item.strip()]
+
+WARM_SYMBOLS = _env_list("WARM_SYMBOLS", "BTCUSDT,ETHUSDT")
+WARM_INTERVALS = _env_list("WARM_INTERVALS", "1d")
+WARM_HISTORY_DAYS = int(os.getenv("WARM_HISTORY_DAYS", "1095"))
+WARM_EVERY_SECONDS = int(os.getenv("WARM_EVERY_SECONDS", "900"))
+# The warmer only uses spare Binance weight: before each step it waits until at
+# least this share of the shared bucket's burst capacity is unused.
+WARM_WEIGHT_RESERVE = float(os.getenv("WARM_WEIGHT_RESERVE", "0.5"))
+
+STANDARD_PERIODS = ["6 months", "1 year"]
+STANDARD_FREQUENCIES = ["weekly", "monthly"]
+STANDARD_FEES = [0.0, 0.1]
+
+WARM_RUNS = Counter("cache_warmer_runs_total", "Completed cache warm-up cycles.")
+
+class CacheWarmer(threading.Thread):
+    def __init__(self, symbols=None, intervals=None, history_days=WARM_HISTORY_DAYS,
+                 every_seconds=WARM_EVERY_SECONDS, weight_reserve=WARM_WEIGHT_RESERVE):
+        super().__init__(name="cache-warmer", daemon=True)
+        self.symbols = WARM_SYMBOLS if symbols is None else symbols
+        self.intervals = WARM_INTERVALS if intervals is None else intervals
+        self.history_days = history_days
+        self.every_seconds = every_seconds
+        self.weight_reserve = weight_reserve
+        self._halt = threading.Event()
+
+    def run(self):
+        while not self._halt.is_set():
+            try:
+                self.warm_once()
+            except Exception:
+                logger.exception("Cache warm-up failed")
+            self._halt.wait(self.every_seconds)
+
+    def stop(self):
+        self._halt.set()
+
+    def _wait_for_budget(self):
+        limiter = binance_api.WEIGHT_LIMITER
+        needed = limiter.capacity * self.weight_reserve
+        while limiter.available() < needed and not self._halt.is_set():
+            self._halt.wait((needed - limiter.available()) / limiter.rate)
+
+    def warm_once(self):
+        """Extend every configured series to now, then precompute the standard plans."""
+        end_dt = datetime.utcnow()
+        plans = 0
+        for symbol in self.symbols:
+            for interval in self.intervals:
+                self._wait_for_budget()
+                get_closing_prices(
+                    symbol, end_dt - timedelta(days=self.history_days), end_dt, interval
+                )
+            self._wait_for_budget()
+            plans += self._precompute(symbol, end_dt)
+        WARM_RUNS.inc()
+        logger.info(f"Cache warmed: {len(self.symbols)} symbols, {plans} standard plans")
+
+    def _precompute(self, symbol, end_dt):
+        # $1 plans; the cache scales them to whatever amount users ask for
+        plans = 0
+        for period in STANDARD_PERIODS:
+            start_dt = end_dt - parse_investment_period(period)
+            for frequency in STANDARD_FREQUENCIES:
+                freq_value, is_hourly = parse_investment_frequency(frequency)
+                for fee in STANDARD_FEES:
+                    try:
+                        RESULT_CACHE.calculate(1.0, symbol, start_dt, end_dt, freq_value, is_hourly, fee)
+                    except ValueError as e:
+                        logger.warning(f"Skipping standard plan {symbol} {period} {frequency}: {e}")
+                        continue
+                    plans += 1
+        return plans
+
+# The bot runs a single warmer.
+WARMER = CacheWarmer()
+
+def start_cache_warmer():
+    if WARMER.symbols and not WARMER.is_alive():
+        WARMER.start()
+    return WARMER
@@ -1,38 +1,65 @@
-import matplotlib
-matplotlib.use("Agg")  # Ensure headless
-import matplotlib.pyplot as plt
+# chart.py
+
 from datetime import datetime
 import os
+import threading
+
+from metrics import Histogram
+
+CREATE_PLOT_SECONDS = Histogram("create_dca_plot_seconds", "Time to render and save the DCA chart.")
+
+# matplotlib is by far the heaviest import in the bot (~1s cold), so it is
+# loaded on the first chart instead of at startup.
+# We use Figure objects directly rather than pyplot: pyplot keeps one global
+# "current figure", which calculation workers would trample on each other.
+_Figure = None
+
+def _figure_class():
+    global _Figure
+    if _Figure is None:
+        import matplotlib
+        matplotlib.use("Agg")  # Ensure headless
+        from matplotlib.figure import Figure
+        _Figure = Figure
+    return _Figure
 
+@CREATE_PLOT_SECONDS.time()
 def create_dca_plot(purchase_history, symbol: str, output_dir="charts"):
     """
-    Create a line chart with buy points.
+    Create a line chart with buy points from a dca_calculator.PurchaseHistory.
     Returns the path to the saved PNG file.
     """
-    if not purchase_history:
+    if not len(purchase_history):
         return None
 
-    # Sort by date
-    purchase_history_sorted = sorted(purchase_history, key=lambda x: x[0])
-    dates = [datetime.strptime(x[0], '%Y-%m-%d') for x in purchase_history_sorted]
-    prices = [x[1] for x in purchase_history_sorted]
+    # Purchases are already in time order
+    dates = purchase_history.times.astype("datetime64[ms]")
+    prices = purchase_history.prices
+    first, last = dates[0].astype(datetime), dates[-1].astype(datetime)
 
     # Make sure the output directory exists
     if not os.path.exists(output_dir):
         os.makedirs(output_dir, exist_ok=True)
 
-    filename = f"{symbol}_dca_chart_{dates[0].strftime('%Y%m%d')}_{dates[-1].strftime('%Y%m%d')}.png"
+    # hourly plans can start and end on the same days as a daily one
+    resolution = "%Y%m%d%H" if purchase_history.is_hourly else "%Y%m%d"
+    # synthetic pairs are named like "SOL/TRY"
+    filename = f"{symbol.replace('/', '-')}_dca_chart_{first.strftime(resolution)}_{last.strftime(resolution)}.png"
     filepath = os.path.join(output_dir, filename)
 
-    plt.figure(figsize=(10, 5))
-    plt.plot(dates, prices, marker='o', label='Purchase Price')
-    plt.title(f"DCA Purchase Prices for {symbol}")
-    plt.xlabel("Date")
-    plt.ylabel("Price (USD)")
-    plt.grid(True)
-    plt.legend()
+    fig = _figure_class()(figsize=(10, 5))
+    ax = fig.subplots()
+    ax.plot(dates, prices, marker='o', label='Purchase Price')
+    ax.set_title(f"DCA Purchase Prices for {symbol}")
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Price (USD)")
+    ax.grid(True)
+    ax.legend()
 
-    plt.savefig(filepath, bbox_inches='tight')
-    plt.close()
+    # Write under a private name and rename, so a chat that is sending the same
+    # chart right now never reads a half-written file.
+    tmp_path = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+    fig.savefig(tmp_path, bbox_inches='tight', format="png")
+    os.replace(tmp_path, filepath)
 
     return filepath
@@ -1,35 +1,89 @@
 # commands.py
 
+import os
+import re
+import copy
+import math
+import sqlite3
+import time
+import functools
 import logging
+import tempfile
+import threading
+from collections import OrderedDict, namedtuple
 from datetime import datetime, timedelta
 
 from telebot import TeleBot, types
-from data_store import DataStore, BotState
+from data_store import DataStore, BotState, UserSession
 from dca_calculator import (
     parse_investment_period,
     parse_investment_frequency,
-    calculate_dca
+    parse_minute_frequency,
+    persian_to_ascii,
+    calculate_dca_streaming,
+    EXECUTION_MODELS
 )
 from chart import create_dca_plot
-from localization import tr
+from export import export_history, available_formats
+from result_cache import RESULT_CACHE
+from plan_tracker import TRACKER, MAX_PLANS_PER_CHAT
+from job_queue import JOBS
+from symbol_index import SYMBOL_INDEX, SymbolInfo, normalize_symbol
+from cross_rates import resolve as resolve_cross, is_cross, split_cross
+from rate_limit import KeyedRateLimiter, FairScheduler
+from metrics import Counter, Gauge, Histogram
+from profiler import PROFILER, ADMIN_CHAT_IDS, stage, track_send
+from leaderboard import LEADERBOARD, PERIODS as TOP_PERIODS, DEFAULT_PERIOD as TOP_DEFAULT_PERIOD, AMOUNT as TOP_AMOUNT
+from localization import (
+    MessageId,
+    tr,
+    trf,
+    language_inline_keyboard,
+    settings_keyboard,
+    settings_menu_keyboard,
+    export_keyboard
+)
 
 logger = logging.getLogger(__name__)
 
-def register_handlers(bot: TeleBot, store: DataStore):
-    """Attach command and message handlers to the bot."""
+# Each chat may start a burst of 3 calculations, then one every 20 seconds.
+CALC_RATE_LIMITER = KeyedRateLimiter(rate=1 / 20.0, capacity=3)
+# Calculations run here, round-robin across chats, instead of on the handler thread.
+calc_scheduler = FairScheduler(workers=int(os.getenv("CALC_WORKERS", "2")), name="calc")
+
+CALC_QUEUE_DEPTH = Gauge("calc_queue_depth", "Calculations waiting for a worker.")
+CALC_QUEUE_DEPTH.set_function(calc_scheduler.depth)
+CALC_RATE_LIMITED = Counter("calc_rate_limited_total", "Calculations refused by the per-chat limiter.")
+# Inline queries arrive as the user types; each user gets a burst of 5
+# calculations, then one every 2 seconds. Answers are reused for a minute.
+INLINE_RATE_LIMITER = KeyedRateLimiter(rate=1 / 2.0, capacity=5)
+INLINE_CACHE_SECONDS = int(os.getenv("INLINE_CACHE_SECONDS", "60"))
+INLINE_QUERIES = Counter("inline_queries_total", "Inline /dca queries by outcome.", ["result"])
+# Sub-hour plans are streamed through thousands of candles per day of range.
+MINUTE_PLAN_MAX_DAYS = int(os.getenv("MINUTE_PLAN_MAX_DAYS", "366"))
+SEND_PHOTO_SECONDS = Histogram("telegram_send_photo_seconds", "Time to upload the report chart to Telegram.")
+
+def message_chat(message):
+    return message.chat.id
+
+def callback_chat(call):
+    return call.message.chat.id
 
-    def language_inline_keyboard():
-        kb = types.InlineKeyboardMarkup()
-        kb.add(
-            types.InlineKeyboardButton(tr("language_choice_en"), callback_data="lang_en"),
-            types.InlineKeyboardButton(tr("language_choice_es"), callback_data="lang_fa")
-        )
-        return kb
+def register_handlers(bot: TeleBot, store: DataStore):
+    """
+    Attach command and message handlers to the bot. pyTelegramBotAPI runs
+    handlers on a thread pool; each one holds its chat's session lock, so a
+    chat's updates are handled one at a time.
+    """
 
-    def settings_keyboard(lang='en'):
-        kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        kb.add(types.KeyboardButton("Settings"))
-        return kb
+    def per_chat(chat_of):
+        def decorate(handler):
+            @functools.wraps(handler)
+            def locked(update):
+                with store.lock(chat_of(update)):
+                    return handler(update)
+            return locked
+        return decorate
 
     def parse_date_or_relative(text: str):
         """
@@ -73,113 +127,171 @@ def register_handlers(bot: TeleBot, store: DataStore):
         raise ValueError("Invalid date format. Please use YYYY-MM-DD or 'X months ago', etc.")
 
     @bot.message_handler(commands=["start"])
+    @per_chat(message_chat)
     def command_start(message):
         user_id = message.chat.id
+        # "/start dca" is where the inline query's help button leads
+        if message.text.split()[1:] == ["dca"]:
+            session = store.get_session(user_id)
+            bot.send_message(user_id, tr(MessageId.DCA_USAGE, session.lang), parse_mode="Markdown")
+            return
         session = store.reset_session(user_id)
         session.state = BotState.LANG_SELECT
 
         bot.send_message(
             user_id,
-            tr("start_multi_lang_msg", 'en'),
+            tr(MessageId.START_MULTI_LANG_MSG, 'en'),
             reply_markup=language_inline_keyboard(),
             parse_mode="Markdown"
         )
 
     @bot.callback_query_handler(func=lambda call: call.data.startswith("lang_"))
+    @per_chat(callback_chat)
     def callback_language(call):
         user_id = call.message.chat.id
         session = store.get_session(user_id)
 
         if call.data == "lang_en":
             session.lang = 'en'
-            bot.answer_callback_query(call.id, tr("language_set", 'en'))
+            bot.answer_callback_query(call.id, tr(MessageId.LANGUAGE_SET, 'en'))
         elif call.data == "lang_fa":
             session.lang = 'fa'
-            bot.answer_callback_query(call.id, tr("language_set_es", 'fa'))
+            bot.answer_callback_query(call.id, tr(MessageId.LANGUAGE_SET_ES, 'fa'))
 
         bot.send_message(
             user_id,
-            tr("welcome_dca_explanation", session.lang),
+            tr(MessageId.WELCOME_DCA_EXPLANATION, session.lang),
             parse_mode="Markdown"
         )
 
         session.state = BotState.ENTERING_AMOUNT
         bot.send_message(
             user_id,
-            tr("ask_amount", session.lang),
+            tr(MessageId.ASK_AMOUNT, session.lang),
             reply_markup=settings_keyboard(session.lang),
             parse_mode="Markdown"
         )
 
     @bot.message_handler(commands=["help"])
+    @per_chat(message_chat)
     def command_help(message):
         user_id = message.chat.id
         session = store.get_session(user_id)
         bot.send_message(
             user_id,
-            tr("help_message", session.lang),
+            tr(MessageId.HELP_MESSAGE, session.lang),
             parse_mode="Markdown"
         )
 
     @bot.message_handler(commands=["cancel"])
+    @per_chat(message_chat)
     def command_cancel(message):
         user_id = message.chat.id
         session = store.get_session(user_id)
         session.state = BotState.IDLE
         bot.send_message(
             user_id,
-            tr("cancel_message", session.lang),
+            tr(MessageId.CANCEL_MESSAGE, session.lang),
             parse_mode="Markdown"
         )
 
     @bot.message_handler(commands=["restart"])
+    @per_chat(message_chat)
     def command_restart(message):
         user_id = message.chat.id
         store.reset_session(user_id)
-        bot.send_message(user_id, tr("restart_message", 'en'), parse_mode="Markdown")
+        bot.send_message(user_id, tr(MessageId.RESTART_MESSAGE, 'en'), parse_mode="Markdown")
         
     @bot.message_handler(commands=["language"])
+    @per_chat(message_chat)
     def command_language(message):
         user_id = message.chat.id
         session = store.get_session(user_id)
 
-        kb = types.InlineKeyboardMarkup()
-        kb.add(types.InlineKeyboardButton(tr("choose_lang_button", session.lang), callback_data="show_lang"))
         bot.send_message(
             user_id,
-            tr("settings_menu", session.lang),
-            reply_markup=kb,
+            tr(MessageId.SETTINGS_MENU, session.lang),
+            reply_markup=settings_menu_keyboard(session.lang),
             parse_mode="Markdown"
         )
 
     @bot.message_handler(func=lambda m: m.text == "Settings")
+    @per_chat(message_chat)
     def command_settings(message):
         user_id = message.chat.id
         session = store.get_session(user_id)
 
-        kb = types.InlineKeyboardMarkup()
-        kb.add(types.InlineKeyboardButton(tr("choose_lang_button", session.lang), callback_data="show_lang"))
         bot.send_message(
             user_id,
-            tr("settings_menu", session.lang),
-            reply_markup=kb,
+            tr(MessageId.SETTINGS_MENU, session.lang),
+            reply_markup=settings_menu_keyboard(session.lang),
             parse_mode="Markdown"
         )
 
     @bot.callback_query_handler(func=lambda call: call.data == "show_lang")
+    @per_chat(callback_chat)
     def callback_show_lang(call):
         user_id = call.message.chat.id
         session = store.get_session(user_id)
         bot.answer_callback_query(call.id, "")
         bot.send_message(
             user_id,
-            tr("lang_prompt", session.lang),
+            tr(MessageId.LANG_PROMPT, session.lang),
             reply_markup=language_inline_keyboard(),
             parse_mode="Markdown"
         )
 
+    # -------- TRACKED PLANS --------
+    @bot.message_handler(commands=["track"])
+    @per_chat(message_chat)
+    def command_track(message):
+        handle_track(bot, store, message)
+
+    @bot.message_handler(commands=["plans"])
+    @per_chat(message_chat)
+    def command_plans(message):
+        handle_plans(bot, store, message)
+
+    @bot.message_handler(commands=["untrack"])
+    @per_chat(message_chat)
+    def command_untrack(message):
+        handle_untrack(bot, store, message)
+
+    @bot.message_handler(commands=["top"])
+    @per_chat(message_chat)
+    def command_top(message):
+        handle_top(bot, store, message)
+
+    @bot.message_handler(commands=["profile"])
+    @per_chat(message_chat)
+    def command_profile(message):
+        handle_profile(bot, store, message)
+
+    # -------- ONE-SHOT --------
+    @bot.message_handler(commands=["dca"])
+    @per_chat(message_chat)
+    def command_dca(message):
+        handle_dca(bot, store, message)
+
+    @bot.inline_handler(func=lambda query: True)
+    def inline_dca(query):
+        handle_inline_dca(bot, store, query)
+
+    @bot.callback_query_handler(func=lambda call: call.data.startswith("export_"))
+    @per_chat(callback_chat)
+    def callback_export(call):
+        user_id = call.message.chat.id
+        session = store.get_session(user_id)
+        fmt = call.data[len("export_"):]
+        bot.answer_callback_query(call.id, "")
+        if session.last_plan is None or fmt not in available_formats():
+            bot.send_message(user_id, tr(MessageId.EXPORT_EXPIRED, session.lang), parse_mode="Markdown")
+            return
+        calc_scheduler.submit(user_id, run_export, bot, user_id, session.last_plan, fmt, session.lang)
+
     # -------- MAIN FLOW --------
     @bot.message_handler(func=lambda m: True)
+    @per_chat(message_chat)
     def conversation_flow(message):
         user_id = message.chat.id
         session = store.get_session(user_id)
@@ -188,7 +300,15 @@ def register_handlers(bot: TeleBot, store: DataStore):
         if session.state == BotState.IDLE:
             bot.send_message(
                 user_id,
-                tr("not_sure", session.lang),
+                tr(MessageId.NOT_SURE, session.lang),
+                parse_mode="Markdown"
+            )
+            return
+
+        if session.state == BotState.CALCULATING:
+            bot.send_message(
+                user_id,
+                tr(MessageId.CALCULATION_PENDING, session.lang),
                 parse_mode="Markdown"
             )
             return
@@ -196,7 +316,7 @@ def register_handlers(bot: TeleBot, store: DataStore):
         if session.state == BotState.LANG_SELECT:
             bot.send_message(
                 user_id,
-                tr("lang_prompt", session.lang),
+                tr(MessageId.LANG_PROMPT, session.lang),
                 reply_markup=language_inline_keyboard(),
                 parse_mode="Markdown"
             )
@@ -229,11 +349,41 @@ def register_handlers(bot: TeleBot, store: DataStore):
         else:
             bot.send_message(
                 user_id,
-                tr("not_sure", session.lang),
+                tr(MessageId.NOT_SURE, session.lang),
                 parse_mode="Markdown"
             )
 
 # ---- Step Handlers ----
+def check_symbol(text, lang):
+    """
+    (SymbolInfo, None) if `text` names a trading Binance pair, or a
+    synthetic one built from two USDT legs (cross_rates.py), else
+    (None, localized error with suggestions). Until the index has been
+    refreshed from Binance, a pair it doesn't know is let through and
+    checked by the calculation instead.
+    """
+    pair_str = normalize_symbol(text)
+    current = SYMBOL_INDEX.ensure_current()
+    info = SYMBOL_INDEX.get(pair_str)
+    if info is not None and info.status == "TRADING":
+        return info, None
+    cross = resolve_cross(text)
+    if cross is not None:
+        return cross, None
+    if not current and info is None and pair_str:
+        return SymbolInfo(pair_str, None, None, "TRADING"), None
+
+    shown = pair_str or re.sub(r"[_*`\[\]]", "", text.strip())
+    key = MessageId.UNKNOWN_SYMBOL if info is None else MessageId.SYMBOL_NOT_TRADING
+    error = trf(key, lang, symbol=shown)
+    suggestions = SYMBOL_INDEX.suggest(text)
+    if suggestions:
+        error += "\n" + trf(
+            MessageId.SYMBOL_SUGGESTIONS, lang,
+            suggestions=", ".join(f"`{s}`" for s in suggestions)
+        )
+    return None, error
+
 def handle_investment_amount(bot, store, message):
     user_id = message.chat.id
     session = store.get_session(user_id)
@@ -245,26 +395,35 @@ def handle_investment_amount(bot, store, message):
         session.state = BotState.ENTERING_SYMBOL
         bot.send_message(
             user_id,
-            tr("ask_symbol", session.lang),
+            tr(MessageId.ASK_SYMBOL, session.lang),
             parse_mode="Markdown"
         )
     except ValueError:
         bot.send_message(
             user_id,
-            tr("invalid_amount", session.lang),
+            tr(MessageId.INVALID_AMOUNT, session.lang),
             parse_mode="Markdown"
         )
 
 def handle_symbol(bot, store, message):
     user_id = message.chat.id
     session = store.get_session(user_id)
-    pair_str = message.text.upper().replace("/", "").strip()
-    session.symbol = pair_str
+
+    # Validate against the local exchangeInfo index instead of finding out at
+    # calculation time; the user stays on this step until the pair is valid.
+    info, error = check_symbol(message.text, session.lang)
+    if error:
+        bot.send_message(user_id, error, parse_mode="Markdown")
+        return
+
+    session.symbol = info.symbol
+    # so the date checks further on don't have to wait for it
+    SYMBOL_INDEX.prefetch_listing(info.symbol)
 
     session.state = BotState.ASK_DATE_RANGE_OR_PERIOD
     bot.send_message(
         user_id,
-        tr("ask_range_or_period", session.lang),
+        tr(MessageId.ASK_RANGE_OR_PERIOD, session.lang),
         parse_mode="Markdown"
     )
 
@@ -277,20 +436,20 @@ def handle_ask_date_range_or_period(bot, store, message):
         session.state = BotState.ASK_CUSTOM_BOTH_RANGE
         bot.send_message(
             user_id,
-            tr("ask_range_continue", session.lang),
+            tr(MessageId.ASK_RANGE_CONTINUE, session.lang),
             parse_mode="Markdown"
         )
     elif "period" in text:
         session.state = BotState.ENTERING_PERIOD
         bot.send_message(
             user_id,
-            tr("ask_period", session.lang),
+            tr(MessageId.ASK_PERIOD, session.lang),
             parse_mode="Markdown"
         )
     else:
         bot.send_message(
             user_id,
-            tr("ask_range_or_period", session.lang),
+            tr(MessageId.ASK_RANGE_OR_PERIOD, session.lang),
             parse_mode="Markdown"
         )
 
@@ -301,7 +460,7 @@ def handle_ask_both_range(bot, store, message):
 
     bot.send_message(
         user_id,
-        tr("ask_range_start_instructions", session.lang),
+        tr(MessageId.ASK_RANGE_START_INSTRUCTIONS, session.lang),
         parse_mode="Markdown"
     )
 
@@ -317,13 +476,13 @@ def handle_range_start(bot, store, message, parse_func):
 
         bot.send_message(
             user_id,
-            tr("ask_range_end_instructions", session.lang),
+            tr(MessageId.ASK_RANGE_END_INSTRUCTIONS, session.lang),
             parse_mode="Markdown"
         )
     except ValueError as e:
         bot.send_message(
             user_id,
-            tr("range_parse_error_start", session.lang).format(error=str(e)),
+            trf(MessageId.RANGE_PARSE_ERROR_START, session.lang, error=str(e)),
             parse_mode="Markdown"
         )
 
@@ -334,18 +493,22 @@ def handle_range_end(bot, store, message, parse_func):
 
     try:
         end_dt = parse_func(text)
+        error = listing_error(session.symbol, end_dt, session.lang, fetch=False)
+        if error:
+            bot.send_message(user_id, error, parse_mode="Markdown")
+            return
         session.custom_range_end_date = end_dt
         session.state = BotState.ENTERING_FREQUENCY
 
         bot.send_message(
             user_id,
-            tr("ask_frequency", session.lang),
+            tr(MessageId.ASK_FREQUENCY, session.lang),
             parse_mode="Markdown"
         )
     except ValueError as e:
         bot.send_message(
             user_id,
-            tr("range_parse_error_end", session.lang).format(error=str(e)),
+            trf(MessageId.RANGE_PARSE_ERROR_END, session.lang, error=str(e)),
             parse_mode="Markdown"
         )
 
@@ -357,7 +520,7 @@ def handle_period(bot, store, message):
     session.state = BotState.ASK_CUSTOM_START
     bot.send_message(
         user_id,
-        tr("ask_custom_start", session.lang),
+        tr(MessageId.ASK_CUSTOM_START, session.lang),
         parse_mode="Markdown"
     )
 
@@ -370,7 +533,7 @@ def handle_ask_custom_start(bot, store, message):
         session.state = BotState.ENTERING_CUSTOM_START
         bot.send_message(
             user_id,
-            tr("ask_enter_custom_start", session.lang),
+            tr(MessageId.ASK_ENTER_CUSTOM_START, session.lang),
             parse_mode="Markdown"
         )
     else:
@@ -378,7 +541,7 @@ def handle_ask_custom_start(bot, store, message):
         session.state = BotState.ENTERING_FREQUENCY
         bot.send_message(
             user_id,
-            tr("ask_frequency", session.lang),
+            tr(MessageId.ASK_FREQUENCY, session.lang),
             parse_mode="Markdown"
         )
 
@@ -393,13 +556,13 @@ def handle_custom_start(bot, store, message):
         session.state = BotState.ENTERING_FREQUENCY
         bot.send_message(
             user_id,
-            tr("ask_frequency", session.lang),
+            tr(MessageId.ASK_FREQUENCY, session.lang),
             parse_mode="Markdown"
         )
     except ValueError:
         bot.send_message(
             user_id,
-            tr("invalid_date", session.lang),
+            tr(MessageId.INVALID_DATE, session.lang),
             parse_mode="Markdown"
         )
 
@@ -407,6 +570,11 @@ def handle_frequency(bot, store, message):
     user_id = message.chat.id
     session = store.get_session(user_id)
     freq_str = message.text.strip()
+    try:
+        session.freq_minutes = parse_minute_frequency(freq_str)
+    except ValueError as e:
+        bot.send_message(user_id, tr(MessageId.ERROR_VALUE, session.lang) + str(e), parse_mode="Markdown")
+        return
     # parse freq => daily or hourly
     (freq_value, is_hourly) = parse_investment_frequency(freq_str)
 
@@ -416,7 +584,7 @@ def handle_frequency(bot, store, message):
     session.state = BotState.ENTERING_FEE
     bot.send_message(
         user_id,
-        tr("ask_fee", session.lang),
+        tr(MessageId.ASK_FEE, session.lang),
         parse_mode="Markdown"
     )
 
@@ -436,128 +604,685 @@ def handle_fee(bot, store, message):
     except ValueError:
         bot.send_message(
             user_id,
-            tr("invalid_fee", session.lang),
+            tr(MessageId.INVALID_FEE, session.lang),
             parse_mode="Markdown"
         )
 
 def perform_calculation(bot, store, message):
+    """
+    Queue the calculation for this chat on the fair scheduler.
+    Tells the user their place in line when others are ahead of them.
+    Called with the chat's lock held, so a chat queues one calculation at
+    a time.
+    """
+    user_id = message.chat.id
+    session = store.get_session(user_id)
+
+    try:
+        error = listing_error(session.symbol, plan_range(session)[1], session.lang, fetch=False)
+    except ValueError:
+        error = None  # reported by run_calculation
+    if error:
+        bot.send_message(user_id, error, parse_mode="Markdown")
+        session.state = BotState.IDLE
+        return
+
+    wait = CALC_RATE_LIMITER.try_acquire(user_id)
+    if wait:
+        CALC_RATE_LIMITED.inc()
+        # stay in CALCULATE so any message retries once the bucket refills
+        bot.send_message(
+            user_id,
+            trf(MessageId.RATE_LIMITED, session.lang, seconds=int(wait) + 1),
+            parse_mode="Markdown"
+        )
+        return
+
+    # the job is on disk before it is queued, so a restart runs it again (see
+    # recover_calculations), and a message Telegram delivers twice is
+    # calculated once
+    try:
+        job_id = JOBS.add(f"{user_id}:{message.message_id}", user_id, session.snapshot())
+        if job_id is None:
+            session.state = BotState.IDLE
+            return
+    except sqlite3.Error as e:
+        logger.error(f"Could not save the calculation job of {user_id}, running it anyway: {e}")
+        job_id = None
+
+    # further messages get CALCULATION_PENDING until run_calculation is done
+    session.state = BotState.CALCULATING
+    profiled = PROFILER.claim()
+    if profiled is None:
+        ahead = calc_scheduler.submit(user_id, run_calculation, bot, store, user_id, job_id)
+    else:
+        ahead = calc_scheduler.submit(user_id, run_profiled_calculation, bot, store, user_id, job_id, *profiled)
+    if ahead:
+        bot.send_message(
+            user_id,
+            trf(MessageId.QUEUE_POSITION, session.lang, position=ahead + 1),
+            parse_mode="Markdown"
+        )
+
+def parse_track_args(text: str):
+    """
+    Parse "/track 50 BTC/USDT weekly since 2023-01-01 0.1%" (English or Farsi
+    digits/words) into (amount, pair_text, freq_value, is_hourly, start_dt, fee).
+    The start date defaults to now and the fee to 0. Raises ValueError.
+    """
+    tokens = persian_to_ascii(text).split()[1:]
+    if len(tokens) < 3:
+        raise ValueError("Not enough arguments.")
+    amount = float(tokens[0].replace("$", "").replace(",", ""))
+    if amount <= 0:
+        raise ValueError("Amount must be positive.")
+    pair_text = tokens[1]
+
+    start_dt, fee, freq_words = datetime.utcnow(), 0.0, []
+    for token in tokens[2:]:
+        if re.fullmatch(r"\d{4}-\d{2}-\d{2}", token):
+            start_dt = datetime.strptime(token, "%Y-%m-%d")
+        elif token.endswith("%"):
+            fee = float(token[:-1])
+            if fee < 0:
+                raise ValueError("Fee cannot be negative.")
+        elif token.lower() not in ("since", "from", "fee", "از"):
+            freq_words.append(token)
+    if not freq_words:
+        raise ValueError("Missing frequency.")
+    if parse_minute_frequency(" ".join(freq_words)):
+        raise ValueError("Tracked plans buy hourly at most.")
+    freq_value, is_hourly = parse_investment_frequency(" ".join(freq_words))
+    return amount, pair_text, freq_value, is_hourly, start_dt, fee
+
+def handle_track(bot, store, message):
     user_id = message.chat.id
     session = store.get_session(user_id)
     lang = session.lang
 
+    try:
+        amount, pair_text, freq_value, is_hourly, start_dt, fee = parse_track_args(message.text)
+    except ValueError:
+        bot.send_message(user_id, tr(MessageId.TRACK_USAGE, lang), parse_mode="Markdown")
+        return
+
+    info, error = check_symbol(pair_text, lang)
+    if error:
+        bot.send_message(user_id, error, parse_mode="Markdown")
+        return
+
+    if len(TRACKER.plans(user_id)) >= MAX_PLANS_PER_CHAT:
+        bot.send_message(user_id, trf(MessageId.TRACK_LIMIT, lang, limit=MAX_PLANS_PER_CHAT), parse_mode="Markdown")
+        return
+
+    plan_id = TRACKER.add(user_id, info.symbol, amount, freq_value, is_hourly, start_dt, fee, lang)
     bot.send_message(
         user_id,
-        tr("calculating", lang),
+        trf(
+            MessageId.TRACK_ADDED, lang,
+            plan_id=plan_id, amount=amount, symbol=info.symbol, freq_value=freq_value,
+            unit=tr(MessageId.UNIT_HOURS if is_hourly else MessageId.UNIT_DAYS, lang),
+            start=start_dt.strftime("%Y-%m-%d")
+        ),
         parse_mode="Markdown"
     )
 
-    try:
-        total_investment = session.total_investment
-        symbol = session.symbol
-        freq_value = session.freq_value
-        is_hourly = session.freq_is_hourly
-        fee_percent = session.fee_percent
+def handle_plans(bot, store, message):
+    user_id = message.chat.id
+    lang = store.get_session(user_id).lang
+    plans = TRACKER.plans(user_id)
+    if not plans:
+        bot.send_message(user_id, tr(MessageId.PLANS_EMPTY, lang), parse_mode="Markdown")
+        return
+
+    lines = [tr(MessageId.PLANS_HEADER, lang)]
+    for plan in plans:
+        is_hourly = plan["interval"] == "1h"
+        lines.append(trf(
+            MessageId.PLANS_LINE, lang,
+            plan_id=plan["plan_id"], symbol=plan["symbol"], amount=plan["amount"],
+            freq_value=plan["step_ms"] // (3_600_000 if is_hourly else 86_400_000),
+            unit=tr(MessageId.UNIT_HOURS if is_hourly else MessageId.UNIT_DAYS, lang),
+            start=datetime.utcfromtimestamp(plan["start_ms"] / 1000).strftime("%Y-%m-%d"),
+            purchases=plan["purchases"], invested=plan["invested"]
+        ))
+    bot.send_message(user_id, "\n".join(lines), parse_mode="Markdown")
+
+def handle_untrack(bot, store, message):
+    user_id = message.chat.id
+    lang = store.get_session(user_id).lang
+    args = persian_to_ascii(message.text).split()[1:]
+    plan_id = args[0].lstrip("#") if args else ""
+    if not plan_id.isdigit():
+        bot.send_message(user_id, tr(MessageId.TRACK_USAGE, lang), parse_mode="Markdown")
+        return
 
-        if session.custom_range_end_date:
-            start_dt = session.custom_start_date
-            end_dt = session.custom_range_end_date
-        else:
-            # period approach
-            end_dt = datetime.utcnow()
-            if session.custom_start_date:
-                start_dt = session.custom_start_date
+    key = MessageId.UNTRACK_DONE if TRACKER.remove(user_id, int(plan_id)) else MessageId.UNTRACK_UNKNOWN
+    bot.send_message(user_id, trf(key, lang, plan_id=plan_id), parse_mode="Markdown")
+
+TOP_MAX_LIMIT = 25
+
+def handle_top(bot, store, message):
+    """
+    "/top [6m|1y|3y] [count]": the pairs where the standard weekly plan did
+    best over the period, from the precomputed leaderboard at current prices.
+    """
+    user_id = message.chat.id
+    lang = store.get_session(user_id).lang
+    period, limit = TOP_DEFAULT_PERIOD, 10
+    try:
+        for arg in persian_to_ascii(message.text).lower().split()[1:]:
+            if arg in TOP_PERIODS:
+                period = arg
+            elif arg.isdigit() and 1 <= int(arg) <= TOP_MAX_LIMIT:
+                limit = int(arg)
             else:
-                delta = parse_investment_period(session.period_str)
-                start_dt = end_dt - delta
+                raise ValueError(arg)
+    except ValueError:
+        bot.send_message(user_id, trf(MessageId.TOP_USAGE, lang, max=TOP_MAX_LIMIT), parse_mode="Markdown")
+        return
 
-        if start_dt > end_dt:
-            raise ValueError("Start date is after end date. Please ensure start <= end.")
+    try:
+        rows = LEADERBOARD.top(period, limit)
+    except Exception as e:
+        logger.error(f"Could not price the leaderboard: {e}")
+        rows = None
+    if not rows:
+        bot.send_message(user_id, tr(MessageId.TOP_UNAVAILABLE, lang), parse_mode="Markdown")
+        return
+
+    lines = [trf(
+        MessageId.TOP_HEADER, lang, count=len(rows), amount=TOP_AMOUNT, period=period,
+        computed=LEADERBOARD.computed_at.strftime("%Y-%m-%d %H:%M")
+    )]
+    for rank, row in enumerate(rows, 1):
+        lines.append(trf(MessageId.TOP_LINE, lang, rank=rank, **row))
+    bot.send_message(user_id, "\n".join(lines), parse_mode="Markdown")
+
+# "1y", "6m", "2w", "30d"
+COMPACT_PERIOD = re.compile(r"(\d+)([ymwd])")
+PERIOD_UNITS = {"y": "year", "m": "month", "w": "week", "d": "day"}
+DATE_TOKEN = re.compile(r"\d{4}-\d{2}-\d{2}")
+# "open", "typical", "random", "random:42"
+EXECUTION_TOKEN = re.compile(r"(%s)(?::(\d+))?" % "|".join(EXECUTION_MODELS))
+
+DcaArgs = namedtuple("DcaArgs", [
+    "amount", "pair_text", "period_str", "start_dt", "end_dt",
+    "freq_value", "is_hourly", "freq_minutes", "fee", "execution", "seed"
+])
+
+def parse_dca_args(text: str):
+    """
+    Parse the arguments of "/dca 1000 BTCUSDT 1y weekly 0.1%" (English or
+    Farsi digits/words) with the step-by-step flow's parsers. The period is
+    "1y"/"6m"/"2w"/"30d", "6 months", or a start date with an optional end
+    date; it defaults to 1 year, the frequency to weekly and the fee to 0.
+    "15m" is ambiguous: the first such token is the period (15 months), one
+    after the period or after "every" is the frequency (every 15 minutes).
+    An execution model ("open", "typical", "random" or "random:<seed>") may
+    be given anywhere after the pair; the default is "close".
+    Returns DcaArgs, with period_str or start_dt set and freq_minutes None
+    unless the frequency is sub-hour. Raises ValueError.
+    """
+    tokens = persian_to_ascii(text).lower().split()
+    if len(tokens) < 2:
+        raise ValueError("Not enough arguments.")
+    amount = float(tokens[0].replace("$", "").replace(",", "").replace("٬", ""))
+    if amount <= 0:
+        raise ValueError("Amount must be positive.")
+    pair_text = tokens[1]
+
+    period_str, dates, fee, freq_words = None, [], 0.0, []
+    execution, seed = "close", 0
+    rest = tokens[2:]
+    i = 0
+    while i < len(rest):
+        token = rest[i]
+        # numbers after "every" belong to the frequency ("every 3 days")
+        after_every = bool(freq_words) and freq_words[-1] == "every"
+        compact = COMPACT_PERIOD.fullmatch(token)
+        fill = EXECUTION_TOKEN.fullmatch(token)
+        if fill:
+            execution, seed = fill.group(1), int(fill.group(2) or 0)
+        elif DATE_TOKEN.fullmatch(token):
+            dates.append(datetime.strptime(token, "%Y-%m-%d"))
+        elif token.endswith("%"):
+            fee = float(token[:-1])
+            if fee < 0:
+                raise ValueError("Fee cannot be negative.")
+        elif period_str is None and not after_every and compact:
+            period_str = f"{compact.group(1)} {PERIOD_UNITS[compact.group(2)]}"
+        elif (period_str is None and not after_every and token.isdigit() and i + 1 < len(rest)
+              and rest[i + 1].startswith(("year", "month", "week", "day"))):
+            period_str = f"{token} {rest[i + 1]}"
+            i += 1
+        elif token not in ("for", "since", "from", "to", "until", "fee", "از", "تا", "کارمزد"):
+            freq_words.append(token)
+        i += 1
+
+    if len(dates) > 2 or (dates and period_str):
+        raise ValueError("Give either a period or dates, not both.")
+    start_dt = dates[0] if dates else None
+    end_dt = dates[1] if len(dates) == 2 else None
+    if end_dt is not None and start_dt > end_dt:
+        raise ValueError("Start date is after end date.")
+    if start_dt is None and period_str is None:
+        period_str = "1 year"
+    freq_minutes = parse_minute_frequency(" ".join(freq_words))
+    freq_value, is_hourly = parse_investment_frequency(" ".join(freq_words))
+    return DcaArgs(
+        amount, pair_text, period_str, start_dt, end_dt,
+        freq_value, is_hourly, freq_minutes, fee, execution, seed
+    )
+
+def apply_dca_args(session, symbol, args):
+    """Fill a session's plan from parse_dca_args() output, as the step-by-step flow would."""
+    session.total_investment = args.amount
+    session.symbol = symbol
+    session.period_str = args.period_str or ""
+    session.custom_start_date = args.start_dt
+    session.custom_range_end_date = args.end_dt
+    session.freq_value = args.freq_value
+    session.freq_is_hourly = args.is_hourly
+    session.freq_minutes = args.freq_minutes
+    session.fee_percent = args.fee
+    session.execution = args.execution
+    session.execution_seed = args.seed
+
+def handle_profile(bot, store, message):
+    """
+    "/profile 3" (ADMIN_CHAT_IDS only): profile the next 3 calculations of
+    any chat and send the summaries here. Anyone else gets the usual
+    "not sure" reply.
+    """
+    user_id = message.chat.id
+    lang = store.get_session(user_id).lang
+    if user_id not in ADMIN_CHAT_IDS:
+        bot.send_message(user_id, tr(MessageId.NOT_SURE, lang), parse_mode="Markdown")
+        return
+    args = message.text.split()[1:]
+    try:
+        count = int(persian_to_ascii(args[0])) if args else 1
+        if count < 1:
+            raise ValueError
+    except ValueError:
+        bot.send_message(user_id, tr(MessageId.PROFILE_USAGE, lang), parse_mode="Markdown")
+        return
+    PROFILER.arm(count, user_id)
+    bot.send_message(user_id, trf(MessageId.PROFILE_ARMED, lang, count=PROFILER.remaining()), parse_mode="Markdown")
+
+def handle_dca(bot, store, message):
+    user_id = message.chat.id
+    session = store.get_session(user_id)
+    parts = message.text.split(maxsplit=1)
+
+    try:
+        args = parse_dca_args(parts[1] if len(parts) > 1 else "")
+    except ValueError:
+        bot.send_message(user_id, tr(MessageId.DCA_USAGE, session.lang), parse_mode="Markdown")
+        return
+
+    info, error = check_symbol(args.pair_text, session.lang)
+    if error:
+        bot.send_message(user_id, error, parse_mode="Markdown")
+        return
 
-        # Now call calculate_dca with the new approach
-        dca_result = calculate_dca(
-            total_investment=total_investment,
-            symbol=symbol,
+    if session.state == BotState.CALCULATING:
+        bot.send_message(user_id, tr(MessageId.CALCULATION_PENDING, session.lang), parse_mode="Markdown")
+        return
+
+    # the rest is exactly the end of the step-by-step flow
+    apply_dca_args(session, info.symbol, args)
+    session.state = BotState.CALCULATE
+    perform_calculation(bot, store, message)
+
+def handle_inline_dca(bot, store, query):
+    """
+    "@bot 1000 BTCUSDT 1y weekly" in any chat: answer with the report as a
+    message the user can send. Answers are cached for INLINE_CACHE_SECONDS.
+    """
+    user_id = query.from_user.id
+    session = store.user_sessions.get(user_id)
+    if session is not None:
+        lang = session.lang
+    else:
+        lang = "fa" if (query.from_user.language_code or "").startswith("fa") else "en"
+
+    try:
+        args = parse_dca_args(query.query)
+        info, _ = check_symbol(args.pair_text, lang)
+    except ValueError:
+        info = None
+    if info is None:
+        INLINE_QUERIES.inc(result="invalid")
+        bot.answer_inline_query(
+            query.id, [], cache_time=INLINE_CACHE_SECONDS, is_personal=True,
+            switch_pm_text=tr(MessageId.INLINE_HELP, lang), switch_pm_parameter="dca"
+        )
+        return
+
+    key = (info.symbol, lang) + args._replace(pair_text=None)
+    results = INLINE_ANSWERS.get(key)
+    if results is not None:
+        INLINE_QUERIES.inc(result="cached")
+        bot.answer_inline_query(query.id, results, cache_time=INLINE_CACHE_SECONDS, is_personal=True)
+        return
+
+    # every keystroke is a query; only the ones that parse get this far
+    if INLINE_RATE_LIMITER.try_acquire(user_id):
+        INLINE_QUERIES.inc(result="rate_limited")
+        return
+    plan = UserSession()
+    plan.lang = lang
+    apply_dca_args(plan, info.symbol, args)
+    calc_scheduler.submit(user_id, run_inline_calculation, bot, query.id, key, plan)
+
+def run_inline_calculation(bot, query_id, key, plan):
+    try:
+        start_dt, end_dt = plan_range(plan)
+        if start_dt > end_dt or listing_error(plan.symbol, end_dt, plan.lang):
+            results = []
+        else:
+            dca_result, _ = calculate_plan(plan, start_dt, end_dt)
+            results = [inline_report(dca_result, plan.lang)]
+        INLINE_ANSWERS.put(key, results)
+        INLINE_QUERIES.inc(result="computed")
+        bot.answer_inline_query(query_id, results, cache_time=INLINE_CACHE_SECONDS, is_personal=True)
+    except Exception as e:
+        # typically the query expired while it waited; nothing to tell anyone
+        INLINE_QUERIES.inc(result="failed")
+        logger.error(f"Inline query {query_id} failed: {e}")
+
+def inline_report(dca_result, lang):
+    """The report as an inline result; sending it posts the report caption."""
+    fields = dict(
+        symbol=dca_result["symbol"],
+        roi=dca_result["roi_percent"],
+        ls_roi=dca_result["lump_sum_roi"],
+        **money_fields(dca_result, lang)
+    )
+    return types.InlineQueryResultArticle(
+        id="dca",
+        title=trf(MessageId.INLINE_TITLE, lang, **fields),
+        description=trf(MessageId.INLINE_DESCRIPTION, lang, **fields),
+        input_message_content=types.InputTextMessageContent(
+            build_report_caption(dca_result, lang), parse_mode="Markdown"
+        )
+    )
+
+class InlineAnswers:
+    """Small LRU of inline results by normalized query, each kept for `ttl_seconds`."""
+    def __init__(self, max_entries=512, ttl_seconds=INLINE_CACHE_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, results):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+INLINE_ANSWERS = InlineAnswers()
+
+def plan_range(session):
+    """(start_dt, end_dt) of the session's plan, from its range or period."""
+    if session.custom_range_end_date:
+        return session.custom_start_date, session.custom_range_end_date
+    # period approach
+    end_dt = datetime.utcnow()
+    if session.custom_start_date:
+        return session.custom_start_date, end_dt
+    delta = parse_investment_period(session.period_str)
+    return end_dt - delta, end_dt
+
+def listing_error(symbol, end_dt, lang, fetch=True):
+    """Localized error if the plan ends before the pair was listed, else None."""
+    listed = SYMBOL_INDEX.listed_at(symbol, fetch=fetch) if symbol else None
+    if listed is not None and end_dt < listed:
+        return trf(MessageId.BEFORE_LISTING, lang, symbol=symbol, listed=listed.strftime("%Y-%m-%d"))
+    return None
+
+def calculate_plan(session, start_dt, end_dt):
+    """
+    (dca_result, plan) for the session's plan over [start_dt, end_dt], where
+    plan holds the calculate_dca() arguments, or is None for sub-hour plans:
+    those are streamed and neither memoized nor exportable.
+    """
+    if session.freq_minutes:
+        if end_dt - start_dt > timedelta(days=MINUTE_PLAN_MAX_DAYS):
+            raise ValueError(f"Sub-hour plans can span at most {MINUTE_PLAN_MAX_DAYS} days.")
+        dca_result = calculate_dca_streaming(
+            total_investment=session.total_investment,
+            symbol=session.symbol,
             start_dt=start_dt,
             end_dt=end_dt,
-            freq_value=freq_value,
-            is_hourly=is_hourly,
-            fee_percent=fee_percent
+            freq_minutes=session.freq_minutes,
+            fee_percent=session.fee_percent,
+            execution=session.execution,
+            seed=session.execution_seed
         )
+        return dca_result, None
+
+    # Repeated plans (and the standard ones the cache warmer precomputes)
+    # are only revalued at the live price
+    plan = dict(
+        total_investment=session.total_investment,
+        symbol=session.symbol,
+        start_dt=start_dt,
+        end_dt=end_dt,
+        freq_value=session.freq_value,
+        is_hourly=session.freq_is_hourly,
+        fee_percent=session.fee_percent,
+        execution=session.execution,
+        seed=session.execution_seed
+    )
+    return RESULT_CACHE.calculate(**plan), plan
 
-        chart_path = create_dca_plot(dca_result["purchase_history"], symbol)
+def recover_calculations(bot, store):
+    """
+    Queue the jobs a previous run didn't finish, at startup. Their chats
+    get their language back and are CALCULATING until the job is done.
+    Returns how many were queued.
+    """
+    jobs = JOBS.unfinished()
+    for job_id, user_id, payload in jobs:
+        with store.lock(user_id):
+            live = store.get_session(user_id)
+            live.lang = payload.get("lang", live.lang)
+            live.state = BotState.CALCULATING
+        calc_scheduler.submit(user_id, run_calculation, bot, store, user_id, job_id)
+    if jobs:
+        logger.info(f"Recovered {len(jobs)} unfinished calculations")
+    return len(jobs)
+
+def run_calculation(bot, store, user_id, job_id=None):
+    # work on a copy: the chat's lock isn't held for the whole calculation,
+    # and its handlers may change the session meanwhile
+    with store.lock(user_id):
+        live = store.get_session(user_id)
+        session = copy.copy(live)
+    # the job's last message (report or error) completes it once delivered
+    done = {}
+    if job_id is not None:
+        session = UserSession.from_snapshot(JOBS.start(job_id))
+        done = {"on_done": functools.partial(JOBS.finish, job_id)}
+    lang = session.lang
 
-        report_text = build_report_caption(dca_result, lang)
-        # Truncate if caption is too long
-        if len(report_text) > 1000:
-            report_text = report_text[:1000] + "\n... (truncated)"
+    bot.send_message(
+        user_id,
+        tr(MessageId.CALCULATING, lang),
+        parse_mode="Markdown"
+    )
 
-        with open(chart_path, "rb") as photo:
+    try:
+        symbol = session.symbol
+        with stage("parse"):
+            start_dt, end_dt = plan_range(session)
+            if start_dt > end_dt:
+                raise ValueError("Start date is after end date. Please ensure start <= end.")
+
+            # a plan ending before the pair existed can't have any prices
+            error = listing_error(symbol, end_dt, lang)
+        if error:
+            bot.send_message(user_id, error, parse_mode="Markdown", **done)
+            return
+
+        dca_result, plan = calculate_plan(session, start_dt, end_dt)
+
+        with stage("render"):
+            chart_path = create_dca_plot(dca_result["purchase_history"], symbol)
+
+            report_text = build_report_caption(dca_result, lang)
+            # Truncate if caption is too long
+            if len(report_text) > 1000:
+                report_text = report_text[:1000] + "\n... (truncated)"
+
+        # only queued here; a profiled run also waits for the outbox to send it
+        send_kwargs, wait_sent = track_send(done)
+        with open(chart_path, "rb") as photo, SEND_PHOTO_SECONDS.time(), stage("enqueue"):
             bot.send_photo(
                 user_id,
                 photo,
                 caption=report_text,
-                parse_mode="Markdown"
+                reply_markup=export_keyboard(lang, available_formats()) if plan else None,
+                parse_mode="Markdown",
+                **send_kwargs
             )
+        wait_sent()
 
-        session.state = BotState.IDLE
+        # the export buttons recompute this plan, normally a cache hit
+        with store.lock(user_id):
+            live.last_plan = plan
 
     except ValueError as e:
         logger.error(f"ValueError: {e}")
         bot.send_message(
             user_id,
-            tr("error_value", lang) + str(e),
-            parse_mode="Markdown"
+            tr(MessageId.ERROR_VALUE, lang) + str(e),
+            parse_mode="Markdown",
+            **done
         )
-        session.state = BotState.IDLE
     except Exception as e:
         logger.exception(f"Unexpected error: {e}")
         bot.send_message(
             user_id,
-            tr("error_unexpected", lang) + str(e),
-            parse_mode="Markdown"
+            tr(MessageId.ERROR_UNEXPECTED, lang) + str(e),
+            parse_mode="Markdown",
+            **done
         )
-        session.state = BotState.IDLE
+    finally:
+        with store.lock(user_id):
+            # unless the chat has moved on (/cancel, /start) meanwhile
+            if live.state == BotState.CALCULATING:
+                live.state = BotState.IDLE
+
+def run_profiled_calculation(bot, store, user_id, job_id, notify_chat):
+    """run_calculation() under PROFILER; the summary goes to notify_chat, if any."""
+    # label the plan run_calculation will compute: the job's, else a copy
+    if job_id is not None:
+        session = UserSession.from_snapshot(JOBS.payload(job_id))
+    else:
+        with store.lock(user_id):
+            session = copy.copy(store.get_session(user_id))
+    resolution = f"{session.freq_minutes}m" if session.freq_minutes else "1h" if session.freq_is_hourly else "1d"
+    label = f"{session.symbol} {resolution} {session.period_str or 'custom range'} (chat {user_id})"
+    with PROFILER.profile(label, notify_chat) as run:
+        run_calculation(bot, store, user_id, job_id)
+    if run is None:
+        # another calculation was being profiled; try the next one instead
+        PROFILER.arm(1, notify_chat)
+    elif notify_chat is not None:
+        bot.send_message(notify_chat, f"```\n{run.summary()}\n```", parse_mode="Markdown")
+
+def run_export(bot, user_id, plan, fmt, lang):
+    """Send the full purchase history of `plan` as a document."""
+    try:
+        dca_result = RESULT_CACHE.calculate(**plan)
+        # an anonymous temporary file: removed as soon as it is closed
+        with tempfile.TemporaryFile() as f:
+            filename = export_history(dca_result, fmt, f)
+            f.seek(0)
+            bot.send_document(
+                user_id,
+                f,
+                visible_file_name=filename,
+                caption=trf(
+                    MessageId.EXPORT_CAPTION, lang,
+                    symbol=dca_result["symbol"], purchases=len(dca_result["purchase_history"])
+                ),
+                parse_mode="Markdown"
+            )
+    except ValueError as e:
+        bot.send_message(user_id, tr(MessageId.ERROR_VALUE, lang) + str(e), parse_mode="Markdown")
+    except Exception as e:
+        logger.exception(f"Export failed: {e}")
+        bot.send_message(user_id, tr(MessageId.ERROR_UNEXPECTED, lang) + str(e), parse_mode="Markdown")
+
+# Quote currencies shown with a sign; any other is shown by its code.
+CURRENCY_SIGNS = {
+    "USDT": "$", "USDC": "$", "FDUSD": "$", "TUSD": "$", "BUSD": "$", "USD": "$",
+    "EUR": "€", "GBP": "£", "TRY": "₺", "JPY": "¥",
+}
+
+def quote_asset(symbol):
+    """The currency `symbol` is priced in (USDT if the index doesn't know it)."""
+    if is_cross(symbol):
+        return split_cross(symbol)[1]
+    info = SYMBOL_INDEX.get(symbol)
+    return "USDT" if info is None else info.quote
+
+def format_money(value, quote, lang):
+    """`value` in the quote currency: "$1,234.56" / "0.05123 BTC"; Farsi puts the sign after."""
+    if value and abs(value) < 1:
+        # four significant digits for prices like 0.0000123
+        text = f"{value:,.{min(8, 3 - math.floor(math.log10(abs(value))))}f}"
+    else:
+        text = f"{value:,.2f}"
+    sign = CURRENCY_SIGNS.get(quote)
+    if sign is None:
+        return f"{text} {quote}"
+    return f"{text}{sign}" if lang == "fa" else f"{sign}{text}"
+
+def money_fields(dca_result, lang):
+    """The report's amounts, formatted in the pair's quote currency."""
+    quote = quote_asset(dca_result["symbol"])
+    return {
+        name: format_money(dca_result[key], quote, lang)
+        for name, key in (
+            ("total_inv", "total_investment"), ("avg_price", "avg_purchase_price"),
+            ("curr_price", "current_price"), ("curr_value", "current_portfolio_value"),
+        )
+    }
 
 def build_report_caption(dca_result, lang):
     """
-    We keep the old approach for final text.
-    You could add your own annualized logic, etc.
+    Fill the localized report template with the DCA results.
     """
-    symbol = dca_result["symbol"]
-    total_inv = dca_result["total_investment"]
-    total_coins = dca_result["total_coins_purchased"]
-    avg_price = dca_result["avg_purchase_price"]
-    curr_price = dca_result["current_price"]
-    curr_value = dca_result["current_portfolio_value"]
-    roi = dca_result["roi_percent"]
-    ls_roi = dca_result["lump_sum_roi"]
-
-    if lang == 'fa':
-        caption = (
-            f"✅ *گزارش نهایی DCA شما*\n\n"
-            f"🔸 **جفت ارز:** {symbol}\n"
-            f"💰 **مبلغ کل سرمایه‌گذاری:** {total_inv:,.2f}$\n"
-            f"🔹 **تعداد کوین خریداری‌شده:** {total_coins:.6f}\n"
-            f"⚖️ **میانگین قیمت خرید:** {avg_price:,.2f}$\n"
-            f"🔎 **قیمت فعلی:** {curr_price:,.2f}$\n"
-            f"💼 **ارزش فعلی پرتفوی:** {curr_value:,.2f}$\n"
-            f"📈 **درصد بازدهی (ROI):** {roi:+.2f}%\n\n"
-            f"💥 **مقایسه با خرید یکجا:**\n"
-            f"• بازدهی کلی: {ls_roi:+.2f}%\n\n"
-            f"_DCA می‌تواند ریسک زمان‌بندی بازار را کم کند (مشاورهٔ مالی نیست)_"
-        )
-    else:
-        caption = (
-            f"✅ *Your Final DCA Report*\n\n"
-            f"🔸 **Pair:** {symbol}\n"
-            f"💰 **Total Investment:** ${total_inv:,.2f}\n"
-            f"🔹 **Coins Purchased:** {total_coins:.6f}\n"
-            f"⚖️ **Average Cost:** ${avg_price:,.2f}\n"
-            f"🔎 **Current Price:** ${curr_price:,.2f}\n"
-            f"💼 **Current Portfolio Value:** ${curr_value:,.2f}\n"
-            f"📈 **ROI:** {roi:+.2f}%\n\n"
-            f"💥 **Lump-Sum Comparison:**\n"
-            f"• Overall ROI: {ls_roi:+.2f}%\n\n"
-            f"_DCA helps reduce market-timing risk (Not financial advice)_"
-        )
-    return caption
+    return trf(
+        MessageId.REPORT_CAPTION,
+        lang,
+        symbol=dca_result["symbol"],
+        total_coins=dca_result["total_coins_purchased"],
+        roi=dca_result["roi_percent"],
+        ls_roi=dca_result["lump_sum_roi"],
+        **money_fields(dca_result, lang)
+    ) + execution_note(dca_result, lang)
+
+def execution_note(dca_result, lang):
+    """A line naming the fill model, for anything but the default close fills."""
+    execution = dca_result.get("execution", "close")
+    if execution == "close":
+        return ""
+    seed_note = f" (seed {dca_result['seed']})" if execution == "random" else ""
+    return trf(MessageId.EXECUTION_NOTE, lang, execution=execution, seed_note=seed_note)
@@ -0,0 +1,233 @@
+# cross_rates.py
+#
+# Synthetic pairs for quotes Binance doesn't list a coin against, e.g.
+# SOL/TRY or DOGE/EUR. Both assets are priced in USDT (SOLUSDT and USDTTRY,
+# inverted), and the pair's candles are the ratio of the two legs' candles,
+# joined on open time. The legs come through get_closing_prices, so they are
+# served from the price store and kline cache like any other pair.
+#
+# Synthetic symbols are written "BASE/QUOTE"; real Binance symbols never
+# contain the separator, and binance_api routes such symbols here. Aligned
+# series are memoized per (symbol, interval), so repeated reports on the same
+# cross don't redo the join. A join is only memoized when both legs reached
+# the end of the range: a leg cut short by a failed fetch is fetched again.
+
+import os
+import time
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from binance_api import (
+    PriceSeries,
+    CROSS_SEPARATOR,
+    get_closing_prices,
+    fetch_current_price,
+    interval_ms,
+    to_ms
+)
+from symbol_index import SYMBOL_INDEX, SymbolInfo, COIN_ALIASES, PREFERRED_QUOTES, normalize_symbol
+from metrics import Counter
+
+# the currency both legs are priced in
+VIA = "USDT"
+CROSS_CACHE_SIZE = int(os.getenv("CROSS_CACHE_SIZE", "64"))
+# an aligned series that ends with a still-open candle is reused this long
+CROSS_CACHE_SECONDS = float(os.getenv("CROSS_CACHE_SECONDS", "60"))
+# one whose candles had all closed, at most this long
+CROSS_SETTLED_SECONDS = float(os.getenv("CROSS_SETTLED_SECONDS", "86400"))
+# for the completeness check of "1M" legs, which have no fixed length
+MONTH_MS = 31 * 86_400_000
+
+CROSS_CACHE_REQUESTS = Counter("cross_rate_cache_requests_total", "Lookups of aligned cross-rate series.", ["result"])
+
+# `asset` priced in VIA: the Binance pair, and whether it quotes VIA in the
+# asset (USDTTRY) rather than the asset in VIA (SOLUSDT)
+Leg = namedtuple("Leg", ["symbol", "inverted"])
+
+def is_cross(symbol):
+    return CROSS_SEPARATOR in symbol
+
+def split_cross(symbol):
+    base, quote = symbol.split(CROSS_SEPARATOR)
+    return base, quote
+
+def leg(asset):
+    """The Leg pricing `asset` in VIA, None for VIA itself. Raises ValueError if Binance has neither."""
+    if asset == VIA:
+        return None
+    for symbol, inverted in ((asset + VIA, False), (VIA + asset, True)):
+        info = SYMBOL_INDEX.get(symbol)
+        if info is not None and info.status == "TRADING":
+            return Leg(symbol, inverted)
+    raise ValueError(f"Binance has no {VIA} market for {asset}")
+
+def legs(symbol):
+    """(base leg, quote leg) of a synthetic symbol."""
+    base, quote = split_cross(symbol)
+    return leg(base), leg(quote)
+
+def resolve(text):
+    """
+    SymbolInfo of the synthetic pair `text` names ("SOL/TRY", "doge eur",
+    "SOLTRY"), or None if it isn't one whose two legs trade. Pairs Binance
+    lists are not synthetic; check those first.
+    """
+    parts = [p for p in (normalize_symbol(p) for p in text.replace("-", "/").replace(" ", "/").split("/")) if p]
+    if len(parts) == 2:
+        splits = [tuple(parts)]
+    elif len(parts) == 1:
+        # no separator: split off an asset Binance quotes pairs in, so a
+        # typo isn't taken for a cross
+        word, quotes = parts[0], SYMBOL_INDEX.quote_assets()
+        splits = sorted(
+            ((word[:i], word[i:]) for i in range(2, len(word) - 1) if word[i:] in quotes),
+            key=lambda split: (split[1] not in PREFERRED_QUOTES, -len(split[1]))
+        )
+    else:
+        return None
+    for base, quote in splits:
+        base = COIN_ALIASES.get(base, base)
+        if base == quote:
+            continue
+        try:
+            legs(base + CROSS_SEPARATOR + quote)
+        except ValueError:
+            continue
+        return SymbolInfo(base + CROSS_SEPARATOR + quote, base, quote, "TRADING")
+    return None
+
+# ---- series ----
+
+def reciprocal(prices):
+    """The series of 1 / price; an inverted pair's high is 1 / its low."""
+    return PriceSeries(
+        prices.interval, prices.open_times, 1.0 / prices.closes,
+        None if prices.opens is None else 1.0 / prices.opens,
+        None if prices.lows is None else 1.0 / prices.lows,
+        None if prices.highs is None else 1.0 / prices.highs
+    )
+
+def ratio(base, quote):
+    """
+    base / quote on the candles both have, joined on open time. The synthetic
+    candle's high and low are the widest the legs allow (base high / quote
+    low and base low / quote high): the legs' extremes needn't have been at
+    the same moment.
+    """
+    open_times, bi, qi = np.intersect1d(
+        base.open_times, quote.open_times, assume_unique=True, return_indices=True
+    )
+
+    def column(b, q):
+        if b is None or q is None:
+            return None
+        return np.asarray(b)[bi] / np.asarray(q)[qi]
+
+    return PriceSeries(
+        base.interval, open_times, column(base.closes, quote.closes),
+        column(base.opens, quote.opens), column(base.highs, quote.lows), column(base.lows, quote.highs)
+    )
+
+def _leg_prices(leg, start_dt, end_dt, interval):
+    prices = get_closing_prices(leg.symbol, start_dt, end_dt, interval)
+    return reciprocal(prices) if leg.inverted else prices
+
+def _complete(prices, end_ms, now_ms):
+    """
+    Whether a leg reaches the last candle opening by end_ms. Near now, the
+    candle still open (or only just closed) may be missing.
+    """
+    if not len(prices):
+        return False
+    step_ms = interval_ms(prices.interval) or MONTH_MS
+    slack_ms = step_ms if end_ms + step_ms > now_ms else 0
+    return int(prices.open_times[-1]) > min(end_ms, now_ms) - step_ms - slack_ms
+
+def _slice(prices, start_ms, end_ms):
+    lo = np.searchsorted(prices.open_times, start_ms, side="left")
+    hi = np.searchsorted(prices.open_times, end_ms, side="right")
+    return PriceSeries(
+        prices.interval, prices.open_times[lo:hi], prices.closes[lo:hi],
+        *(None if values is None else values[lo:hi] for values in (prices.opens, prices.highs, prices.lows))
+    )
+
+class _Aligned:
+    __slots__ = ("prices", "start_ms", "end_ms", "built_ms")
+
+    def __init__(self, prices, start_ms, end_ms, built_ms):
+        self.prices = prices
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.built_ms = built_ms
+
+class CrossRates:
+    def __init__(self, max_entries=CROSS_CACHE_SIZE, ttl_seconds=CROSS_CACHE_SECONDS,
+                 settled_seconds=CROSS_SETTLED_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.settled_seconds = settled_seconds
+        self._entries = OrderedDict()  # (symbol, interval) -> _Aligned
+        self._lock = threading.Lock()
+
+    def _get(self, key, start_ms, end_ms):
+        now_ms = int(time.time() * 1000)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or start_ms < entry.start_ms:
+                return None
+            ttl_ms = self.ttl_seconds * 1000
+            fresh = now_ms - entry.built_ms < ttl_ms and end_ms <= entry.end_ms + ttl_ms
+            # every candle of the range had closed when the entry was built
+            settled = end_ms <= entry.end_ms and end_ms + (interval_ms(key[1]) or 0) <= entry.built_ms \
+                and now_ms - entry.built_ms < self.settled_seconds * 1000
+            if not (fresh or settled):
+                return None
+            self._entries.move_to_end(key)
+            return entry.prices
+
+    def prices(self, symbol, start_dt, end_dt, interval="1d"):
+        """PriceSeries of the synthetic `symbol`, like get_closing_prices."""
+        start_ms, end_ms = to_ms(start_dt), to_ms(end_dt)
+        key = (symbol, interval)
+        aligned = self._get(key, start_ms, end_ms)
+        if aligned is not None:
+            CROSS_CACHE_REQUESTS.inc(result="hit")
+            return _slice(aligned, start_ms, end_ms)
+        CROSS_CACHE_REQUESTS.inc(result="miss")
+
+        built_ms = int(time.time() * 1000)
+        base_leg, quote_leg = legs(symbol)
+        series = [_leg_prices(leg_, start_dt, end_dt, interval) for leg_ in (base_leg, quote_leg) if leg_ is not None]
+        if quote_leg is None:
+            aligned = series[0]
+        elif base_leg is None:
+            aligned = reciprocal(series[0])
+        else:
+            aligned = ratio(*series)
+        if not all(_complete(prices, end_ms, built_ms) for prices in series):
+            # e.g. a fetch failed: don't keep it, the next request retries
+            return aligned
+        with self._lock:
+            self._entries[key] = _Aligned(aligned, start_ms, end_ms, built_ms)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return aligned
+
+    def current_price(self, symbol):
+        """The synthetic pair's price from its legs' tickers."""
+        price = 1.0
+        for leg_, power in zip(legs(symbol), (1, -1)):
+            if leg_ is not None:
+                leg_price = fetch_current_price(leg_.symbol)
+                price *= (1.0 / leg_price if leg_.inverted else leg_price) ** power
+        return price
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+# Shared by every synthetic pair.
+CROSS_RATES = CrossRates()
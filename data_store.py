@@ -1,9 +1,18 @@
 # data_store.py
 
+import os
 import logging
+import threading
+from datetime import datetime
+
+from metrics import Gauge
 
 logger = logging.getLogger(__name__)
 
+SESSION_LOCK_STRIPES = int(os.getenv("SESSION_LOCK_STRIPES", "64"))
+
+ACTIVE_SESSIONS = Gauge("datastore_active_sessions", "User sessions held in memory.")
+
 class BotState:
     """Enum-like class for conversation states."""
     IDLE = "IDLE"
@@ -25,6 +34,7 @@ class BotState:
     ENTERING_FREQUENCY = "ENTERING_FREQUENCY"
     ENTERING_FEE = "ENTERING_FEE"
     CALCULATE = "CALCULATE"
+    CALCULATING = "CALCULATING"  # queued or running; cleared by run_calculation
 
 class UserSession:
     """
@@ -38,7 +48,11 @@ class UserSession:
         - custom_start_date (datetime or None)
         - custom_range_end_date (datetime or None)
         - frequency_str (str)
+        - freq_minutes (int, or None unless the plan buys more than hourly)
         - fee_percent (float)
+        - execution, execution_seed (fill model, see dca_calculator.execution_prices)
+        - last_plan (calculate_dca() arguments of the last report, for exports)
+    snapshot() / from_snapshot() carry the plan fields through a durable job.
     """
     def __init__(self):
         self.state = BotState.IDLE
@@ -49,19 +63,69 @@ class UserSession:
         self.custom_start_date = None
         self.custom_range_end_date = None
         self.frequency_str = ""
+        self.freq_minutes = None
         self.fee_percent = 0.0
+        self.execution = "close"
+        self.execution_seed = 0
+        self.last_plan = None
+
+    # what a calculation reads; saved with durable jobs (see job_queue.py)
+    PLAN_FIELDS = (
+        "lang", "total_investment", "symbol", "period_str", "custom_start_date",
+        "custom_range_end_date", "frequency_str", "freq_value", "freq_is_hourly",
+        "freq_minutes", "fee_percent", "execution", "execution_seed",
+    )
+    DATE_FIELDS = ("custom_start_date", "custom_range_end_date")
+
+    def snapshot(self):
+        """The plan fields as a JSON-able dict."""
+        fields = {name: getattr(self, name, None) for name in self.PLAN_FIELDS}
+        for name in self.DATE_FIELDS:
+            if fields[name] is not None:
+                fields[name] = fields[name].isoformat()
+        return fields
+
+    @classmethod
+    def from_snapshot(cls, fields):
+        session = cls()
+        for name in cls.PLAN_FIELDS:
+            if name in fields:
+                setattr(session, name, fields[name])
+        for name in cls.DATE_FIELDS:
+            if fields.get(name) is not None:
+                setattr(session, name, datetime.fromisoformat(fields[name]))
+        return session
 
 class DataStore:
-    """In-memory user session store."""
-    def __init__(self):
+    """
+    In-memory user session store.
+
+    Every chat maps to one of `stripes` locks. Handlers hold their chat's
+    lock (see lock()) while they read and change its session, so two quick
+    messages from the same chat are handled one after the other, while
+    other chats, on other stripes, run in parallel.
+    """
+    def __init__(self, stripes=SESSION_LOCK_STRIPES):
         self.user_sessions = {}
+        self._locks = [threading.RLock() for _ in range(stripes)]
+        ACTIVE_SESSIONS.set_function(lambda: len(self.user_sessions))
+
+    def lock(self, user_id):
+        """The (reentrant) lock serializing work on user_id's session."""
+        return self._locks[hash(user_id) % len(self._locks)]
 
     def get_session(self, user_id):
-        if user_id not in self.user_sessions:
-            self.user_sessions[user_id] = UserSession()
-        return self.user_sessions[user_id]
+        session = self.user_sessions.get(user_id)
+        if session is None:
+            with self.lock(user_id):
+                # another thread may have created it meanwhile
+                session = self.user_sessions.get(user_id)
+                if session is None:
+                    session = self.user_sessions[user_id] = UserSession()
+        return session
 
     def reset_session(self, user_id):
         logger.info(f"Resetting session for user_id={user_id}")
-        self.user_sessions[user_id] = UserSession()
-        return self.user_sessions[user_id]
+        with self.lock(user_id):
+            session = self.user_sessions[user_id] = UserSession()
+        return session
@@ -1,21 +1,41 @@
 # dca_calculator.py
 
+import re
 import math
 import logging
 from datetime import datetime, timedelta
 
+import numpy as np
+
 # We'll assume you have a binance_api.py with a function:
 #   get_closing_prices(symbol, start_dt, end_dt, interval="1d")
-# that returns a dict of:
-#   key -> close_price
-#   If interval="1h", key might be "YYYY-MM-DD HH"
-#   If interval="1d", key might be "YYYY-MM-DD"
+# that returns a PriceSeries: open_times / closes numpy arrays
 #
 # and a function fetch_current_price(symbol)
-from binance_api import get_closing_prices, fetch_current_price
+from binance_api import (
+    get_closing_prices,
+    iter_closing_prices,
+    fetch_current_price,
+    interval_ms,
+    time_key_format,
+    to_ms,
+    INTERVAL_OFFSET_MS
+)
+from metrics import Histogram
+from profiler import stage, stage_iter
 
 logger = logging.getLogger(__name__)
 
+CALCULATE_DCA_SECONDS = Histogram(
+    "calculate_dca_seconds", "Time for calculate_dca including data fetches."
+)
+CALCULATE_DCA_STREAMING_SECONDS = Histogram(
+    "calculate_dca_streaming_seconds", "Time for calculate_dca_streaming including data fetches."
+)
+COMPARE_STRATEGIES_SECONDS = Histogram(
+    "compare_strategies_seconds", "Time for compare_strategies including data fetches."
+)
+
 def persian_to_ascii(text: str) -> str:
     """
     Convert Persian digits to ASCII digits,
@@ -40,6 +60,7 @@ def persian_to_ascii(text: str) -> str:
 
     # "هر X ساعت" => "every X hour"
     text = text.replace('ساعت', 'hour')
+    text = text.replace('دقیقه', 'minute')
     text = text.replace('هر', 'every')
     text = text.replace('روز', 'day')
 
@@ -121,6 +142,140 @@ def parse_investment_frequency(freq_str: str):
         # default => weekly
         return (7, False)
 
+# Kline intervals sub-hour schedules are evaluated on, coarsest first.
+MINUTE_INTERVALS = ("30m", "15m", "5m")
+
+def parse_minute_frequency(freq_str: str):
+    """
+    Minutes between purchases for sub-hour frequencies ("every 15 minutes",
+    "30 min", "15m", "هر ۱۵ دقیقه"), or None for anything else. Raises
+    ValueError if the step isn't a multiple of 5 minutes below an hour.
+    """
+    match = re.search(r"(\d+)\s*(?:minutes?|mins?|m)\b", persian_to_ascii(freq_str.lower()))
+    if match is None:
+        return None
+    minutes = int(match.group(1))
+    if minutes % 5 or not 5 <= minutes < 60:
+        raise ValueError("Sub-hour plans must buy every 5 to 55 minutes, in steps of 5.")
+    return minutes
+
+# Intervals calculate_dca may fetch instead of the schedule's own 1h/1d
+# candles, coarsest first ("3d" and "1M" are left out: their boundaries don't
+# line up with fixed-step schedules).
+CANDIDATE_INTERVALS = ("1w", "1d", "12h", "8h", "6h", "4h", "2h", "1h")
+
+def choose_interval(first_point: datetime, step: timedelta, base_interval: str):
+    """
+    Pick the coarsest kline interval whose candles close exactly when the
+    schedule's own (base_interval) candles do, so every price is identical
+    but far fewer candles are downloaded. E.g. a weekly plan whose points
+    are Sundays can use 1w candles, "every 24 hours" at 23:00 can use 1d.
+
+    Returns (interval, shift): the price of a point is the close of the
+    `interval` candle opening at point - shift.
+    """
+    base_ms = interval_ms(base_interval)
+    step_ms = int(step.total_seconds() * 1000)
+    # the base candle of the first point ends here (naive datetimes are UTC)
+    candle_end = to_ms(first_point) + base_ms
+    for interval in CANDIDATE_INTERVALS:
+        ms = interval_ms(interval)
+        if ms < base_ms:
+            continue
+        offset = INTERVAL_OFFSET_MS.get(interval, 0)
+        if step_ms % ms == 0 and (candle_end - offset) % ms == 0:
+            return interval, timedelta(milliseconds=ms - base_ms)
+    return base_interval, timedelta(0)
+
+# How a purchase is filled within its candle, see execution_prices().
+EXECUTION_MODELS = ("close", "open", "typical", "random")
+
+def _uniform(points, seed):
+    # splitmix64 of (point, seed): the same fill for the same point and seed,
+    # whatever range or chunk the point is evaluated in
+    with np.errstate(over="ignore"):
+        x = np.asarray(points).astype(np.uint64) + np.uint64(seed) * np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        x = x ^ (x >> np.uint64(31))
+    return (x >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+
+def execution_prices(prices, idx, points, execution="close", seed=0):
+    """
+    Fill prices of the purchases at `points`, whose candles are rows `idx`
+    of the PriceSeries `prices`, under an execution model:
+
+      - "close": the candle's close (the default, as before)
+      - "open": its open, i.e. buying right at the scheduled time
+      - "typical": (high + low + close) / 3
+      - "random": uniform within [low, high], reproducible per point and seed
+
+    Candles without OHLC data (price store rows from before it was kept) are
+    filled at their close.
+    """
+    closes = np.asarray(prices.closes[idx])
+    if execution == "close":
+        return closes
+    if execution not in EXECUTION_MODELS:
+        raise ValueError(f"Unknown execution model: {execution}")
+    if prices.opens is None:
+        return closes
+    if execution == "open":
+        fills = np.asarray(prices.opens[idx])
+    else:
+        highs, lows = np.asarray(prices.highs[idx]), np.asarray(prices.lows[idx])
+        if execution == "typical":
+            fills = (highs + lows + closes) / 3
+        else:
+            fills = lows + _uniform(points, seed) * (highs - lows)
+    return np.where(np.isnan(fills), closes, fills)
+
+class PurchaseHistory:
+    """
+    The purchases of a plan as parallel numpy arrays: times (int64 ms, open
+    time of the schedule's 1h/1d candle), prices and coins. Iterating yields
+    the (label, price, coins) tuples used elsewhere, labels formatted as
+    "YYYY-MM-DD" or "YYYY-MM-DD HH".
+    """
+    __slots__ = ("times", "prices", "coins", "is_hourly")
+
+    def __init__(self, times, prices, coins, is_hourly=False):
+        self.times = times
+        self.prices = prices
+        self.coins = coins
+        self.is_hourly = is_hourly
+
+    def __len__(self):
+        return len(self.times)
+
+    def __iter__(self):
+        label_format = time_key_format("1h" if self.is_hourly else "1d")
+        for point, price, coins in zip(self.times.tolist(), self.prices.tolist(), self.coins.tolist()):
+            yield datetime.utcfromtimestamp(point / 1000).strftime(label_format), price, coins
+
+    def scaled(self, factor):
+        """Same purchases with every coin amount multiplied by factor."""
+        return PurchaseHistory(self.times, self.prices, self.coins * factor, self.is_hourly)
+
+def plan_schedule(start_dt: datetime, end_dt: datetime, freq_value: int, is_hourly: bool):
+    """
+    The schedule of a plan: (base_interval, first_point, step, points), where
+    points are the open times (ms) of the base candles to buy at. Points are
+    counted from the start of start_dt's hour/day; a base candle that opened
+    before start_dt is not part of the range.
+    """
+    base_interval = "1h" if is_hourly else "1d"
+    if is_hourly:
+        first_point = start_dt.replace(minute=0, second=0, microsecond=0)
+        step = timedelta(hours=freq_value)
+    else:
+        first_point = datetime.combine(start_dt.date(), datetime.min.time())
+        step = timedelta(days=freq_value)
+    step_ms = int(step.total_seconds() * 1000)
+    points = np.arange(to_ms(first_point), to_ms(end_dt) + 1, step_ms, dtype=np.int64)
+    return base_interval, first_point, step, points[points >= to_ms(start_dt)]
+
+@CALCULATE_DCA_SECONDS.time()
 def calculate_dca(
     total_investment: float,
     symbol: str,
@@ -128,63 +283,87 @@ def calculate_dca(
     end_dt: datetime,
     freq_value: int,
     is_hourly: bool,
-    fee_percent: float = 0.0
+    fee_percent: float = 0.0,
+    execution: str = "close",
+    seed: int = 0
 ):
     """
-    If is_hourly = True => fetch "1h" klines, iterate every freq_value hours
-    Else => fetch "1d" klines, iterate every freq_value days
+    If is_hourly = True => invest every freq_value hours at the hourly close
+    Else => invest every freq_value days at the daily close
+    (or at the fill price of another execution model, see execution_prices).
+
+    Closes are fetched at the coarsest interval that yields the same closes
+    (see choose_interval), so long plans don't download every candle. The
+    other models need the schedule's own candles.
     """
-    # Decide the binance interval
-    kline_interval = "1h" if is_hourly else "1d"
+    if execution not in EXECUTION_MODELS:
+        raise ValueError(f"Unknown execution model: {execution}")
+    # The schedule's own resolution
+    base_interval, first_point, step, _ = plan_schedule(start_dt, end_dt, freq_value, is_hourly)
+    if execution == "close":
+        kline_interval, shift = choose_interval(first_point, step, base_interval)
+    else:
+        # a coarser candle's open/high/low aren't those of the point's candle
+        kline_interval, shift = base_interval, timedelta(0)
 
-    # Fetch closing prices with that interval
-    closing_prices = get_closing_prices(symbol, start_dt, end_dt, interval=kline_interval)
-    if not closing_prices:
+    # Fetch prices with that interval
+    with stage("fetch"):
+        prices = get_closing_prices(symbol, start_dt - shift, end_dt, interval=kline_interval)
+    with stage("compute"):
+        return dca_on_prices(
+            prices, total_investment, symbol, start_dt, end_dt, freq_value, is_hourly,
+            fee_percent, execution, seed, shift=shift
+        )
+
+def dca_on_prices(
+    prices,
+    total_investment: float,
+    symbol: str,
+    start_dt: datetime,
+    end_dt: datetime,
+    freq_value: int,
+    is_hourly: bool,
+    fee_percent: float = 0.0,
+    execution: str = "close",
+    seed: int = 0,
+    current_price: float = None,
+    shift: timedelta = timedelta(0)
+):
+    """
+    calculate_dca() on a PriceSeries already at hand, e.g. one series
+    loaded for many plans on the same pair. `prices` holds the schedule's
+    base (1h/1d) candles, or coarser ones opening `shift` before each point
+    (see choose_interval). current_price is fetched if not given.
+    """
+    if execution not in EXECUTION_MODELS:
+        raise ValueError(f"Unknown execution model: {execution}")
+    if not len(prices):
         raise ValueError("No historical price data found for the given period.")
+    _, _, _, points = plan_schedule(start_dt, end_dt, freq_value, is_hourly)
 
-    investment_points = []
-    if is_hourly:
-        # Build hourly points
-        current_dt = start_dt
-        while current_dt <= end_dt:
-            # key format might be "YYYY-MM-DD HH"
-            dt_str = current_dt.strftime("%Y-%m-%d %H")
-            if dt_str in closing_prices:
-                investment_points.append(dt_str)
-            current_dt += timedelta(hours=freq_value)
-    else:
-        # daily approach => keys like "YYYY-MM-DD"
-        current_date = start_dt.date()
-        while current_date <= end_dt.date():
-            dt_str = current_date.strftime("%Y-%m-%d")
-            if dt_str in closing_prices:
-                investment_points.append(dt_str)
-            current_date += timedelta(days=freq_value)
-
-    if not investment_points:
+    # the price is that of the (possibly coarser) candle ending with the point
+    found, idx = prices.locate(points - int(shift.total_seconds() * 1000))
+    points = points[found]
+    point_prices = execution_prices(prices, idx[found], points, execution, seed)
+
+    if not len(points):
         raise ValueError("No valid investment points found in the data range.")
 
-    number_of_investments = len(investment_points)
+    number_of_investments = len(points)
     amount_per_investment = total_investment / number_of_investments
-
-    total_coins_purchased = 0.0
-    purchase_history = []
-
-    for point in investment_points:
-        price = closing_prices[point]
-        net_invest = amount_per_investment * (1 - fee_percent / 100.0)
-        coins = net_invest / price
-        total_coins_purchased += coins
-        purchase_history.append((point, price, coins))
+    net_invest = amount_per_investment * (1 - fee_percent / 100.0)
+    coins = net_invest / point_prices
+    total_coins_purchased = float(coins.sum())
+    purchase_history = PurchaseHistory(points, point_prices, coins, is_hourly)
 
     avg_purchase_price = total_investment / total_coins_purchased
-    current_price = fetch_current_price(symbol)
+    if current_price is None:
+        current_price = fetch_current_price(symbol)
     current_portfolio_value = current_price * total_coins_purchased
     roi_percent = ((current_portfolio_value / total_investment) - 1) * 100
 
     # Lump-sum => buy everything at the first point's price
-    first_point = investment_points[0]
-    lump_sum_price = closing_prices[first_point]
+    lump_sum_price = float(point_prices[0])
     net_ls = total_investment * (1 - fee_percent/100.0)
     lump_sum_coins = net_ls / lump_sum_price
     lump_sum_value = lump_sum_coins * current_price
@@ -198,6 +377,8 @@ def calculate_dca(
         "freq_value": freq_value,
         "is_hourly": is_hourly,
         "fee_percent": fee_percent,
+        "execution": execution,
+        "seed": seed,
         "total_investment": total_investment,
         "number_of_investments": number_of_investments,
         "purchase_history": purchase_history,
@@ -206,5 +387,291 @@ def calculate_dca(
         "current_price": current_price,
         "current_portfolio_value": current_portfolio_value,
         "roi_percent": roi_percent,
+        "lump_sum_coins": lump_sum_coins,
         "lump_sum_roi": lump_sum_roi
     }
+
+# Charts of streamed plans keep at most this many purchases.
+CHART_POINTS = 2000
+
+class _Decimator:
+    """
+    Keeps every `stride`-th of the values added, at most max_points of them:
+    when full, every other kept value is dropped and the stride doubles. The
+    result is evenly spaced over everything seen so far, in bounded memory.
+    """
+    def __init__(self, max_points=CHART_POINTS):
+        self.max_points = max_points
+        self.stride = 1
+        self.seen = 0
+        self.times = np.empty(0, dtype=np.int64)
+        self.prices = np.empty(0)
+
+    def add(self, times, prices):
+        # positions (in everything seen) that fall on the current stride
+        keep = (self.seen + np.arange(len(times))) % self.stride == 0
+        self.times = np.concatenate([self.times, times[keep]])
+        self.prices = np.concatenate([self.prices, prices[keep]])
+        self.seen += len(times)
+        while len(self.times) > self.max_points:
+            self.times, self.prices = self.times[::2], self.prices[::2]
+            self.stride *= 2
+
+@CALCULATE_DCA_STREAMING_SECONDS.time()
+def calculate_dca_streaming(
+    total_investment: float,
+    symbol: str,
+    start_dt: datetime,
+    end_dt: datetime,
+    freq_minutes: int,
+    fee_percent: float = 0.0,
+    execution: str = "close",
+    seed: int = 0
+):
+    """
+    calculate_dca() for sub-hour schedules (every freq_minutes minutes, see
+    parse_minute_frequency), where the range may hold millions of candles.
+
+    Prices are pulled chunk by chunk (iter_closing_prices) and folded into
+    running totals: the number of purchases, the sum of 1 / price (coins
+    per dollar), the first price for the lump sum, and a decimated sample of
+    purchases for the chart. Each chunk is dropped after that, so memory stays
+    bounded however long the range is. Returns calculate_dca()'s keys; the
+    purchase_history only holds the decimated sample.
+    """
+    if execution not in EXECUTION_MODELS:
+        raise ValueError(f"Unknown execution model: {execution}")
+    step_ms = freq_minutes * 60_000
+    interval = next(i for i in MINUTE_INTERVALS if step_ms % interval_ms(i) == 0)
+    # points are counted from the start of start_dt's hour, like hourly plans
+    # are from the start of its day
+    origin = to_ms(start_dt.replace(minute=0, second=0, microsecond=0))
+    start_ms = to_ms(start_dt)
+
+    purchases = 0
+    coins_per_dollar = 0.0
+    first_price = None
+    sample = _Decimator()
+    for chunk in stage_iter(iter_closing_prices(symbol, start_dt, end_dt, interval), "fetch"):
+        with stage("compute"):
+            times = np.asarray(chunk.open_times)
+            on_schedule = np.flatnonzero(((times - origin) % step_ms == 0) & (times >= start_ms))
+            if not len(on_schedule):
+                continue
+            times = times[on_schedule]
+            prices = execution_prices(chunk, on_schedule, times, execution, seed)
+            if first_price is None:
+                first_price = float(prices[0])
+            purchases += len(times)
+            coins_per_dollar += float((1.0 / prices).sum())
+            sample.add(times, prices)
+
+    if not purchases:
+        raise ValueError("No valid investment points found in the data range.")
+
+    amount_per_investment = total_investment / purchases
+    net_invest = amount_per_investment * (1 - fee_percent / 100.0)
+    total_coins_purchased = net_invest * coins_per_dollar
+    # intraday labels, like hourly plans
+    purchase_history = PurchaseHistory(sample.times, sample.prices, net_invest / sample.prices, True)
+
+    current_price = fetch_current_price(symbol)
+    current_portfolio_value = current_price * total_coins_purchased
+    lump_sum_coins = total_investment * (1 - fee_percent / 100.0) / first_price
+    return {
+        "symbol": symbol,
+        "start_dt": start_dt,
+        "end_dt": end_dt,
+        "freq_value": freq_minutes,
+        "freq_minutes": freq_minutes,
+        "is_hourly": True,
+        "fee_percent": fee_percent,
+        "execution": execution,
+        "seed": seed,
+        "total_investment": total_investment,
+        "number_of_investments": purchases,
+        "purchase_history": purchase_history,
+        "total_coins_purchased": total_coins_purchased,
+        "avg_purchase_price": total_investment / total_coins_purchased,
+        "current_price": current_price,
+        "current_portfolio_value": current_portfolio_value,
+        "roi_percent": ((current_portfolio_value / total_investment) - 1) * 100,
+        "lump_sum_coins": lump_sum_coins,
+        "lump_sum_roi": ((lump_sum_coins * current_price / total_investment) - 1) * 100
+    }
+
+def reprice(dca_result, current_price: float):
+    """
+    Return a copy of a calculate_dca() result valued at a new current price.
+    Everything historical (purchases, coins, average cost) stays the same.
+    """
+    total_investment = dca_result["total_investment"]
+    current_portfolio_value = current_price * dca_result["total_coins_purchased"]
+    lump_sum_value = current_price * dca_result["lump_sum_coins"]
+
+    result = dict(dca_result)
+    result["current_price"] = current_price
+    result["current_portfolio_value"] = current_portfolio_value
+    result["roi_percent"] = ((current_portfolio_value / total_investment) - 1) * 100
+    result["lump_sum_roi"] = ((lump_sum_value / total_investment) - 1) * 100
+    return result
+
+# ---- Strategies ----
+# A strategy decides how much cash goes in (or, for value averaging, comes
+# out) at each point of the schedule. Each one is an array kernel over the
+# schedule's base candles, so compare_strategies() can run any number of them
+# on a single fetch.
+
+def rolling_mean(values, window: int):
+    """
+    Mean of each value and the window - 1 values before it (fewer at the
+    start), from one cumulative sum.
+    """
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    ends = np.arange(1, len(values) + 1)
+    starts = np.maximum(ends - window, 0)
+    return (sums[ends] - sums[starts]) / (ends - starts)
+
+class Strategy:
+    """
+    Plain DCA: the same amount at every point. Subclasses override amounts()
+    and, if they look at past prices, lookback_days.
+
+    amounts(closes, idx, base_amount, candles_per_day) gets the closes of the
+    schedule's base (1h/1d) candles, starting lookback_days before the first
+    point, the index of each point in them, and the plan's budget per point.
+    It returns the cash per point; negative amounts are sales.
+    """
+    name = "dca"
+    lookback_days = 0
+
+    def amounts(self, closes, idx, base_amount, candles_per_day):
+        return np.full(len(idx), base_amount)
+
+class LumpSum(Strategy):
+    """The whole budget at the first point."""
+    name = "lump_sum"
+
+    def amounts(self, closes, idx, base_amount, candles_per_day):
+        amounts = np.zeros(len(idx))
+        amounts[0] = base_amount * len(idx)
+        return amounts
+
+class ValueAveraging(Strategy):
+    """
+    Grow the position's value by base_amount per point: buy the shortfall,
+    sell the excess. The holdings after point t are then (t + 1) * base_amount
+    / price_t, so every trade follows from the targets without a running state
+    (fees aside, which make the holdings fall slightly short).
+    """
+    name = "value_averaging"
+
+    def amounts(self, closes, idx, base_amount, candles_per_day):
+        prices = closes[idx]
+        target_coins = base_amount * np.arange(1, len(idx) + 1) / prices
+        return np.diff(target_coins, prepend=0.0) * prices
+
+class MovingAverageDip(Strategy):
+    """`multiplier` times the base amount whenever the price is below its moving average."""
+    def __init__(self, window_days=200, multiplier=2.0):
+        self.name = f"ma{window_days}_dip"
+        self.lookback_days = window_days
+        self.multiplier = multiplier
+
+    def amounts(self, closes, idx, base_amount, candles_per_day):
+        average = rolling_mean(closes, self.lookback_days * candles_per_day)[idx]
+        return base_amount * np.where(closes[idx] < average, self.multiplier, 1.0)
+
+class MovingAverageMultiplier(Strategy):
+    """
+    The base amount scaled by (average / price) ** power, clipped to
+    [floor, cap]: more the further the price is below its moving average,
+    less above it.
+    """
+    def __init__(self, window_days=50, power=2.0, floor=0.25, cap=3.0):
+        self.name = f"ma{window_days}_multiplier"
+        self.lookback_days = window_days
+        self.power = power
+        self.floor = floor
+        self.cap = cap
+
+    def amounts(self, closes, idx, base_amount, candles_per_day):
+        average = rolling_mean(closes, self.lookback_days * candles_per_day)[idx]
+        multipliers = np.clip((average / closes[idx]) ** self.power, self.floor, self.cap)
+        return base_amount * multipliers
+
+DEFAULT_STRATEGIES = (ValueAveraging(), MovingAverageDip(), MovingAverageMultiplier())
+
+def _strategy_result(name, symbol, amounts, prices, points, fee_percent, current_price, is_hourly):
+    # sales net `amount` after the fee, purchases buy with what is left of it
+    fee = fee_percent / 100.0
+    coins = np.where(amounts >= 0, amounts * (1 - fee), amounts / (1 - fee)) / prices
+    bought = amounts > 0
+    invested = float(amounts[bought].sum())
+    withdrawn = float(np.abs(amounts[amounts < 0]).sum())
+    total_coins = float(coins.sum())
+    current_value = total_coins * current_price
+    traded = amounts != 0
+    return {
+        "strategy": name,
+        "symbol": symbol,
+        "total_investment": invested,
+        "total_withdrawn": withdrawn,
+        "number_of_investments": int(bought.sum()),
+        "purchase_history": PurchaseHistory(points[traded], prices[traded], coins[traded], is_hourly),
+        "total_coins_purchased": total_coins,
+        "avg_purchase_price": invested / float(coins[bought].sum()),
+        "current_price": current_price,
+        "current_portfolio_value": current_value,
+        "roi_percent": ((current_value + withdrawn) / invested - 1) * 100,
+    }
+
+@COMPARE_STRATEGIES_SECONDS.time()
+def compare_strategies(
+    total_investment: float,
+    symbol: str,
+    start_dt: datetime,
+    end_dt: datetime,
+    freq_value: int,
+    is_hourly: bool,
+    fee_percent: float = 0.0,
+    strategies=DEFAULT_STRATEGIES
+):
+    """
+    Run lump sum, plain DCA and `strategies` on the same schedule and the
+    same prices: one fetch of the schedule's base candles, reaching back as
+    far as the longest lookback needs. The budget per point is
+    total_investment / number of points, as in calculate_dca; strategies
+    that vary the amounts invest more or less than that in total.
+
+    Returns {strategy name: result}. Results have calculate_dca's keys where
+    they apply (total_investment is the cash actually put in), plus
+    "strategy" and "total_withdrawn"; ROI counts withdrawn cash as returned.
+    """
+    base_interval, _, _, points = plan_schedule(start_dt, end_dt, freq_value, is_hourly)
+    base_ms = interval_ms(base_interval)
+    everything = (LumpSum(), Strategy()) + tuple(strategies)
+    lookback = timedelta(days=max(s.lookback_days for s in everything))
+
+    prices = get_closing_prices(symbol, start_dt - lookback, end_dt, interval=base_interval)
+    if not len(prices):
+        raise ValueError("No historical price data found for the given period.")
+    open_times = np.asarray(prices.open_times)
+    closes = np.asarray(prices.closes)
+
+    idx = np.searchsorted(open_times, points).clip(max=len(open_times) - 1)
+    found = open_times[idx] == points
+    idx, points = idx[found], points[found]
+    if not len(points):
+        raise ValueError("No valid investment points found in the data range.")
+
+    base_amount = total_investment / len(points)
+    candles_per_day = interval_ms("1d") // base_ms
+    current_price = fetch_current_price(symbol)
+    return {
+        strategy.name: _strategy_result(
+            strategy.name, symbol, strategy.amounts(closes, idx, base_amount, candles_per_day),
+            closes[idx], points, fee_percent, current_price, is_hourly
+        )
+        for strategy in everything
+    }
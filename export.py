@@ -0,0 +1,110 @@
+# export.py
+#
+# The full purchase history of a calculation as a file: gzip-compressed CSV,
+# or Parquet when pyarrow is installed. Rows are produced in chunks straight
+# from the PurchaseHistory arrays and written as they come, so even an hourly
+# plan with tens of thousands of purchases never exists as one big Python
+# table.
+
+import io
+import gzip
+
+import numpy as np
+
+from metrics import Histogram
+
+EXPORT_CHUNK_ROWS = 8192
+EXPORT_COLUMNS = ("time", "price", "coins", "cumulative_cost", "cumulative_coins", "value")
+# format -> file extension
+EXPORT_FORMATS = {"csv": ".csv.gz", "parquet": ".parquet"}
+
+EXPORT_SECONDS = Histogram("export_history_seconds", "Time to write a purchase history export.", ["format"])
+
+# pyarrow is optional and heavy, so it is looked up on first use.
+_pyarrow = None
+
+def _parquet_modules():
+    global _pyarrow
+    if _pyarrow is None:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+            _pyarrow = (pyarrow, pyarrow.parquet)
+        except ImportError:
+            _pyarrow = False
+    return _pyarrow
+
+def available_formats():
+    """Export formats this installation can write, CSV first."""
+    return [fmt for fmt in EXPORT_FORMATS if fmt != "parquet" or _parquet_modules()]
+
+def iter_history(dca_result, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Yield the purchases of a calculate_dca() result as dicts of column arrays,
+    at most chunk_rows rows each: time (int64 ms), price, coins, and the
+    running cost, coins and value (at that purchase's price) of the plan.
+    """
+    history = dca_result["purchase_history"]
+    cost_per_purchase = dca_result["total_investment"] / len(history)
+    coins_before = 0.0
+    for lo in range(0, len(history), chunk_rows):
+        hi = min(lo + chunk_rows, len(history))
+        prices = history.prices[lo:hi]
+        cumulative_coins = coins_before + np.cumsum(history.coins[lo:hi])
+        coins_before = float(cumulative_coins[-1])
+        yield {
+            "time": history.times[lo:hi],
+            "price": prices,
+            "coins": history.coins[lo:hi],
+            "cumulative_cost": cost_per_purchase * np.arange(lo + 1, hi + 1),
+            "cumulative_coins": cumulative_coins,
+            "value": cumulative_coins * prices,
+        }
+
+def write_csv(dca_result, fileobj):
+    """Write the history to a binary file object as gzip-compressed CSV."""
+    with gzip.GzipFile(fileobj=fileobj, mode="wb") as gz, \
+            io.TextIOWrapper(gz, encoding="utf-8", newline="") as out:
+        out.write(",".join(EXPORT_COLUMNS) + "\n")
+        for chunk in iter_history(dca_result):
+            times = np.datetime_as_string(chunk["time"].astype("datetime64[ms]"), unit="m")
+            numbers = zip(*(chunk[name].tolist() for name in EXPORT_COLUMNS[1:]))
+            out.write("".join(
+                f"{t}Z,{price:.10g},{coins:.10g},{cost:.2f},{total:.10g},{value:.2f}\n"
+                for t, (price, coins, cost, total, value) in zip(times.tolist(), numbers)
+            ))
+
+def write_parquet(dca_result, fileobj):
+    """Write the history to a binary file object as Parquet, one row group per chunk."""
+    modules = _parquet_modules()
+    if not modules:
+        raise ValueError("Parquet export needs pyarrow installed.")
+    pa, pq = modules
+    schema = pa.schema(
+        [("time", pa.timestamp("ms", tz="UTC"))] + [(name, pa.float64()) for name in EXPORT_COLUMNS[1:]]
+    )
+    with pq.ParquetWriter(fileobj, schema, compression="zstd") as writer:
+        for chunk in iter_history(dca_result):
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(chunk[name], type=schema.field(name).type) for name in EXPORT_COLUMNS],
+                schema=schema
+            ))
+
+def export_history(dca_result, fmt, fileobj):
+    """
+    Write the history in `fmt` ("csv" or "parquet") to a binary file object.
+    Returns the file name to present it under.
+    """
+    history = dca_result["purchase_history"]
+    if not len(history):
+        raise ValueError("There are no purchases to export.")
+    writer = {"csv": write_csv, "parquet": write_parquet}[fmt]
+    with EXPORT_SECONDS.time(format=fmt):
+        writer(dca_result, fileobj)
+
+    resolution = "%Y%m%d%H" if history.is_hourly else "%Y%m%d"
+    first, last = history.times[[0, -1]].astype("datetime64[ms]").astype(object)
+    return (
+        f"{dca_result['symbol'].replace('/', '-')}_dca_{first.strftime(resolution)}_{last.strftime(resolution)}"
+        f"{EXPORT_FORMATS[fmt]}"
+    )
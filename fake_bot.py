@@ -0,0 +1,149 @@
+# fake_bot.py
+#
+# An in-process stand-in for telebot.TeleBot, for benchmarks and load tests.
+# It supports the parts of the API that commands.register_handlers uses,
+# dispatches updates synchronously like TeleBot's handler matching does, and
+# records everything the bot "sends".
+
+import time
+import threading
+from types import SimpleNamespace
+
+class FakeBot:
+    def __init__(self):
+        self.message_handlers = []
+        self.callback_handlers = []
+        self.inline_handlers = []
+        self.sent = {}  # chat_id -> list of (kind, text, timestamp)
+        self._cond = threading.Condition()
+        # message ids aren't reused across runs, as on Telegram; durable
+        # jobs (job_queue.py) are keyed by them
+        self._next_id = int(time.time() * 1000)
+
+    # ---- registration (same decorator API as TeleBot) ----
+    def message_handler(self, commands=None, func=None, **kwargs):
+        def decorator(handler):
+            self.message_handlers.append((commands, func, handler))
+            return handler
+        return decorator
+
+    def callback_query_handler(self, func=None, **kwargs):
+        def decorator(handler):
+            self.callback_handlers.append((func, handler))
+            return handler
+        return decorator
+
+    def inline_handler(self, func=None, **kwargs):
+        def decorator(handler):
+            self.inline_handlers.append((func, handler))
+            return handler
+        return decorator
+
+    # ---- outbound API ----
+    def _record(self, chat_id, kind, text, on_done=None, on_sent=None, started=None):
+        with self._cond:
+            self.sent.setdefault(chat_id, []).append((kind, text, time.perf_counter()))
+            self._cond.notify_all()
+        # like outbox.OutboundBot: called once the message is delivered
+        if on_sent is not None:
+            on_sent(time.perf_counter() - started)
+        if on_done is not None:
+            on_done()
+        return SimpleNamespace(chat=SimpleNamespace(id=chat_id), text=text)
+
+    def send_message(self, chat_id, text, on_done=None, on_sent=None, **kwargs):
+        return self._record(chat_id, "message", text, on_done, on_sent, time.perf_counter())
+
+    def send_photo(self, chat_id, photo, caption=None, on_done=None, on_sent=None, **kwargs):
+        started = time.perf_counter()
+        if hasattr(photo, "read"):
+            photo.read()
+        return self._record(chat_id, "photo", caption, on_done, on_sent, started)
+
+    def send_document(self, chat_id, document, caption=None, on_done=None, on_sent=None, **kwargs):
+        started = time.perf_counter()
+        if hasattr(document, "read"):
+            document.read()
+        return self._record(chat_id, "document", caption, on_done, on_sent, started)
+
+    def answer_callback_query(self, callback_query_id, text=None, **kwargs):
+        return True
+
+    def answer_inline_query(self, inline_query_id, results, **kwargs):
+        # inline answers aren't tied to a chat; recorded under the query's user
+        return self._record(int(inline_query_id), "inline", [r.title for r in results])
+
+    # ---- inbound updates ----
+    def _message(self, chat_id, text, message_id=None):
+        if message_id is None:
+            with self._cond:
+                self._next_id += 1
+                message_id = self._next_id
+        return SimpleNamespace(
+            chat=SimpleNamespace(id=chat_id, type="private"),
+            from_user=SimpleNamespace(id=chat_id),
+            message_id=message_id,
+            text=text,
+            content_type="text"
+        )
+
+    def send_text(self, chat_id, text, message_id=None):
+        """
+        Deliver a user text message to the first matching handler. Pass the
+        message_id of an earlier message to deliver it again, as Telegram
+        does with updates a stopped bot hadn't confirmed.
+        """
+        message = self._message(chat_id, text, message_id)
+        command = None
+        if text.startswith("/"):
+            command = text[1:].split()[0].split("@")[0]
+        for commands, func, handler in self.message_handlers:
+            if commands is not None and command not in commands:
+                continue
+            if func is not None and not func(message):
+                continue
+            handler(message)
+            return True
+        return False
+
+    def press(self, chat_id, data):
+        """Deliver an inline-button callback to the first matching handler."""
+        call = SimpleNamespace(id=str(chat_id), data=data, message=self._message(chat_id, ""))
+        for func, handler in self.callback_handlers:
+            if func is None or func(call):
+                handler(call)
+                return True
+        return False
+
+    def query(self, user_id, text):
+        """Deliver an inline query from user_id to the first matching handler."""
+        inline_query = SimpleNamespace(
+            id=str(user_id), query=text, offset="",
+            from_user=SimpleNamespace(id=user_id, language_code="en")
+        )
+        for func, handler in self.inline_handlers:
+            if func is None or func(inline_query):
+                handler(inline_query)
+                return True
+        return False
+
+    # ---- inspection ----
+    def wait_for(self, chat_id, kinds=("photo",), since=0, timeout=60.0):
+        """
+        Block until chat_id has received a reply of one of `kinds` after
+        index `since` in its history. Returns (kind, text, timestamp) or None.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                for entry in self.sent.get(chat_id, [])[since:]:
+                    if entry[0] in kinds:
+                        return entry
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def history_len(self, chat_id):
+        with self._cond:
+            return len(self.sent.get(chat_id, []))
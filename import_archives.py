@@ -0,0 +1,171 @@
+# import_archives.py
+#
+# Bulk-import Binance public kline archives (https://data.binance.vision) into
+# the local price store, e.g.
+#
+#   python import_archives.py ~/Downloads/BTCUSDT-1h-2023-*.zip --workers 4
+#
+# Files must keep their original names (<SYMBOL>-<interval>-<YYYY-MM>[-DD].zip
+# or .csv) since that's where symbol and interval come from. Archives are
+# decompressed and parsed as a stream in fixed-size chunks; at most
+# 2 x --workers files are in flight, so memory stays bounded however many
+# files are imported.
+
+import io
+import os
+import re
+import csv
+import sys
+import time
+import logging
+import zipfile
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from price_store import PriceStore, PRICE_STORE_DIR
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_NAME = re.compile(r"^(?P<symbol>[A-Z0-9]+)-(?P<interval>\d+[smhdwM])-\d{4}-\d{2}(-\d{2})?\.(zip|csv)$")
+
+CHUNK_ROWS = 50_000
+
+# Spot archives switched from millisecond to microsecond timestamps in 2025.
+_MICROSECONDS_THRESHOLD = 10**15
+
+def parse_archive_name(path):
+    """(symbol, interval) from a data-dump file name, or raise ValueError."""
+    match = ARCHIVE_NAME.match(os.path.basename(path))
+    if not match:
+        raise ValueError(f"Not a Binance kline archive name: {path}")
+    return match.group("symbol"), match.group("interval")
+
+def _open_text(path):
+    if path.endswith(".zip"):
+        zf = zipfile.ZipFile(path)
+        members = [n for n in zf.namelist() if n.endswith(".csv")]
+        if len(members) != 1:
+            zf.close()
+            raise ValueError(f"{path}: expected exactly one CSV inside, found {members}")
+        return zf, io.TextIOWrapper(zf.open(members[0]), encoding="ascii", newline="")
+    return None, open(path, encoding="ascii", newline="")
+
+# data-dump CSV columns kept in the store
+CSV_COLUMNS = (("open_time", 0), ("open", 1), ("high", 2), ("low", 3), ("close", 4), ("volume", 5))
+
+def iter_chunks(path, chunk_rows=CHUNK_ROWS):
+    """
+    Yield {column: numpy array} chunks (open_time, open, high, low, close,
+    volume) of at most chunk_rows rows, streaming straight out of the
+    (zipped) CSV.
+    """
+    zf, text = _open_text(path)
+    try:
+        rows = []
+        for row in csv.reader(text):
+            if not row or not row[0].isdigit():
+                continue  # header line (newer archives) or blank
+            rows.append(row[:6])
+            if len(rows) >= chunk_rows:
+                yield _to_arrays(rows)
+                rows = []
+        if rows:
+            yield _to_arrays(rows)
+    finally:
+        text.close()
+        if zf is not None:
+            zf.close()
+
+def _to_arrays(rows):
+    open_times = np.array([int(r[0]) for r in rows], dtype=np.int64)
+    if len(open_times) and open_times[0] >= _MICROSECONDS_THRESHOLD:
+        open_times //= 1000
+    values = np.array(rows, dtype=np.float64)
+    chunk = {name: values[:, idx] for name, idx in CSV_COLUMNS[1:]}
+    chunk["open_time"] = open_times
+    return chunk
+
+def parse_archive(path):
+    """Parse one archive in a worker process. Returns (path, symbol, interval, columns)."""
+    symbol, interval = parse_archive_name(path)
+    chunks = list(iter_chunks(path))
+    if not chunks:
+        return path, symbol, interval, {"open_time": np.empty(0, np.int64), "close": np.empty(0, np.float64)}
+    return path, symbol, interval, {
+        name: np.concatenate([c[name] for c in chunks]) for name in chunks[0]
+    }
+
+def _sort_key(path):
+    # chronological within a series: names end in -YYYY-MM[-DD]
+    symbol, interval = parse_archive_name(path)
+    return symbol, interval, os.path.basename(path)
+
+def import_archives(paths, store, workers=None, progress=None):
+    """
+    Import archives into `store` using a process pool.
+    Returns {(symbol, interval): rows_added}.
+    """
+    paths = sorted(paths, key=_sort_key)
+    workers = workers or os.cpu_count() or 1
+    added = {}
+    window = deque()
+    pending = iter(paths)
+    done = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        def fill():
+            while len(window) < 2 * workers:
+                path = next(pending, None)
+                if path is None:
+                    return
+                window.append(pool.submit(parse_archive, path))
+
+        fill()
+        # Results are consumed in submission order, i.e. chronologically per
+        # series, so the store can append instead of rewriting.
+        while window:
+            path, symbol, interval, columns = window.popleft().result()
+            fill()
+            times, closes = columns.pop("open_time"), columns.pop("close")
+            rows = store.merge(symbol, interval, times, closes, **columns)
+            added[(symbol, interval)] = added.get((symbol, interval), 0) + rows
+            done += 1
+            if progress:
+                progress(done, len(paths), path, rows)
+
+    # keep the 4h/1d/1w aggregates in step with the newly imported data
+    for symbol in sorted({symbol for symbol, _ in added}):
+        for interval, rows in store.refresh_pyramid(symbol).items():
+            added[(symbol, interval)] = added.get((symbol, interval), 0) + rows
+    return added
+
+def main():
+    parser = argparse.ArgumentParser(description="Import Binance kline archives into the local price store.")
+    parser.add_argument("paths", nargs="+", help="archive files or directories containing them")
+    parser.add_argument("--store", default=PRICE_STORE_DIR, help=f"price store directory (default {PRICE_STORE_DIR})")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: CPU count)")
+    args = parser.parse_args()
+
+    paths = []
+    for p in args.paths:
+        if os.path.isdir(p):
+            paths.extend(os.path.join(p, name) for name in os.listdir(p) if ARCHIVE_NAME.match(name))
+        else:
+            paths.append(p)
+    if not paths:
+        parser.error("no archive files found")
+
+    def progress(done, total, path, rows):
+        print(f"[{done}/{total}] {os.path.basename(path)}: {rows} rows", file=sys.stderr)
+
+    started = time.perf_counter()
+    added = import_archives(paths, PriceStore(args.store), args.workers, progress)
+    for (symbol, interval), rows in sorted(added.items()):
+        print(f"{symbol} {interval}: +{rows} rows")
+    print(f"Imported {len(paths)} files in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# job_queue.py
+#
+# Durable calculation jobs. perform_calculation writes the chat's plan to a
+# local SQLite database (CALC_JOBS_FILE) before queuing it, and the job is
+# only marked done once its report, or error, has been delivered. On startup,
+# jobs that never finished (still queued, or running when the process
+# stopped) are queued again, so a deploy or crash can't drop a request:
+# processing is at-least-once.
+#
+# Each job has an idempotency key, the chat and message that asked for it. A
+# message Telegram delivers again after a restart finds its key taken and
+# doesn't queue a second calculation. Finished jobs are kept for
+# CALC_JOBS_KEEP_SECONDS for that reason, then purged.
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+from metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+CALC_JOBS_FILE = os.getenv("CALC_JOBS_FILE", "calc_jobs.sqlite3")
+CALC_JOBS_KEEP_SECONDS = int(os.getenv("CALC_JOBS_KEEP_SECONDS", "86400"))
+# a job that was started this many times without finishing is given up on,
+# so one that kills the process can't do so on every start
+CALC_JOB_MAX_ATTEMPTS = int(os.getenv("CALC_JOB_MAX_ATTEMPTS", "3"))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+CALC_JOBS = Counter("calc_jobs_total", "Durable calculation jobs by event.", ["event"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    key      TEXT NOT NULL UNIQUE,
+    chat_id  INTEGER NOT NULL,
+    payload  TEXT NOT NULL,
+    state    TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created  REAL NOT NULL,
+    updated  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, updated);
+"""
+
+class JobQueue:
+    def __init__(self, path=CALC_JOBS_FILE, keep_seconds=CALC_JOBS_KEEP_SECONDS,
+                 max_attempts=CALC_JOB_MAX_ATTEMPTS):
+        self.path = path
+        self.keep_seconds = keep_seconds
+        self.max_attempts = max_attempts
+        # opened on first use, so importing the bot's modules creates no file
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _conn(self):
+        if self._db is None:
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            # WAL survives a killed process without fsyncing every commit
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(SCHEMA)
+            self._db = db
+        return self._db
+
+    def add(self, key, chat_id, payload):
+        """
+        Record a job for `payload` (a JSON-able dict). Returns its id, or None
+        if a job with this key exists already.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn().execute(
+                "INSERT OR IGNORE INTO jobs (key, chat_id, payload, state, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, chat_id, json.dumps(payload), QUEUED, now, now)
+            )
+        if not cursor.rowcount:
+            CALC_JOBS.inc(event="duplicate")
+            return None
+        CALC_JOBS.inc(event="queued")
+        return cursor.lastrowid
+
+    def start(self, job_id):
+        """Mark a job running and return its payload."""
+        with self._lock:
+            db = self._conn()
+            db.execute(
+                "UPDATE jobs SET state = ?, attempts = attempts + 1, updated = ? WHERE id = ?",
+                (RUNNING, time.time(), job_id)
+            )
+            row = db.execute("SELECT payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0])
+
+    def payload(self, job_id):
+        """A job's payload, leaving its state alone."""
+        with self._lock:
+            row = self._conn().execute("SELECT payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0])
+
+    def finish(self, job_id, state=DONE):
+        """Mark a job done (or failed); its result has been delivered."""
+        with self._lock:
+            cursor = self._conn().execute(
+                "UPDATE jobs SET state = ?, updated = ? WHERE id = ? AND state IN (?, ?)",
+                (state, time.time(), job_id, QUEUED, RUNNING)
+            )
+        if cursor.rowcount:
+            CALC_JOBS.inc(event=state)
+
+    def unfinished(self):
+        """
+        [(job id, chat id, payload)] of the jobs to run again after a
+        restart, oldest first. Jobs already started max_attempts times are
+        marked failed instead.
+        """
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            db.execute(
+                "UPDATE jobs SET state = ?, updated = ? WHERE state IN (?, ?) AND attempts >= ?",
+                (FAILED, now, QUEUED, RUNNING, self.max_attempts)
+            )
+            rows = db.execute(
+                "SELECT id, chat_id, payload FROM jobs WHERE state IN (?, ?) ORDER BY id",
+                (QUEUED, RUNNING)
+            ).fetchall()
+            db.execute(
+                "DELETE FROM jobs WHERE state IN (?, ?) AND updated < ?",
+                (DONE, FAILED, now - self.keep_seconds)
+            )
+        CALC_JOBS.inc(len(rows), event="recovered")
+        return [(job_id, chat_id, json.loads(payload)) for job_id, chat_id, payload in rows]
+
+    def counts(self):
+        """{state: jobs}"""
+        with self._lock:
+            return dict(self._conn().execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+# The bot's job queue.
+JOBS = JobQueue()
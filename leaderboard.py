@@ -0,0 +1,298 @@
+# leaderboard.py
+#
+# The /top leaderboard: how the same standard plan, $100 weekly over the last
+# 6 months, 1 year and 3 years, did on every trading USDT pair.
+#
+# A background job rebuilds the table every LEADERBOARD_EVERY_SECONDS. Each
+# pair's daily series is loaded once (through the price store and kline
+# cache, with spare Binance weight only) and every period is evaluated on it
+# with dca_on_prices, a few pairs at a time. Per period and pair the table
+# keeps only what the plan's value depends on: coins bought per dollar by DCA
+# and by a lump sum, and the number of purchases. It is saved to
+# LEADERBOARD_FILE, so /top works right after a restart.
+#
+# A pair whose series could not be loaded (empty, or ending days before now,
+# as a failed fetch leaves it) keeps its rows from the previous table. If too
+# many pairs failed, e.g. during an outage, the table isn't replaced at all
+# and the rebuild is retried after LEADERBOARD_RETRY_SECONDS.
+#
+# /top then only needs current prices, all of them from one ticker request,
+# to rank the pairs: value = coins per dollar * price.
+
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import binance_api
+from binance_api import get_closing_prices, fetch_all_prices, to_ms
+from dca_calculator import dca_on_prices, parse_investment_period
+from symbol_index import SYMBOL_INDEX
+from metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_FILE = os.getenv("LEADERBOARD_FILE", "leaderboard.json")
+LEADERBOARD_EVERY_SECONDS = int(os.getenv("LEADERBOARD_EVERY_SECONDS", "21600"))
+LEADERBOARD_WORKERS = int(os.getenv("LEADERBOARD_WORKERS", "4"))
+# like the cache warmer, only spare Binance weight is used
+LEADERBOARD_WEIGHT_RESERVE = float(os.getenv("LEADERBOARD_WEIGHT_RESERVE", "0.5"))
+# current prices are shared by all /top requests for this long
+LEADERBOARD_PRICE_SECONDS = float(os.getenv("LEADERBOARD_PRICE_SECONDS", "30"))
+# a rebuild with more than this share of pairs failing keeps the old table
+LEADERBOARD_MAX_FAILED = float(os.getenv("LEADERBOARD_MAX_FAILED", "0.2"))
+LEADERBOARD_RETRY_SECONDS = int(os.getenv("LEADERBOARD_RETRY_SECONDS", "600"))
+
+QUOTE = "USDT"
+AMOUNT = 100.0        # per purchase
+FREQUENCY_DAYS = 7
+PERIODS = {"6m": "6 months", "1y": "1 year", "3y": "3 years"}
+DEFAULT_PERIOD = "1y"
+# pairs listed more than this long after a period's start are left out of it
+MAX_LATE_START = timedelta(days=7)
+# a trading pair's daily series ending earlier than this before now failed to load
+MAX_STALE = timedelta(days=2)
+
+LEADERBOARD_RUNS = Counter("leaderboard_runs_total", "Completed leaderboard rebuilds.")
+LEADERBOARD_FAILED = Counter("leaderboard_failed_pairs_total", "Pairs whose prices could not be loaded for the leaderboard.")
+LEADERBOARD_PAIRS = Gauge("leaderboard_pairs", "Pairs ranked in the longest leaderboard period.")
+
+class Leaderboard(threading.Thread):
+    def __init__(self, path=LEADERBOARD_FILE, every_seconds=LEADERBOARD_EVERY_SECONDS,
+                 workers=LEADERBOARD_WORKERS, weight_reserve=LEADERBOARD_WEIGHT_RESERVE):
+        super().__init__(name="leaderboard", daemon=True)
+        self.path = path
+        self.every_seconds = every_seconds
+        self.workers = workers
+        self.weight_reserve = weight_reserve
+        # {"computed_at": epoch seconds, "periods": {label: {column: array}}};
+        # replaced as a whole
+        self._table = None
+        self._prices = (0.0, {})  # (fetched_at, {symbol: price})
+        self._prices_lock = threading.Lock()
+        self._halt = threading.Event()
+        try:
+            self._load()
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not load the leaderboard: {e}")
+        LEADERBOARD_PAIRS.set_function(
+            lambda: len(self._table["periods"].get("3y", {}).get("symbol", ())) if self._table else 0
+        )
+
+    # ---- persistence ----
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            doc = json.load(f)
+        self._table = {
+            "computed_at": doc["computed_at"],
+            "periods": {
+                label: {name: np.array(values) for name, values in columns.items()}
+                for label, columns in doc["periods"].items()
+            },
+        }
+
+    def _save(self):
+        doc = {
+            "computed_at": self._table["computed_at"],
+            "periods": {
+                label: {name: values.tolist() for name, values in columns.items()}
+                for label, columns in self._table["periods"].items()
+            },
+        }
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(doc, f, separators=(",", ":"))
+        os.replace(self.path + ".tmp", self.path)
+
+    # ---- rebuilding ----
+    def run(self):
+        while not self._halt.is_set():
+            age = time.time() - self._table["computed_at"] if self._table else self.every_seconds
+            if age < self.every_seconds:
+                self._halt.wait(self.every_seconds - age)
+                continue
+            try:
+                rebuilt = self.rebuild()
+            except Exception:
+                logger.exception("Leaderboard rebuild failed")
+                rebuilt = None
+            if rebuilt is None:
+                self._halt.wait(min(self.every_seconds, LEADERBOARD_RETRY_SECONDS))
+
+    def stop(self):
+        self._halt.set()
+
+    def _wait_for_budget(self):
+        limiter = binance_api.WEIGHT_LIMITER
+        needed = limiter.capacity * self.weight_reserve
+        while limiter.available() < needed and not self._halt.is_set():
+            self._halt.wait((needed - limiter.available()) / limiter.rate)
+
+    def rebuild(self, symbols=None):
+        """
+        Evaluate the standard plans on every trading USDT pair and replace the
+        table. Returns the new table, or None if too many pairs failed to load
+        and the previous one was kept.
+        """
+        computed_at = int(time.time())
+        end_dt = datetime.utcfromtimestamp(computed_at)
+        symbols = SYMBOL_INDEX.trading(QUOTE) if symbols is None else symbols
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="leaderboard") as pool:
+            evaluated = list(pool.map(lambda symbol: self._evaluate(symbol, end_dt), symbols))
+
+        failed = [symbol for symbol, found in zip(symbols, evaluated) if found is None]
+        LEADERBOARD_FAILED.inc(len(failed))
+        if self._halt.is_set() or len(failed) > LEADERBOARD_MAX_FAILED * len(symbols):
+            logger.warning(f"Leaderboard: {len(failed)} of {len(symbols)} pairs failed to load, keeping the previous table")
+            return None
+
+        periods = {}
+        for label in PERIODS:
+            rows = [(symbol, *found[label]) for symbol, found in zip(symbols, evaluated) if found and label in found]
+            rows += self._previous_rows(label, failed)
+            # ranked by the value at the last close (kept rows last); /top
+            # re-ranks at current prices
+            rows.sort(key=lambda row: (np.isnan(row[4]), -row[1] * row[4]))
+            periods[label] = {
+                "symbol": np.array([row[0] for row in rows], dtype=str),
+                "dca_coins": np.array([row[1] for row in rows], dtype=np.float64),
+                "lump_coins": np.array([row[2] for row in rows], dtype=np.float64),
+                "purchases": np.array([row[3] for row in rows], dtype=np.int64),
+            }
+        self._table = {"computed_at": computed_at, "periods": periods}
+        self._save()
+        LEADERBOARD_RUNS.inc()
+        logger.info(
+            f"Leaderboard rebuilt: {len(symbols)} pairs ({len(failed)} failed, kept), "
+            + ", ".join(f"{label} {len(columns['symbol'])}" for label, columns in periods.items())
+            + f" ranked in {time.perf_counter() - started:.1f}s"
+        )
+        return self._table
+
+    def _previous_rows(self, label, symbols):
+        """The previous table's rows for `symbols` in period `label`, without a last close."""
+        columns = self._table["periods"].get(label) if self._table else None
+        if columns is None or not symbols:
+            return []
+        keep = np.flatnonzero(np.isin(columns["symbol"], symbols))
+        return [
+            (str(columns["symbol"][i]), float(columns["dca_coins"][i]), float(columns["lump_coins"][i]),
+             int(columns["purchases"][i]), np.nan)
+            for i in keep
+        ]
+
+    def _evaluate(self, symbol, end_dt):
+        # {label: (DCA coins per dollar, lump sum coins per dollar, purchases,
+        # last close)} for the periods the pair was listed for; None if its
+        # prices couldn't be loaded
+        if self._halt.is_set():
+            return None
+        starts = {label: end_dt - parse_investment_period(period) for label, period in PERIODS.items()}
+        self._wait_for_budget()
+        try:
+            prices = get_closing_prices(symbol, min(starts.values()), end_dt, "1d")
+        except Exception as e:
+            logger.warning(f"Leaderboard: could not load {symbol}: {e}")
+            return None
+        # a trading pair has candles up to now; fetch errors leave them out
+        if not len(prices) or int(prices.open_times[-1]) < to_ms(end_dt - MAX_STALE):
+            logger.warning(f"Leaderboard: could not load {symbol}")
+            return None
+        first_ms = int(prices.open_times[0])
+        last_close = float(prices.closes[-1])
+
+        found = {}
+        for label, start_dt in starts.items():
+            if first_ms > to_ms(start_dt + MAX_LATE_START):
+                continue
+            try:
+                result = dca_on_prices(
+                    prices, 1.0, symbol, start_dt, end_dt, FREQUENCY_DAYS, False,
+                    current_price=last_close
+                )
+            except ValueError:
+                continue
+            found[label] = (
+                result["total_coins_purchased"], result["lump_sum_coins"],
+                result["number_of_investments"], last_close
+            )
+        return found
+
+    # ---- serving ----
+    @property
+    def computed_at(self):
+        """When the table was built, as a naive UTC datetime, or None before the first build."""
+        table = self._table
+        return None if table is None else datetime.utcfromtimestamp(table["computed_at"])
+
+    def current_prices(self):
+        with self._prices_lock:
+            fetched_at, prices = self._prices
+            if time.monotonic() - fetched_at >= LEADERBOARD_PRICE_SECONDS:
+                prices = fetch_all_prices()
+                self._prices = (time.monotonic(), prices)
+            return prices
+
+    def top(self, period=DEFAULT_PERIOD, limit=10, prices=None):
+        """
+        The `limit` best pairs for `period` at current prices, as dicts with
+        symbol, price, purchases, invested, value, roi and lump_sum_roi (%),
+        best first. None until the first table is built.
+        """
+        table = self._table
+        if table is None:
+            return None
+        columns = table["periods"][period]
+        prices = self.current_prices() if prices is None else prices
+        price = np.array([prices.get(symbol, np.nan) for symbol in columns["symbol"]], dtype=np.float64)
+        roi = (columns["dca_coins"] * price - 1) * 100
+        lump_sum_roi = (columns["lump_coins"] * price - 1) * 100
+        # pairs without a current price (delisted since) drop out
+        order = np.argsort(np.where(np.isnan(roi), np.inf, -roi), kind="stable")[:limit]
+        order = order[~np.isnan(roi[order])]
+        return [
+            {
+                "symbol": str(columns["symbol"][i]),
+                "price": float(price[i]),
+                "purchases": int(columns["purchases"][i]),
+                "invested": AMOUNT * int(columns["purchases"][i]),
+                "value": AMOUNT * int(columns["purchases"][i]) * (1 + roi[i] / 100),
+                "roi": float(roi[i]),
+                "lump_sum_roi": float(lump_sum_roi[i]),
+            }
+            for i in order
+        ]
+
+# The bot keeps one leaderboard.
+LEADERBOARD = Leaderboard()
+
+def start_leaderboard():
+    if not LEADERBOARD.is_alive():
+        LEADERBOARD.start()
+    return LEADERBOARD
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the /top DCA leaderboard and print it.")
+    parser.add_argument("--period", choices=sorted(PERIODS), default=DEFAULT_PERIOD, help="period to print")
+    parser.add_argument("--limit", type=int, default=20, help="pairs to print")
+    parser.add_argument("--workers", type=int, default=LEADERBOARD_WORKERS, help="pairs loaded at once")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    board = Leaderboard(workers=args.workers, weight_reserve=0.0)
+    board.rebuild()
+    if board.computed_at is None:
+        parser.exit(1, "Too many pairs failed to load, no leaderboard yet\n")
+    for rank, row in enumerate(board.top(args.period, args.limit), 1):
+        print(f"{rank:>3}. {row['symbol']:<14}{row['roi']:>+10.1f}%  lump sum {row['lump_sum_roi']:>+10.1f}%")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# load_test.py
+#
+# Simulates many Telegram users walking the whole conversation at once,
+# in-process: commands.register_handlers runs against fake_bot.FakeBot and
+# Binance is replaced by the local stub. Use it to size replicas and to check
+# that changes to the concurrency model actually help.
+#
+#   python load_test.py --users 2000 --concurrency 500 --think 1.0
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import binance_api
+from binance_stub import start_stub
+from rate_limit import TokenBucket
+
+SYMBOLS = ["BTC/USDT", "ETH/USDT", "BNBUSDT"]
+PERIODS = ["6 months", "1 year", "2 years"]
+FREQUENCIES = ["weekly", "bi-weekly", "monthly", "daily"]
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, max(0, round(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[idx]
+
+def rss_mb():
+    """Current resident set size in MB (Linux), or peak RSS elsewhere."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+class _MemorySampler(threading.Thread):
+    def __init__(self, interval=0.5):
+        super().__init__(name="rss-sampler", daemon=True)
+        self.interval = interval
+        self.peak = rss_mb()
+        self._halt = threading.Event()
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            self.peak = max(self.peak, rss_mb())
+
+    def stop(self):
+        self._halt.set()
+
+def simulate_user(bot, chat_id, rng, think, timeout):
+    """
+    Walk one chat from /start to the report.
+    Returns (end_to_end_seconds or None, [handler seconds per step]).
+    """
+    def pause():
+        if think > 0:
+            time.sleep(rng.expovariate(1.0 / think))
+
+    steps = [
+        ("text", "/start"),
+        ("press", "lang_en"),
+        ("text", str(rng.choice([100, 500, 1000, 2500]))),
+        ("text", rng.choice(SYMBOLS)),
+        ("text", "period"),
+        ("text", rng.choice(PERIODS)),
+        ("text", "no"),
+        ("text", rng.choice(FREQUENCIES)),
+        ("text", rng.choice(["0", "0.1"])),
+    ]
+    handler_times = []
+    for i, (kind, payload) in enumerate(steps):
+        pause()
+        since = bot.history_len(chat_id)
+        start = time.perf_counter()
+        if kind == "press":
+            bot.press(chat_id, payload)
+        else:
+            bot.send_text(chat_id, payload)
+        handler_times.append(time.perf_counter() - start)
+
+        if i == len(steps) - 1:
+            # the fee message triggers the calculation; wait for the chart
+            reply = bot.wait_for(chat_id, ("photo",), since=since, timeout=timeout)
+            if reply is None:
+                return None, handler_times
+            return reply[2] - start, handler_times
+    return None, handler_times
+
+def run_load_test(users=1000, concurrency=200, think=0.5, timeout=120.0, seed=1, workers=None):
+    from fake_bot import FakeBot
+    from data_store import DataStore
+    import commands
+
+    stub = start_stub()
+    binance_api.BINANCE_API_URL = stub.url
+    binance_api.WEIGHT_LIMITER = TokenBucket(rate=1e9, capacity=1e9)
+    if workers:
+        commands.calc_scheduler.workers = workers
+
+    bot = FakeBot()
+    register_store = DataStore()
+    commands.register_handlers(bot, register_store)
+
+    cwd = os.getcwd()
+    os.chdir(tempfile.mkdtemp(prefix="dca-load-"))
+    sampler = _MemorySampler()
+    rss_start = rss_mb()
+    sampler.start()
+    start = time.perf_counter()
+    latencies, handler_times, failures = [], [], 0
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [
+                pool.submit(simulate_user, bot, chat_id, random.Random(seed * 1_000_003 + chat_id), think, timeout)
+                for chat_id in range(1, users + 1)
+            ]
+            for future in futures:
+                e2e, steps = future.result()
+                handler_times.extend(steps)
+                if e2e is None:
+                    failures += 1
+                else:
+                    latencies.append(e2e)
+    finally:
+        elapsed = time.perf_counter() - start
+        sampler.stop()
+        os.chdir(cwd)
+        stub.shutdown()
+
+    latencies.sort()
+    handler_times.sort()
+    ms = lambda v: None if v is None else round(v * 1000, 1)
+    return {
+        "users": users,
+        "concurrency": concurrency,
+        "think_seconds": think,
+        "calc_workers": commands.calc_scheduler.workers,
+        "completed": len(latencies),
+        "failed": failures,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_reports_per_s": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "end_to_end_ms": {
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "max": ms(latencies[-1] if latencies else None),
+        },
+        "handler_ms": {
+            "p50": ms(percentile(handler_times, 50)),
+            "p99": ms(percentile(handler_times, 99)),
+        },
+        "memory_mb": {
+            "start": round(rss_start, 1),
+            "end": round(rss_mb(), 1),
+            "peak": round(sampler.peak, 1),
+            "growth": round(rss_mb() - rss_start, 1),
+        },
+        "sessions": len(register_store.user_sessions),
+        "stub_requests": stub.request_count,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process load test for the DCA bot.")
+    parser.add_argument("--users", type=int, default=1000, help="number of simulated chats")
+    parser.add_argument("--concurrency", type=int, default=200, help="chats active at the same time")
+    parser.add_argument("--think", type=float, default=0.5, help="mean think time between messages (s)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="max wait for a report (s)")
+    parser.add_argument("--workers", type=int, help="override CALC_WORKERS")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("-o", "--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = run_load_test(args.users, args.concurrency, args.think, args.timeout, args.seed, args.workers)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    if report["failed"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,39 @@
 # localization.py
 
-def tr(key: str, lang: str = 'en') -> str:
+import enum
+from string import Formatter
+
+from telebot import types
+
+DEFAULT_LANG = 'en'
+
+def tr(key, lang: str = DEFAULT_LANG) -> str:
     """
     برگرداندن متن ترجمه شده برای کلید داده‌شده در زبان مربوطه.
     اگر کلید در زبان خواسته‌شده موجود نباشد، متن زبان انگلیسی برگردانده می‌شود.
+
+    `key` can be a MessageId (fast path, plain tuple indexing) or the old
+    string key, which is resolved through a single dict lookup.
+    """
+    if not isinstance(key, int):
+        msg_id = _KEY_INDEX.get(key)
+        if msg_id is None:
+            return key
+        key = msg_id
+    return _TABLE[_LANG_OFFSET.get(lang, 0) + key]
+
+def trf(key, lang: str = DEFAULT_LANG, **kwargs) -> str:
+    """
+    Same as tr(), then fill the named placeholders, e.g.
+    trf(MessageId.RANGE_PARSE_ERROR_START, 'fa', error="...").
+    Uses the prebuilt bound `str.format` of the compiled catalog.
     """
-    return MESSAGES[lang].get(key, MESSAGES['en'].get(key, key))
+    if not isinstance(key, int):
+        msg_id = _KEY_INDEX.get(key)
+        if msg_id is None:
+            return key.format(**kwargs)
+        key = msg_id
+    return _FORMATTERS[_LANG_OFFSET.get(lang, 0) + key](**kwargs)
 
 MESSAGES = {
     'en': {
@@ -37,7 +65,11 @@ MESSAGES = {
             "• /start – Begin a new DCA calculation\n"
             "• /help – Show this help\n"
             "• /cancel – Cancel current process\n"
-            "• /restart – Restart the flow\n\n"
+            "• /restart – Restart the flow\n"
+            "• /track – Follow a plan and get an update after each purchase\n"
+            "• /plans – Your followed plans (`/untrack <id>` to stop one)\n"
+            "• /dca – Calculate in one message, e.g. `/dca 1000 BTCUSDT 1y weekly 0.1%`\n"
+            "• /top – Pairs where a weekly plan did best, e.g. `/top 3y`\n\n"
             "*Disclaimer:* Educational tool only, not financial advice!"
         ),
         "cancel_message": "✅ Process canceled. Type /start to begin again.",
@@ -50,8 +82,13 @@ MESSAGES = {
         "invalid_amount": "❌ Please enter a valid amount (e.g., 1000 or 1200.50).",
         "ask_symbol": (
             "💱 *Step 2:* Which *crypto pair* would you like to invest in?\n\n"
-            "_Example:_ BTC/USDT, ETH/USDT, etc."
+            "_Example:_ BTC/USDT, ETH/USDT, etc. Any quote works, e.g. SOL/TRY; "
+            "pairs Binance doesn't list are built from both assets' USDT prices."
         ),
+        "unknown_symbol": "❌ *{symbol}* is not a Binance spot pair. Please enter a pair like BTC/USDT.",
+        "symbol_not_trading": "❌ *{symbol}* is not trading on Binance right now. Please choose another pair.",
+        "symbol_suggestions": "Did you mean {suggestions}?",
+        "before_listing": "❌ {symbol} was only listed on Binance on {listed}. Please choose dates that end after that.",
         # ------ Range or Period ------
         "ask_range_or_period": (
             "Would you like to specify an *exact custom date range (start & end)*,\n"
@@ -107,7 +144,7 @@ MESSAGES = {
         "invalid_date": "❌ Invalid date format. Please use YYYY-MM-DD.",
         "ask_frequency": (
             "🔁 *Step 4:* How often will you invest?\n\n"
-            "_Examples:_ weekly, bi-weekly, monthly, every 3 days."
+            "_Examples:_ weekly, bi-weekly, monthly, every 3 days, every 4 hours, every 15 minutes (15m)."
         ),
         "ask_fee": (
             "💸 *Step 5:* Enter the *trading fee percentage* (if any).\n\n"
@@ -115,6 +152,18 @@ MESSAGES = {
         ),
         "invalid_fee": "❌ Invalid fee. Must be a non-negative number (e.g. 0.1).",
         "calculating": "⌛ *Calculating your DCA performance...* Please wait...",
+        "queue_position": "🕒 You're *#{position}* in line. Your calculation will start shortly.",
+        "calculation_pending": "⏳ Your calculation is still running. The report will follow shortly.",
+        "top_header": (
+            "🏆 *Top {count} pairs for ${amount:,.0f} weekly over {period}*\n"
+            "_Plans up to {computed} UTC, valued at current prices._"
+        ),
+        "top_line": "{rank}. *{symbol}* {roi:+.1f}%: ${invested:,.0f} → ${value:,.0f} (lump sum {lump_sum_roi:+.1f}%)",
+        "top_usage": "Usage: `/top [6m|1y|3y] [count]`, e.g. `/top 3y 20` (at most {max} pairs).",
+        "top_unavailable": "⏳ The leaderboard isn't ready yet. Please try again in a few minutes.",
+        "profile_armed": "🔬 Profiling the next {count} calculation(s). Summaries will be sent here.",
+        "profile_usage": "Usage: `/profile [count]`, e.g. `/profile 3`.",
+        "rate_limited": "⏳ Too many calculations in a row. Please wait {seconds}s, then send any message to try again.",
         "final_prompt": "✅ Done! Here's your DCA report:",
         "error_value": "❌ Error: ",
         "error_unexpected": "❌ Unexpected error: ",
@@ -124,6 +173,65 @@ MESSAGES = {
         "choose_lang_button": "Choose Language",
         "language_choice_en": "English",
         "language_choice_es": "Farsi",
+        "track_usage": (
+            "📌 *Follow a plan:* `/track <amount> <pair> <frequency> [since YYYY-MM-DD] [fee%]`\n"
+            "_Example:_ `/track 50 BTC/USDT weekly since 2023-01-01 0.1%`\n\n"
+            "See your plans with /plans and stop one with `/untrack <id>`."
+        ),
+        "track_added": (
+            "✅ Now following plan *#{plan_id}*: ${amount:,.2f} into {symbol} every {freq_value} {unit}, "
+            "starting {start}. You'll get an update after each purchase."
+        ),
+        "track_limit": "❌ You can follow at most {limit} plans. Stop one with `/untrack <id>` first.",
+        "track_update": (
+            "📬 *Plan #{plan_id}* ({symbol})\n"
+            "• Purchases: {purchases}\n"
+            "• Invested: ${invested:,.2f}\n"
+            "• Coins: {coins:.6f}\n"
+            "• Value: ${value:,.2f} (price ${price:,.2f})\n"
+            "• ROI: {roi:+.2f}%"
+        ),
+        "plans_empty": "You're not following any plans. Use /track to follow one.",
+        "plans_header": "📋 *Your plans:*",
+        "plans_line": (
+            "*#{plan_id}* {symbol}: ${amount:,.2f} every {freq_value} {unit} since {start}. "
+            "{purchases} purchases, ${invested:,.2f} invested."
+        ),
+        "untrack_done": "🗑 Stopped following plan #{plan_id}.",
+        "untrack_unknown": "❌ You have no plan #{plan_id}. See /plans.",
+        "unit_days": "day(s)",
+        "unit_hours": "hour(s)",
+        "dca_usage": (
+            "⚡ *Quick calculation:* `/dca <amount> <pair> <period> <frequency> [fee%]`\n"
+            "_Examples:_ `/dca 1000 BTCUSDT 1y weekly 0.1%`, "
+            "`/dca 500 ETH/USDT 2023-01-01 2024-01-01 monthly`\n\n"
+            "The period is like `1y`, `6m`, `2w`, `30d` or `6 months`, or a start date "
+            "with an optional end date. `m` is months in the period and minutes in the "
+            "frequency: `/dca 1000 BTCUSDT 1y 15m` buys every 15 minutes for a year. Purchases fill at the candle close; add `open`, "
+            "`typical` or `random` (`random:7` for another seed) to model other fills. "
+            "You can also type the same thing after the bot's @username in any chat."
+        ),
+        "inline_help": "How to use the DCA calculator",
+        "inline_title": "{symbol}: {total_inv} DCA, ROI {roi:+.2f}%",
+        "inline_description": "Worth {curr_value} now. Lump sum ROI {ls_roi:+.2f}%",
+        "export_csv_button": "📄 Export CSV",
+        "export_parquet_button": "📦 Export Parquet",
+        "export_caption": "🗂 Every purchase of your {symbol} plan ({purchases} rows).",
+        "export_expired": "❌ Nothing to export. Run a calculation first.",
+        "execution_note": "\n🎯 Fills modeled at the candle {execution}{seed_note}.",
+        "report_caption": (
+            "✅ *Your Final DCA Report*\n\n"
+            "🔸 **Pair:** {symbol}\n"
+            "💰 **Total Investment:** {total_inv}\n"
+            "🔹 **Coins Purchased:** {total_coins:.6f}\n"
+            "⚖️ **Average Cost:** {avg_price}\n"
+            "🔎 **Current Price:** {curr_price}\n"
+            "💼 **Current Portfolio Value:** {curr_value}\n"
+            "📈 **ROI:** {roi:+.2f}%\n\n"
+            "💥 **Lump-Sum Comparison:**\n"
+            "• Overall ROI: {ls_roi:+.2f}%\n\n"
+            "_DCA helps reduce market-timing risk (Not financial advice)_"
+        ),
     },
 
     'fa': {
@@ -156,7 +264,11 @@ MESSAGES = {
             "• /start – آغاز یک محاسبهٔ جدید DCA\n"
             "• /help – نمایش این راهنما\n"
             "• /cancel – لغو فرایند جاری\n"
-            "• /restart – شروع دوبارهٔ مراحل\n\n"
+            "• /restart – شروع دوبارهٔ مراحل\n"
+            "• /track – دنبال کردن یک طرح و دریافت گزارش پس از هر خرید\n"
+            "• /plans – طرح‌های دنبال‌شدهٔ شما (`/untrack <id>` برای توقف)\n"
+            "• /dca – محاسبه در یک پیام، مثلاً `/dca 1000 BTCUSDT 1y weekly 0.1%`\n"
+            "• /top – جفت‌ارزهایی که طرح هفتگی در آن‌ها بهترین بازده را داشته، مثلاً `/top 3y`\n\n"
             "*توجه:* این ربات فقط جنبهٔ آموزشی دارد و توصیهٔ مالی نیست!"
         ),
         "cancel_message": "✅ فرایند لغو شد. برای شروع دوباره /start را وارد کنید.",
@@ -169,8 +281,13 @@ MESSAGES = {
         "invalid_amount": "❌ مبلغ نامعتبر. لطفاً فقط عدد وارد کنید (مثلاً 1000 یا 1200.50).",
         "ask_symbol": (
             "💱 *مرحلهٔ ۲:* روی کدام *جفت رمزارز* می‌خواهید سرمایه‌گذاری کنید؟\n\n"
-            "_مثال:_ BTC/USDT، ETH/USDT"
+            "_مثال:_ BTC/USDT، ETH/USDT. هر ارز پایه‌ای ممکن است، مثلاً SOL/TRY؛ "
+            "جفت‌هایی که در بایننس نیستند از قیمت دلاری (USDT) هر دو دارایی ساخته می‌شوند."
         ),
+        "unknown_symbol": "❌ *{symbol}* یک جفت اسپات در بایننس نیست. لطفاً جفتی مانند BTC/USDT وارد کنید.",
+        "symbol_not_trading": "❌ *{symbol}* در حال حاضر در بایننس معامله نمی‌شود. لطفاً جفت دیگری انتخاب کنید.",
+        "symbol_suggestions": "منظورتان {suggestions} بود؟",
+        "before_listing": "❌ {symbol} از تاریخ {listed} در بایننس فهرست شده است. لطفاً بازه‌ای انتخاب کنید که بعد از این تاریخ تمام شود.",
         # ------ Range or Period ------
         "ask_range_or_period": (
             "آیا می‌خواهید یک *بازهٔ تاریخی دقیق* (تاریخ شروع و پایان) مشخص کنید،\n"
@@ -234,7 +351,7 @@ MESSAGES = {
         "invalid_date": "❌ فرمت تاریخ نامعتبر است. لطفاً از قالب YYYY-MM-DD استفاده کنید.",
         "ask_frequency": (
             "🔁 *مرحلهٔ ۴:* هر چند وقت یک‌بار سرمایه‌گذاری خواهید کرد؟\n\n"
-            "_مثال‌ها:_ هفتگی، هر دو هفته، ماهانه، هر ۳ روز."
+            "_مثال‌ها:_ هفتگی، هر دو هفته، ماهانه، هر ۳ روز، هر ۴ ساعت، هر ۱۵ دقیقه (15m)."
         ),
         "ask_fee": (
             "💸 *مرحلهٔ ۵:* درصد کارمزد (fee) را وارد کنید (در صورت وجود).\n\n"
@@ -242,6 +359,18 @@ MESSAGES = {
         ),
         "invalid_fee": "❌ درصد کارمزد نامعتبر است. باید عددی غیرمنفی باشد.",
         "calculating": "⌛ *در حال محاسبهٔ عملکرد DCA...* کمی صبر کنید...",
+        "queue_position": "🕒 شما *نفر {position}* در صف هستید. محاسبهٔ شما به‌زودی آغاز می‌شود.",
+        "calculation_pending": "⏳ محاسبهٔ شما هنوز در جریان است. گزارش به‌زودی می‌رسد.",
+        "top_header": (
+            "🏆 *{count} جفت‌ارز برتر برای ${amount:,.0f} در هفته طی {period}*\n"
+            "_طرح‌ها تا {computed} UTC، با قیمت‌های فعلی._"
+        ),
+        "top_line": "{rank}. *{symbol}* {roi:+.1f}%: ${invested:,.0f} ← ${value:,.0f} (خرید یکجا {lump_sum_roi:+.1f}%)",
+        "top_usage": "روش استفاده: `/top [6m|1y|3y] [count]`، مثلاً `/top 3y 20` (حداکثر {max} جفت‌ارز).",
+        "top_unavailable": "⏳ جدول رتبه‌بندی هنوز آماده نیست. لطفاً چند دقیقهٔ دیگر دوباره امتحان کنید.",
+        "profile_armed": "🔬 {count} محاسبهٔ بعدی پروفایل می‌شود. خلاصه‌ها همین‌جا فرستاده می‌شوند.",
+        "profile_usage": "روش استفاده: `/profile [تعداد]`، مثلاً `/profile 3`.",
+        "rate_limited": "⏳ تعداد محاسبات پشت‌سرهم زیاد است. لطفاً {seconds} ثانیه صبر کنید و سپس هر پیامی بفرستید تا دوباره تلاش شود.",
         "final_prompt": "✅ تمام! گزارش نهایی DCA شما:",
         "error_value": "❌ خطا: ",
         "error_unexpected": "❌ خطای پیش‌بینی‌نشده: ",
@@ -251,5 +380,163 @@ MESSAGES = {
         "choose_lang_button": "انتخاب زبان",
         "language_choice_en": "English",
         "language_choice_es": "Farsi",
+        "track_usage": (
+            "📌 *دنبال کردن یک طرح:* `/track <مبلغ> <جفت> <تناوب> [since YYYY-MM-DD] [کارمزد%]`\n"
+            "_مثال:_ `/track 50 BTC/USDT weekly since 2023-01-01 0.1%`\n\n"
+            "طرح‌های خود را با /plans ببینید و با `/untrack <id>` متوقف کنید."
+        ),
+        "track_added": (
+            "✅ طرح *#{plan_id}* دنبال می‌شود: ${amount:,.2f} در {symbol} هر {freq_value} {unit}، "
+            "از {start}. پس از هر خرید یک گزارش دریافت می‌کنید."
+        ),
+        "track_limit": "❌ حداکثر {limit} طرح را می‌توانید دنبال کنید. ابتدا یکی را با `/untrack <id>` متوقف کنید.",
+        "track_update": (
+            "📬 *طرح #{plan_id}* ({symbol})\n"
+            "• تعداد خرید: {purchases}\n"
+            "• سرمایه‌گذاری: ${invested:,.2f}\n"
+            "• مقدار کوین: {coins:.6f}\n"
+            "• ارزش: ${value:,.2f} (قیمت ${price:,.2f})\n"
+            "• بازده: {roi:+.2f}%"
+        ),
+        "plans_empty": "هیچ طرحی را دنبال نمی‌کنید. با /track یک طرح اضافه کنید.",
+        "plans_header": "📋 *طرح‌های شما:*",
+        "plans_line": (
+            "*#{plan_id}* {symbol}: ${amount:,.2f} هر {freq_value} {unit} از {start}. "
+            "{purchases} خرید، ${invested:,.2f} سرمایه‌گذاری."
+        ),
+        "untrack_done": "🗑 دنبال کردن طرح #{plan_id} متوقف شد.",
+        "untrack_unknown": "❌ طرح #{plan_id} را ندارید. /plans را ببینید.",
+        "unit_days": "روز",
+        "unit_hours": "ساعت",
+        "dca_usage": (
+            "⚡ *محاسبهٔ سریع:* `/dca <مبلغ> <جفت> <دوره> <تناوب> [کارمزد%]`\n"
+            "_مثال:_ `/dca 1000 BTCUSDT 1y weekly 0.1%`، "
+            "`/dca ۵۰۰ ETH/USDT ۱ سال هفتگی`\n\n"
+            "دوره مانند `1y`، `6m`، `2w`، `30d` یا `۶ ماه` است، یا یک تاریخ شروع "
+            "و در صورت نیاز تاریخ پایان. `m` در دوره یعنی ماه و در تناوب یعنی دقیقه: "
+            "`/dca 1000 BTCUSDT 1y 15m` یک سال هر ۱۵ دقیقه می‌خرد. خریدها با قیمت بسته‌شدن کندل انجام می‌شوند؛ "
+            "برای مدل‌های دیگر `open`، `typical` یا `random` (`random:7` با بذر دیگر) "
+            "را اضافه کنید. همین را می‌توانید در هر گفت‌وگویی پس از "
+            "@نام‌کاربری ربات هم بنویسید."
+        ),
+        "inline_help": "راهنمای ماشین‌حساب DCA",
+        "inline_title": "{symbol}: DCA به مبلغ {total_inv}، بازده {roi:+.2f}%",
+        "inline_description": "ارزش فعلی {curr_value}. بازده خرید یکجا {ls_roi:+.2f}%",
+        "export_csv_button": "📄 خروجی CSV",
+        "export_parquet_button": "📦 خروجی Parquet",
+        "export_caption": "🗂 همهٔ خریدهای طرح {symbol} شما ({purchases} ردیف).",
+        "export_expired": "❌ چیزی برای خروجی نیست. ابتدا یک محاسبه انجام دهید.",
+        "execution_note": "\n🎯 قیمت خریدها با مدل {execution}{seed_note} کندل محاسبه شده است.",
+        "report_caption": (
+            "✅ *گزارش نهایی DCA شما*\n\n"
+            "🔸 **جفت ارز:** {symbol}\n"
+            "💰 **مبلغ کل سرمایه‌گذاری:** {total_inv}\n"
+            "🔹 **تعداد کوین خریداری‌شده:** {total_coins:.6f}\n"
+            "⚖️ **میانگین قیمت خرید:** {avg_price}\n"
+            "🔎 **قیمت فعلی:** {curr_price}\n"
+            "💼 **ارزش فعلی پرتفوی:** {curr_value}\n"
+            "📈 **درصد بازدهی (ROI):** {roi:+.2f}%\n\n"
+            "💥 **مقایسه با خرید یکجا:**\n"
+            "• بازدهی کلی: {ls_roi:+.2f}%\n\n"
+            "_DCA می‌تواند ریسک زمان‌بندی بازار را کم کند (مشاورهٔ مالی نیست)_"
+        ),
     }
 }
+
+# ---- Compiled catalog ----
+# MESSAGES stays the human-editable source. At import we validate it and flatten
+# it into one tuple: _TABLE[_LANG_OFFSET[lang] + MessageId.X]. Missing
+# translations are resolved to the English text here, once, instead of on
+# every lookup.
+
+LANGUAGES = tuple(MESSAGES)
+
+MessageId = enum.IntEnum(
+    "MessageId",
+    [(key.upper(), idx) for idx, key in enumerate(MESSAGES[DEFAULT_LANG])]
+)
+
+def _placeholders(text: str) -> set:
+    return {field for _, field, _, _ in Formatter().parse(text) if field is not None}
+
+def validate_catalog(messages=MESSAGES):
+    """
+    Raise ValueError if any language has a key without an English fallback,
+    or if a translation uses different {placeholders} than the English text.
+    """
+    base = messages[DEFAULT_LANG]
+    problems = []
+    for lang, entries in messages.items():
+        if lang == DEFAULT_LANG:
+            continue
+        for key, text in entries.items():
+            if key not in base:
+                problems.append(f"{lang}:{key} has no '{DEFAULT_LANG}' fallback")
+            elif _placeholders(text) != _placeholders(base[key]):
+                problems.append(f"{lang}:{key} placeholders differ from '{DEFAULT_LANG}'")
+    if problems:
+        raise ValueError("Invalid MESSAGES catalog: " + "; ".join(problems))
+
+def _compile():
+    base = MESSAGES[DEFAULT_LANG]
+    table = []
+    for lang in LANGUAGES:
+        entries = MESSAGES[lang]
+        table.extend(entries.get(key, base[key]) for key in base)
+    return tuple(table)
+
+validate_catalog()
+_KEY_INDEX = {key: msg_id for key, msg_id in zip(MESSAGES[DEFAULT_LANG], MessageId)}
+_LANG_OFFSET = {lang: idx * len(MessageId) for idx, lang in enumerate(LANGUAGES)}
+_TABLE = _compile()
+_FORMATTERS = tuple(text.format for text in _TABLE)
+
+# ---- Cached keyboards ----
+# Markups are immutable once built (telebot serializes them on every send), so
+# one instance per language is shared by all chats.
+_KEYBOARDS = {}
+
+def _cached_keyboard(name, lang, build):
+    cache_key = (name, lang)
+    kb = _KEYBOARDS.get(cache_key)
+    if kb is None:
+        kb = _KEYBOARDS[cache_key] = build()
+    return kb
+
+def language_inline_keyboard():
+    def build():
+        kb = types.InlineKeyboardMarkup()
+        kb.add(
+            types.InlineKeyboardButton(tr(MessageId.LANGUAGE_CHOICE_EN), callback_data="lang_en"),
+            types.InlineKeyboardButton(tr(MessageId.LANGUAGE_CHOICE_ES), callback_data="lang_fa")
+        )
+        return kb
+    return _cached_keyboard("language", DEFAULT_LANG, build)
+
+def settings_keyboard(lang=DEFAULT_LANG):
+    # The "Settings" label is matched literally by commands.command_settings.
+    def build():
+        kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
+        kb.add(types.KeyboardButton("Settings"))
+        return kb
+    return _cached_keyboard("settings", DEFAULT_LANG, build)
+
+def settings_menu_keyboard(lang=DEFAULT_LANG):
+    def build():
+        kb = types.InlineKeyboardMarkup()
+        kb.add(types.InlineKeyboardButton(tr(MessageId.CHOOSE_LANG_BUTTON, lang), callback_data="show_lang"))
+        return kb
+    return _cached_keyboard("settings_menu", lang, build)
+
+def export_keyboard(lang=DEFAULT_LANG, formats=("csv",)):
+    # callback data is "export_<format>", see commands.callback_export
+    buttons = {"csv": MessageId.EXPORT_CSV_BUTTON, "parquet": MessageId.EXPORT_PARQUET_BUTTON}
+
+    def build():
+        kb = types.InlineKeyboardMarkup()
+        kb.add(*(
+            types.InlineKeyboardButton(tr(buttons[fmt], lang), callback_data=f"export_{fmt}")
+            for fmt in formats
+        ))
+        return kb
+    return _cached_keyboard(("export",) + tuple(formats), lang, build)
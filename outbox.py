@@ -0,0 +1,270 @@
+# outbox.py
+#
+# Everything the bot sends goes through this queue instead of straight to
+# bot.send_message/send_photo, so a burst stays within Telegram's limits:
+# about 30 messages per second overall and one per second to the same chat.
+# Handlers enqueue and return at once (see OutboundBot); a few sender
+# threads drain the queue over one pooled HTTP session.
+#
+# Each chat has its own FIFO, and at most one of its messages is in flight,
+# so a chat's messages arrive in the order they were sent. Consecutive
+# texts to a chat that are still waiting are merged into one message. A 429
+# puts the chat on hold for the retry_after Telegram asks for, and the
+# message is sent again afterwards.
+
+import os
+import time
+import heapq
+import logging
+import threading
+import itertools
+from collections import deque
+
+import requests
+from telebot import apihelper
+
+from rate_limit import TokenBucket, KeyedRateLimiter
+from metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_MESSAGES_PER_SECOND = float(os.getenv("OUTBOX_MESSAGES_PER_SECOND", "25"))
+OUTBOX_SENDERS = int(os.getenv("OUTBOX_SENDERS", "8"))
+# Telegram's limit for a message's text
+MAX_TEXT_LENGTH = 4096
+# connection errors and 5xx are retried this many times, 429s always
+MAX_ATTEMPTS = 3
+
+OUTBOX_SENT = Counter("outbox_messages_total", "Messages sent through the outbox.", ["result"])
+OUTBOX_COALESCED = Counter("outbox_coalesced_total", "Texts merged into the chat's previous waiting text.")
+OUTBOX_DEPTH = Gauge("outbox_depth", "Messages waiting in the outbox.")
+OUTBOX_SEND_SECONDS = Histogram("outbox_send_seconds", "Time for one Telegram send call.", ["method"])
+
+def configure_http_session(pool_size=OUTBOX_SENDERS):
+    """
+    Make every pyTelegramBotAPI call share one requests session whose
+    connection pool fits all sender threads, instead of a session per thread
+    that is rebuilt every 10 minutes.
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size + 4)
+    session.mount("https://", adapter)
+    apihelper.session = session
+    apihelper.SESSION_TIME_TO_LIVE = None
+    return session
+
+def retry_after(exc):
+    """Seconds Telegram asks us to wait, if `exc` is a 429, else None."""
+    if getattr(exc, "error_code", None) != 429:
+        return None
+    parameters = (getattr(exc, "result_json", None) or {}).get("parameters") or {}
+    return float(parameters.get("retry_after", 1))
+
+class _Item:
+    __slots__ = ("method", "args", "kwargs", "attempts", "callbacks", "timers", "seconds")
+
+    def __init__(self, method, args, kwargs, on_done=None, on_sent=None):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.attempts = 0
+        self.callbacks = [on_done] if on_done else []
+        self.timers = [on_sent] if on_sent else []
+        self.seconds = None  # the successful Telegram call's duration
+
+    def merge(self, other):
+        """Append a text to this waiting one if the result is the same as sending both."""
+        if self.method != "send_message" or other.method != "send_message":
+            return False
+        # only the last text may carry a keyboard; other options must agree
+        if self.kwargs.get("reply_markup") is not None:
+            return False
+        if {k: v for k, v in other.kwargs.items() if k != "reply_markup"} != self.kwargs:
+            return False
+        text = self.args[0] + "\n\n" + other.args[0]
+        if len(text) > MAX_TEXT_LENGTH:
+            return False
+        self.args = (text,) + other.args[1:]
+        self.kwargs = other.kwargs
+        self.callbacks += other.callbacks
+        self.timers += other.timers
+        return True
+
+class Outbox:
+    def __init__(self, bot, rate=OUTBOX_MESSAGES_PER_SECOND, per_chat_rate=1.0, senders=OUTBOX_SENDERS):
+        self.bot = bot
+        self.senders = senders
+        # a small burst allowance, so no one-second window goes far over `rate`
+        self.limiter = TokenBucket(rate=rate, capacity=max(1.0, rate / 5))
+        self.chat_limiter = KeyedRateLimiter(rate=per_chat_rate, capacity=1)
+        # chat_id -> deque of waiting _Items
+        self._chats = {}
+        # chats whose first item is being sent right now
+        self._busy = set()
+        # (not_before, seq, chat_id) for chats with waiting items and nothing
+        # in flight; seq keeps FIFO order between chats
+        self._ready = []
+        self._seq = itertools.count()
+        self._depth = 0
+        self._cond = threading.Condition()
+        self._halt = False
+        self._threads = []
+        OUTBOX_DEPTH.set_function(self.depth)
+
+    def send(self, chat_id, text, **kwargs):
+        """Queue a text message; returns immediately."""
+        self.submit("send_message", chat_id, text, **kwargs)
+
+    def submit(self, method, chat_id, *args, on_done=None, on_sent=None, **kwargs):
+        """
+        Queue any bot.<method>(chat_id, *args, **kwargs) call; returns
+        immediately. on_done() is called once the message has been sent, or
+        given up on. on_sent(seconds) is called before it if the message was
+        sent, with the time the Telegram call took.
+        """
+        item = _Item(method, args, kwargs, on_done, on_sent)
+        with self._cond:
+            queue = self._chats.get(chat_id)
+            if queue is None:
+                queue = self._chats[chat_id] = deque()
+                self._schedule(chat_id, 0.0)
+            # the item in flight can't take more text
+            mergeable = len(queue) > (chat_id in self._busy)
+            if mergeable and queue[-1].merge(item):
+                OUTBOX_COALESCED.inc()
+                return
+            queue.append(item)
+            self._depth += 1
+            self._cond.notify()
+
+    def _schedule(self, chat_id, not_before):
+        heapq.heappush(self._ready, (not_before, next(self._seq), chat_id))
+
+    def depth(self):
+        return self._depth
+
+    def start(self):
+        configure_http_session(self.senders)
+        for n in range(self.senders):
+            thread = threading.Thread(target=self._run, name=f"outbox-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        with self._cond:
+            self._halt = True
+            self._cond.notify_all()
+
+    def drain(self, timeout):
+        """Wait up to `timeout` seconds for every queued message to be done with. Returns True if it was."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._chats:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(min(remaining, 0.1))
+        return True
+
+    def _next(self):
+        # (chat_id, item) of the first chat allowed to send, or None on stop
+        with self._cond:
+            while True:
+                while not self._halt:
+                    if self._ready:
+                        wait = self._ready[0][0] - time.monotonic()
+                        if wait <= 0:
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+                if self._halt:
+                    return None
+                _, _, chat_id = heapq.heappop(self._ready)
+                wait = self.chat_limiter.try_acquire(chat_id)
+                if wait:
+                    # this chat was just messaged; others go first meanwhile
+                    self._schedule(chat_id, time.monotonic() + wait)
+                    continue
+                # the chat is out of the heap until this item is done
+                self._busy.add(chat_id)
+                return chat_id, self._chats[chat_id][0]
+
+    def _run(self):
+        while True:
+            job = self._next()
+            if job is None:
+                return
+            chat_id, item = job
+            self.limiter.acquire()
+            hold = self._deliver(chat_id, item)
+            if hold is None:
+                # before the item leaves the queue, so drain() waits for them
+                timers = item.timers if item.seconds is not None else []
+                calls = [(timer, (item.seconds,)) for timer in timers] + [(cb, ()) for cb in item.callbacks]
+                for callback, args in calls:
+                    try:
+                        callback(*args)
+                    except Exception:
+                        logger.exception(f"Outbox: callback for {chat_id} failed")
+            with self._cond:
+                self._busy.discard(chat_id)
+                queue = self._chats[chat_id]
+                if hold is None:
+                    queue.popleft()
+                    self._depth -= 1
+                if queue:
+                    self._schedule(chat_id, time.monotonic() + (hold or 0.0))
+                    self._cond.notify()
+                else:
+                    del self._chats[chat_id]
+
+    def _deliver(self, chat_id, item):
+        # None when the item is done with, else seconds to hold the chat
+        # before trying it again
+        item.attempts += 1
+        try:
+            started = time.perf_counter()
+            with OUTBOX_SEND_SECONDS.time(method=item.method):
+                getattr(self.bot, item.method)(chat_id, *item.args, **item.kwargs)
+            item.seconds = time.perf_counter() - started
+            OUTBOX_SENT.inc(result="sent")
+            return None
+        except Exception as e:
+            wait = retry_after(e)
+            if wait is not None:
+                OUTBOX_SENT.inc(result="retried")
+                logger.warning(f"Outbox: Telegram asked to wait {wait:.0f}s before messaging {chat_id}")
+                return wait
+            transient = isinstance(e, (requests.ConnectionError, requests.Timeout)) or \
+                (getattr(e, "error_code", None) or 0) >= 500
+            if transient and item.attempts < MAX_ATTEMPTS:
+                OUTBOX_SENT.inc(result="retried")
+                return 2.0 ** item.attempts
+            OUTBOX_SENT.inc(result="failed")
+            logger.error(f"Outbox: could not {item.method} to {chat_id}: {e}")
+            return None
+
+class OutboundBot:
+    """
+    Stands in for the TeleBot given to register_handlers: send_message,
+    send_photo and send_document are queued on the outbox, everything else
+    (handler registration, answering callback and inline queries) goes to
+    the bot directly. File arguments are read into memory when queued, since
+    the handler may close or delete them once it returns. A queued call may
+    pass on_done and on_sent, see Outbox.submit.
+    """
+    QUEUED = ("send_message", "send_photo", "send_document")
+
+    def __init__(self, bot, outbox):
+        self._bot = bot
+        self._outbox = outbox
+
+    def __getattr__(self, name):
+        if name not in self.QUEUED:
+            return getattr(self._bot, name)
+
+        def queued(chat_id, *args, **kwargs):
+            args = tuple(a.read() if hasattr(a, "read") else a for a in args)
+            self._outbox.submit(name, chat_id, *args, **kwargs)
+        return queued
@@ -0,0 +1,263 @@
+# plan_tracker.py
+#
+# Plans users follow with /track, e.g. "$50 weekly into BTCUSDT since
+# 2023-01-01". Each plan keeps its running state (invested, coins, purchases,
+# next scheduled point), and every tick only applies the purchases whose
+# candles closed since the last one, instead of recomputing the plan.
+#
+# Plans are kept in columns per (symbol, 1h/1d schedule), so all plans on a
+# pair are advanced in one vectorized batch from a single price fetch. Updates
+# go out through the rate-governed outbox.
+
+import os
+import json
+import logging
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from binance_api import get_closing_prices, fetch_current_price, interval_ms, to_ms
+from localization import MessageId, trf
+from metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+TRACKED_PLANS_FILE = os.getenv("TRACKED_PLANS_FILE", "tracked_plans.json")
+TRACK_EVERY_SECONDS = int(os.getenv("TRACK_EVERY_SECONDS", "300"))
+MAX_PLANS_PER_CHAT = int(os.getenv("MAX_PLANS_PER_CHAT", "10"))
+# Binance usually publishes a closed candle within seconds; give it a minute
+# before a missing price is taken to mean "no trading at that point".
+SETTLE_MS = 60_000
+
+COLUMNS = {
+    "plan_id": np.int64,
+    "chat_id": np.int64,
+    "amount": np.float64,      # invested per purchase
+    "step_ms": np.int64,
+    "fee_percent": np.float64,
+    "start_ms": np.int64,      # first scheduled point
+    "next_ms": np.int64,       # next point not yet applied
+    "invested": np.float64,
+    "coins": np.float64,
+    "purchases": np.int64,
+    "lang": "U2",
+}
+
+TRACKED_PLANS = Gauge("tracked_plans", "Plans followed with /track.")
+TRACK_TICKS = Counter("plan_tracker_ticks_total", "Completed plan tracker ticks.")
+TRACK_PURCHASES = Counter("plan_tracker_purchases_total", "Scheduled purchases applied to tracked plans.")
+
+def _empty_group():
+    return {name: np.empty(0, dtype) for name, dtype in COLUMNS.items()}
+
+class PlanTracker(threading.Thread):
+    def __init__(self, path=TRACKED_PLANS_FILE, every_seconds=TRACK_EVERY_SECONDS):
+        super().__init__(name="plan-tracker", daemon=True)
+        self.path = path
+        self.every_seconds = every_seconds
+        self.outbox = None
+        # (symbol, base_interval) -> {column: array}
+        self._groups = {}
+        self._next_id = 1
+        self._lock = threading.RLock()
+        self._wake = threading.Event()
+        self._halt = threading.Event()
+        self._load()
+        TRACKED_PLANS.set_function(lambda: sum(len(g["plan_id"]) for g in self._groups.values()))
+
+    # ---- persistence ----
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            doc = json.load(f)
+        for group in doc["groups"]:
+            self._groups[(group["symbol"], group["interval"])] = {
+                name: np.array(group["columns"][name], dtype=dtype) for name, dtype in COLUMNS.items()
+            }
+        self._next_id = doc["next_id"]
+
+    def _save(self):
+        doc = {
+            "next_id": self._next_id,
+            "groups": [
+                {"symbol": symbol, "interval": interval,
+                 "columns": {name: values.tolist() for name, values in columns.items()}}
+                for (symbol, interval), columns in self._groups.items()
+                if len(columns["plan_id"])
+            ],
+        }
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(doc, f, separators=(",", ":"))
+        os.replace(self.path + ".tmp", self.path)
+
+    # ---- plans ----
+    def add(self, chat_id, symbol, amount, freq_value, is_hourly, start_dt, fee_percent=0.0, lang="en"):
+        """
+        Follow a plan buying `amount` every freq_value hours/days from start_dt
+        (aligned to the hour/day, like calculate_dca). Returns the plan id.
+        Past purchases are applied on the next tick, which is triggered now.
+        """
+        base_interval = "1h" if is_hourly else "1d"
+        base_ms = interval_ms(base_interval)
+        # first whole hour/day at or after start_dt
+        start_ms = -(-to_ms(start_dt) // base_ms) * base_ms
+        with self._lock:
+            if len(self.plans(chat_id)) >= MAX_PLANS_PER_CHAT:
+                raise ValueError(f"You can follow at most {MAX_PLANS_PER_CHAT} plans.")
+            plan_id = self._next_id
+            self._next_id += 1
+            row = {
+                "plan_id": plan_id, "chat_id": chat_id, "amount": amount,
+                "step_ms": freq_value * base_ms, "fee_percent": fee_percent,
+                "start_ms": start_ms, "next_ms": start_ms,
+                "invested": 0.0, "coins": 0.0, "purchases": 0, "lang": lang,
+            }
+            group = self._groups.setdefault((symbol, base_interval), _empty_group())
+            for name, dtype in COLUMNS.items():
+                group[name] = np.append(group[name], np.array([row[name]], dtype=dtype))
+            self._save()
+        self._wake.set()
+        return plan_id
+
+    def remove(self, chat_id, plan_id):
+        """Stop following a plan. Returns False if the chat has no such plan."""
+        with self._lock:
+            for group in self._groups.values():
+                keep = ~((group["plan_id"] == plan_id) & (group["chat_id"] == chat_id))
+                if not keep.all():
+                    for name in COLUMNS:
+                        group[name] = group[name][keep]
+                    self._save()
+                    return True
+        return False
+
+    def plans(self, chat_id):
+        """The chat's plans as dicts (plus symbol, interval), oldest first."""
+        rows = []
+        with self._lock:
+            for (symbol, interval), group in self._groups.items():
+                for i in np.flatnonzero(group["chat_id"] == chat_id):
+                    row = {name: group[name][i].item() for name in COLUMNS}
+                    row.update(symbol=symbol, interval=interval)
+                    rows.append(row)
+        return sorted(rows, key=lambda r: r["plan_id"])
+
+    # ---- ticks ----
+    def run(self):
+        while not self._halt.is_set():
+            try:
+                self.tick()
+            except Exception:
+                logger.exception("Plan tracker tick failed")
+            self._wake.wait(self.every_seconds)
+            self._wake.clear()
+
+    def stop(self):
+        self._halt.set()
+        self._wake.set()
+
+    def tick(self, now_ms=None):
+        """Apply every purchase that became due. Returns the number applied."""
+        now_ms = now_ms or to_ms(datetime.utcnow())
+        applied = 0
+        with self._lock:
+            keys = list(self._groups)
+        for symbol, interval in keys:
+            try:
+                applied += self._advance(symbol, interval, now_ms)
+            except Exception:
+                logger.exception(f"Could not update tracked {symbol} {interval} plans")
+        TRACK_TICKS.inc()
+        return applied
+
+    def _advance(self, symbol, interval, now_ms):
+        base_ms = interval_ms(interval)
+        with self._lock:
+            group = self._groups.get((symbol, interval))
+            if group is None or not len(group["plan_id"]):
+                return 0
+            next_ms, step_ms = group["next_ms"], group["step_ms"]
+            # points whose candle has closed (and settled) are due
+            due_until = now_ms - base_ms - SETTLE_MS
+            counts = np.where(next_ms <= due_until, (due_until - next_ms) // step_ms + 1, 0)
+            if not counts.any():
+                return 0
+            first = int(next_ms[counts > 0].min())
+            snapshot = {name: values.copy() for name, values in group.items()}
+
+        # one fetch for every plan on the pair; prices by candle open time
+        prices = get_closing_prices(
+            symbol, datetime.utcfromtimestamp(first / 1000),
+            datetime.utcfromtimestamp(due_until / 1000), interval
+        )
+        # a failed fetch comes back empty or cut short: only points up to the
+        # last candle returned are applied, the rest are retried next tick
+        if not len(prices):
+            logger.warning(f"No {symbol} {interval} prices for tracked plans, retrying next tick")
+            return 0
+        last_ms = int(prices.open_times[-1])
+
+        # flatten all due points of all plans: plan index and point time
+        n = len(counts)
+        plan_idx = np.repeat(np.arange(n), counts)
+        nth = np.arange(len(plan_idx)) - np.repeat(np.cumsum(counts) - counts, counts)
+        points = snapshot["next_ms"][plan_idx] + nth * snapshot["step_ms"][plan_idx]
+        covered = points <= last_ms
+        counts = np.bincount(plan_idx, covered, minlength=n).astype(np.int64)
+        found, closes = prices.lookup(points)
+        found &= covered
+
+        amounts = np.where(found, snapshot["amount"][plan_idx], 0.0)
+        net = amounts * (1 - snapshot["fee_percent"][plan_idx] / 100.0)
+        coins = np.divide(net, closes, out=np.zeros_like(net), where=found)
+        new_coins = np.bincount(plan_idx, coins, minlength=n)
+        new_invested = np.bincount(plan_idx, amounts, minlength=n)
+        new_purchases = np.bincount(plan_idx, found, minlength=n).astype(np.int64)
+
+        with self._lock:
+            group = self._groups.get((symbol, interval))
+            # plans removed/added meanwhile: apply to the ones still there
+            rows = np.flatnonzero(np.isin(group["plan_id"], snapshot["plan_id"]))
+            src = np.searchsorted(snapshot["plan_id"], group["plan_id"][rows])
+            group["coins"][rows] += new_coins[src]
+            group["invested"][rows] += new_invested[src]
+            group["purchases"][rows] += new_purchases[src]
+            group["next_ms"][rows] += counts[src] * snapshot["step_ms"][src]
+            notify = rows[new_purchases[src] > 0]
+            updates = {name: group[name][notify].copy() for name in COLUMNS}
+            self._save()
+
+        TRACK_PURCHASES.inc(int(new_purchases.sum()))
+        self._notify(symbol, updates)
+        return int(new_purchases.sum())
+
+    def _notify(self, symbol, updates):
+        if self.outbox is None or not len(updates["plan_id"]):
+            return
+        price = fetch_current_price(symbol)
+        values = updates["coins"] * price
+        rois = np.divide(values, updates["invested"], out=np.ones_like(values), where=updates["invested"] > 0)
+        rois = (rois - 1) * 100
+        for i in range(len(updates["plan_id"])):
+            self.outbox.send(
+                int(updates["chat_id"][i]),
+                trf(
+                    MessageId.TRACK_UPDATE, str(updates["lang"][i]),
+                    plan_id=int(updates["plan_id"][i]), symbol=symbol,
+                    purchases=int(updates["purchases"][i]), invested=float(updates["invested"][i]),
+                    coins=float(updates["coins"][i]), value=float(values[i]),
+                    roi=float(rois[i]), price=price
+                ),
+                parse_mode="Markdown"
+            )
+
+# The bot runs a single tracker; plans can be added before it starts.
+TRACKER = PlanTracker()
+
+def start_plan_tracker(outbox):
+    TRACKER.outbox = outbox
+    if not TRACKER.is_alive():
+        TRACKER.start()
+    return TRACKER
@@ -0,0 +1,335 @@
+# price_store.py
+#
+# Local on-disk price history, so deep history doesn't have to be paged out of
+# api/v3/klines 1000 rows at a time. Each (symbol, interval) series is stored
+# as fixed-width binary columns sorted by open time:
+#
+#   <root>/<SYMBOL>/<interval>.meta            {"rows": n, "generation": g, "columns": [...]}
+#   <root>/<SYMBOL>/<interval>[.<g>].open_time int64, ms since epoch
+#   <root>/<SYMBOL>/<interval>[.<g>].close     float64
+#   ... and optionally .open/.high/.low/.volume (float64)
+#
+# Readers map the columns with np.memmap, so every worker process shares the
+# same pages of the OS cache instead of holding its own copy.
+#
+# Only the first `rows` values of each column are valid. Appends write the
+# column data first and then atomically replace the .meta file, so a reader
+# (or a crash) never sees half an append. Out-of-order merges write a new
+# generation of column files and switch to it the same way.
+#
+# Filled by binance_api (closed candles it downloads) and import_archives.py
+# (Binance public data dumps).
+
+import os
+import json
+import logging
+import threading
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process locking
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+PRICE_STORE_DIR = os.getenv("PRICE_STORE_DIR", "price_data")
+
+COLUMN_DTYPES = {
+    "open_time": np.int64,
+    "open": np.float64,
+    "high": np.float64,
+    "low": np.float64,
+    "close": np.float64,
+    "volume": np.float64,
+}
+REQUIRED_COLUMNS = ("open_time", "close")
+OHLCV_COLUMNS = ("open_time", "open", "high", "low", "close", "volume")
+
+# Aggregates kept up to date by refresh_pyramid(), each derived from the one
+# before it, starting at the finest interval actually stored.
+PYRAMID = ("1h", "4h", "1d", "1w")
+# Finer intervals (archives, sub-hour plans) the pyramid can be built from;
+# each divides every PYRAMID level.
+PYRAMID_SOURCES = ("1m", "3m", "5m", "15m", "30m") + PYRAMID
+
+def aggregate(columns, source_ms, target_ms, target_offset=0):
+    """
+    Roll candles of length source_ms ({column: array}) up into target_ms
+    candles: first open, max high, min low, last close, summed volume.
+    Only target candles with every source candle present are emitted, so an
+    incomplete bucket at the end is left for the next refresh and one with a
+    hole isn't passed off as whole.
+    """
+    open_times = columns["open_time"]
+    if not len(open_times):
+        return {name: np.empty(0, COLUMN_DTYPES[name]) for name in columns}
+    bucket = (open_times - target_offset) // target_ms * target_ms + target_offset
+    starts = np.flatnonzero(np.append(True, bucket[1:] != bucket[:-1]))
+    ends = np.append(starts[1:], len(open_times)) - 1
+    complete = (
+        (open_times[ends] + source_ms == bucket[ends] + target_ms)
+        & (ends - starts + 1 == target_ms // source_ms)
+    )
+
+    out = {"open_time": bucket[ends]}
+    for name, values in columns.items():
+        if name == "open":
+            out[name] = values[starts]
+        elif name == "high":
+            out[name] = np.maximum.reduceat(values, starts)
+        elif name == "low":
+            out[name] = np.minimum.reduceat(values, starts)
+        elif name == "volume":
+            out[name] = np.add.reduceat(values, starts)
+        elif name == "close":
+            out[name] = values[ends]
+    return {name: values[complete] for name, values in out.items()}
+
+def holes(open_times, step_ms):
+    """[(start_ms, end_ms)] of the ranges between consecutive open times that lack candles."""
+    gaps = np.flatnonzero(np.diff(open_times) != step_ms)
+    return [(int(open_times[i]) + step_ms, int(open_times[i + 1]) - 1) for i in gaps]
+
+def _fsync_dir(path):
+    # makes created, renamed and removed entries durable; not possible on Windows
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class PriceStore:
+    def __init__(self, root=PRICE_STORE_DIR):
+        self.root = root
+        self._lock = threading.RLock()
+        # (symbol, interval) -> ((generation, rows), {column: np.memmap}); an
+        # entry is replaced when .meta changes, so maps of superseded files
+        # live only as long as the arrays handed out from them
+        self._maps = {}
+
+    # ---- layout ----
+    def _base(self, symbol, interval):
+        return os.path.join(self.root, symbol, interval)
+
+    def _column_path(self, symbol, interval, generation, column):
+        base = self._base(symbol, interval)
+        return f"{base}.{column}" if generation == 0 else f"{base}.{generation}.{column}"
+
+    def _read_meta(self, symbol, interval):
+        base = self._base(symbol, interval)
+        try:
+            with open(base + ".meta") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            pass
+        # series written before .meta files existed: plain open_time/close columns
+        if not os.path.exists(base + ".open_time"):
+            return None
+        rows = min(os.path.getsize(base + ".open_time"), os.path.getsize(base + ".close")) // 8
+        return {"rows": rows, "generation": 0, "columns": list(REQUIRED_COLUMNS)}
+
+    def _write_meta(self, symbol, interval, meta):
+        path = self._base(symbol, interval) + ".meta"
+        with open(path + ".tmp", "w") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        _fsync_dir(os.path.dirname(path))
+
+    # ---- reading ----
+    def _map(self, symbol, interval, meta, name):
+        version = (meta["generation"], meta["rows"])
+        cached = self._maps.get((symbol, interval))
+        if cached is None or cached[0] != version:
+            cached = self._maps[(symbol, interval)] = (version, {})
+        maps = cached[1]
+        if name not in maps:
+            if meta["rows"] == 0:
+                maps[name] = np.empty(0, COLUMN_DTYPES[name])
+            else:
+                maps[name] = np.memmap(
+                    self._column_path(symbol, interval, meta["generation"], name),
+                    dtype=COLUMN_DTYPES[name], mode="r", shape=(meta["rows"],)
+                )
+        return maps[name]
+
+    def columns(self, symbol, interval, names=REQUIRED_COLUMNS):
+        """
+        {column: read-only memory-mapped array} for the committed rows, or None
+        if nothing is stored. Columns the series doesn't have are omitted.
+        """
+        with self._lock:
+            meta = self._read_meta(symbol, interval)
+            if meta is None:
+                return None
+            return {
+                name: self._map(symbol, interval, meta, name)
+                for name in names if name in meta["columns"]
+            }
+
+    def load(self, symbol, interval):
+        """Return (open_times, closes) memory-mapped arrays, or None if nothing is stored."""
+        cols = self.columns(symbol, interval)
+        if cols is None:
+            return None
+        return cols["open_time"], cols["close"]
+
+    def coverage(self, symbol, interval):
+        """(first_open_time, last_open_time) of the stored series, or None."""
+        cols = self.columns(symbol, interval, ("open_time",))
+        if cols is None or not len(cols["open_time"]):
+            return None
+        return int(cols["open_time"][0]), int(cols["open_time"][-1])
+
+    def range(self, symbol, interval, start_ms, end_ms, names=REQUIRED_COLUMNS):
+        """
+        Rows with start_ms <= open_time <= end_ms as {column: array}. The
+        arrays are views into the memory map; nothing is copied.
+        """
+        cols = self.columns(symbol, interval, names)
+        if cols is None:
+            return {name: np.empty(0, COLUMN_DTYPES[name]) for name in REQUIRED_COLUMNS if name in names}
+        open_times = cols["open_time"]
+        lo = np.searchsorted(open_times, start_ms, side="left")
+        hi = np.searchsorted(open_times, end_ms, side="right")
+        return {name: values[lo:hi] for name, values in cols.items()}
+
+    def symbols(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root)
+            if os.path.isdir(os.path.join(self.root, name))
+        )
+
+    # ---- writing ----
+    def _file_lock(self, symbol):
+        # serializes writers across processes; readers never take it
+        lock = open(os.path.join(self.root, symbol, ".lock"), "a")
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    def merge(self, symbol, interval, open_times, closes, **extra):
+        """
+        Add rows to the series. `extra` may hold open/high/low/volume arrays.
+        Rows newer than everything stored are appended; anything else triggers
+        a sorted, de-duplicated rewrite (new rows win).
+        Returns the number of rows added.
+        """
+        new = {"open_time": np.asarray(open_times, dtype=np.int64),
+               "close": np.asarray(closes, dtype=np.float64)}
+        for name, values in extra.items():
+            if values is not None:
+                new[name] = np.asarray(values, dtype=COLUMN_DTYPES[name])
+        if not len(new["open_time"]):
+            return 0
+        if np.any(np.diff(new["open_time"]) <= 0):
+            order = np.argsort(new["open_time"], kind="stable")
+            new = {name: values[order] for name, values in new.items()}
+            keep = np.append(new["open_time"][1:] != new["open_time"][:-1], True)  # last duplicate wins
+            new = {name: values[keep] for name, values in new.items()}
+
+        with self._lock:
+            os.makedirs(os.path.join(self.root, symbol), exist_ok=True)
+            lock = self._file_lock(symbol)
+            try:
+                meta = self._read_meta(symbol, interval)
+                if meta is None:
+                    meta = {"rows": 0, "generation": 0, "columns": [c for c in OHLCV_COLUMNS if c in new]}
+                rows = len(new["open_time"])
+                # the series' column set is fixed; missing values are NaN
+                new = {
+                    name: new.get(name, np.full(rows, np.nan))
+                    for name in meta["columns"]
+                }
+                cov = self.coverage(symbol, interval) if meta["rows"] else None
+                if cov is None or new["open_time"][0] > cov[1]:
+                    self._append(symbol, interval, meta, new)
+                    return rows
+                return self._rewrite(symbol, interval, meta, new)
+            finally:
+                lock.close()
+
+    def _append(self, symbol, interval, meta, new):
+        committed = meta["rows"] * 8
+        for name in meta["columns"]:
+            path = self._column_path(symbol, interval, meta["generation"], name)
+            with open(path, "ab") as f:
+                # drop whatever an interrupted append left past the committed rows
+                f.truncate(committed)
+                new[name].tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+        meta = dict(meta, rows=meta["rows"] + len(new["open_time"]))
+        self._write_meta(symbol, interval, meta)
+
+    def _rewrite(self, symbol, interval, meta, new):
+        old = self.columns(symbol, interval, meta["columns"])
+        merged_times = np.concatenate([new["open_time"], old["open_time"]])
+        # np.unique keeps the first occurrence, i.e. the new row
+        merged_times, idx = np.unique(merged_times, return_index=True)
+
+        generation = meta["generation"] + 1
+        for name in meta["columns"]:
+            values = np.concatenate([new[name], old[name]])[idx]
+            with open(self._column_path(symbol, interval, generation, name), "wb") as f:
+                values.tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+        # the new files (and their directory entries) must be on disk before
+        # .meta points at them, and .meta before the old generation goes
+        _fsync_dir(os.path.join(self.root, symbol))
+        old_generation = meta["generation"]
+        meta = dict(meta, rows=len(merged_times), generation=generation)
+        self._write_meta(symbol, interval, meta)
+
+        # readers that still map the old files keep them alive until they're done
+        for name in meta["columns"]:
+            try:
+                os.remove(self._column_path(symbol, interval, old_generation, name))
+            except FileNotFoundError:
+                pass
+        return len(merged_times) - len(old["open_time"])
+
+    def refresh_pyramid(self, symbol):
+        """
+        Rebuild the coarser PYRAMID levels of a symbol from its finest stored
+        level, minute series included. Returns {interval: rows_added}.
+        """
+        from binance_api import INTERVAL_MS, INTERVAL_OFFSET_MS
+
+        added = {}
+        source = next((i for i in PYRAMID_SOURCES if self.coverage(symbol, i)), None)
+        if source is None:
+            return added
+        for target in PYRAMID:
+            if INTERVAL_MS[target] <= INTERVAL_MS[source]:
+                continue
+            cov = self.coverage(symbol, target)
+            # only the buckets before, after and between what's stored need
+            # deriving: source rows imported later may fill a hole
+            if cov:
+                ranges = [(0, cov[0] - 1)] \
+                    + holes(self.columns(symbol, target)["open_time"], INTERVAL_MS[target]) \
+                    + [(cov[1] + INTERVAL_MS[target], 2**62)]
+            else:
+                ranges = [(0, 2**62)]
+            added[target] = 0
+            for start, end in ranges:
+                agg = aggregate(
+                    self.range(symbol, source, start, end, OHLCV_COLUMNS),
+                    INTERVAL_MS[source], INTERVAL_MS[target], INTERVAL_OFFSET_MS.get(target, 0)
+                )
+                extra = {name: agg[name] for name in agg if name not in REQUIRED_COLUMNS}
+                added[target] += self.merge(symbol, target, agg["open_time"], agg["close"], **extra)
+            source = target
+        return added
+
+# Shared instance used by binance_api and the CLI tools.
+PRICE_STORE = PriceStore()
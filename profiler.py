@@ -0,0 +1,252 @@
+# profiler.py
+#
+# On-demand profiling of single calculations. An admin sends /profile 3 (or
+# the bot starts with PROFILE_CALCULATIONS=3), and the next three
+# calculations run under cProfile and tracemalloc. The time and memory of
+# each stage (parse, fetch, compute, render, enqueue, queued, send) are
+# recorded, and the result is written to PROFILE_DIR, a pstats dump plus a
+# text summary. The oldest files are removed past PROFILE_KEEP. The summary
+# also goes to the admin who asked.
+#
+# Code marks its stages with `with stage("fetch"):`. Unless the current
+# thread is being profiled, stage() returns a shared no-op context: a
+# couple of microseconds per stage, nothing else, while nothing is armed.
+#
+# The report is sent by the outbox's thread, so the handler's part of it is
+# only "enqueue". For a profiled run track_send() has the outbox time the
+# Telegram call ("send") and waits for it; the rest of the wait is "queued".
+
+import os
+import io
+import time
+import pstats
+import cProfile
+import logging
+import threading
+import tracemalloc
+import contextlib
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+PROFILE_CALCULATIONS = int(os.getenv("PROFILE_CALCULATIONS", "0"))
+# Chats allowed to use /profile
+ADMIN_CHAT_IDS = {int(c) for c in os.getenv("ADMIN_CHAT_IDS", "").replace(",", " ").split()}
+
+# stage order in summaries; anything else is listed after these
+STAGES = ("parse", "fetch", "compute", "render", "enqueue", "queued", "send")
+TOP_FUNCTIONS = 25
+# how long a profiled run waits for its report to leave the outbox
+SEND_WAIT_SECONDS = 60
+
+_NO_STAGE = contextlib.nullcontext()
+_NO_WAIT = lambda: None
+_END = object()
+
+class ProfileRun:
+    """Stage timings and allocations of one profiled calculation."""
+    def __init__(self, label, notify_chat=None):
+        self.label = label
+        self.notify_chat = notify_chat
+        self.stages = {}  # name -> [seconds, calls, peak bytes, net bytes]
+        self.seconds = 0.0
+        self.peak_bytes = 0
+        self.profile = cProfile.Profile()
+        self.path = None
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        # stages don't nest: each one resets tracemalloc's peak
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            current, peak = tracemalloc.get_traced_memory()
+            totals = self.stages.setdefault(name, [0.0, 0, 0, 0])
+            totals[0] += elapsed
+            totals[1] += 1
+            totals[2] = max(totals[2], peak - before)
+            totals[3] += current - before
+
+    def add(self, name, seconds):
+        """Count `seconds` timed elsewhere (another thread) as a call of stage `name`."""
+        totals = self.stages.setdefault(name, [0.0, 0, 0, 0])
+        totals[0] += seconds
+        totals[1] += 1
+
+    def summary(self):
+        mb = 1 / 2**20
+        lines = [
+            f"Profile {self.label}: {self.seconds:.2f}s, peak {self.peak_bytes * mb:.1f} MB traced",
+            f"{'stage':<10}{'seconds':>9}{'calls':>7}{'peak MB':>9}{'net MB':>8}",
+        ]
+        names = [s for s in STAGES if s in self.stages] + sorted(set(self.stages) - set(STAGES))
+        for name in names:
+            seconds, calls, peak, net = self.stages[name]
+            lines.append(f"{name:<10}{seconds:>9.3f}{calls:>7}{peak * mb:>9.1f}{net * mb:>8.1f}")
+        other = self.seconds - sum(totals[0] for totals in self.stages.values())
+        lines.append(f"{'other':<10}{other:>9.3f}")
+        if self.path:
+            lines.append(f"Saved to {self.path}.prof / .txt")
+        return "\n".join(lines)
+
+    def top_functions(self, limit=TOP_FUNCTIONS):
+        out = io.StringIO()
+        pstats.Stats(self.profile, stream=out).sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+class CalculationProfiler:
+    def __init__(self, directory=PROFILE_DIR, keep=PROFILE_KEEP, armed=PROFILE_CALCULATIONS):
+        self.directory = directory
+        self.keep = keep
+        # (calculations left, chat to notify) requests, oldest first
+        self._armed = [(armed, None)] if armed else []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # cProfile and tracemalloc are per process: one run at a time
+        self._running = threading.Lock()
+
+    def arm(self, count, notify_chat=None):
+        """Profile the next `count` calculations, sending summaries to notify_chat."""
+        with self._lock:
+            self._armed.append((count, notify_chat))
+
+    def remaining(self):
+        with self._lock:
+            return sum(count for count, _ in self._armed)
+
+    def claim(self):
+        """
+        Take one armed slot for a calculation about to be queued. Returns
+        (notify_chat,) if it should be profiled, else None.
+        """
+        if not self._armed:
+            return None
+        with self._lock:
+            if not self._armed:
+                return None
+            count, notify_chat = self._armed[0]
+            if count > 1:
+                self._armed[0] = (count - 1, notify_chat)
+            else:
+                self._armed.pop(0)
+            return (notify_chat,)
+
+    def stage(self, name):
+        run = getattr(self._local, "run", None)
+        return _NO_STAGE if run is None else run.stage(name)
+
+    def stage_iter(self, iterable, name):
+        """Yield from `iterable`, counting the time each item takes to produce as stage `name`."""
+        if getattr(self._local, "run", None) is None:
+            return iterable
+        return self._timed_iter(iter(iterable), name)
+
+    def _timed_iter(self, iterator, name):
+        while True:
+            with self.stage(name):
+                item = next(iterator, _END)
+            if item is _END:
+                return
+            yield item
+
+    def track_send(self, kwargs):
+        """
+        For a message queued on the outbox from a profiled thread: returns
+        (kwargs, wait), the send kwargs with on_sent/on_done added, and a
+        function that waits until the message is delivered. Otherwise the
+        kwargs are returned as they are, with a no-op wait.
+        """
+        run = getattr(self._local, "run", None)
+        if run is None:
+            return kwargs, _NO_WAIT
+        delivered = threading.Event()
+        sent = []
+        on_done = kwargs.get("on_done")
+
+        def done():
+            try:
+                if on_done is not None:
+                    on_done()
+            finally:
+                delivered.set()
+
+        def on_sent(seconds):
+            sent.append(seconds)
+            run.add("send", seconds)
+
+        def wait():
+            started = time.perf_counter()
+            if not delivered.wait(SEND_WAIT_SECONDS):
+                logger.warning(f"Profile {run.label}: report not sent after {SEND_WAIT_SECONDS}s")
+            run.add("queued", max(0.0, time.perf_counter() - started - sum(sent)))
+
+        return dict(kwargs, on_done=done, on_sent=on_sent), wait
+
+    @contextlib.contextmanager
+    def profile(self, label, notify_chat=None):
+        """
+        Profile the block on this thread; yields the ProfileRun, which is
+        saved when the block ends. If another run is in progress the block
+        runs unprofiled and None is yielded.
+        """
+        if not self._running.acquire(blocking=False):
+            yield None
+            return
+        run = ProfileRun(label, notify_chat)
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        self._local.run = run
+        started = time.perf_counter()
+        run.profile.enable()
+        try:
+            yield run
+        finally:
+            run.profile.disable()
+            run.seconds = time.perf_counter() - started
+            run.peak_bytes = max((totals[2] for totals in run.stages.values()), default=0)
+            self._local.run = None
+            if not tracing:
+                tracemalloc.stop()
+            self._running.release()
+            try:
+                self._save(run)
+            except OSError as e:
+                logger.error(f"Could not save profile {label}: {e}")
+
+    def _save(self, run):
+        os.makedirs(self.directory, exist_ok=True)
+        name = datetime.utcnow().strftime("%Y%m%d-%H%M%S-%f") + "_" + "".join(
+            c if c.isalnum() else "_" for c in run.label
+        )[:60]
+        run.path = os.path.join(self.directory, name)
+        run.profile.dump_stats(run.path + ".prof")
+        with open(run.path + ".txt", "w") as f:
+            f.write(run.summary() + "\n\n" + run.top_functions())
+        logger.info(f"Profiled {run.label} in {run.seconds:.2f}s, saved to {run.path}.prof")
+
+        # rotate: keep the newest `keep` runs
+        runs = sorted({os.path.splitext(n)[0] for n in os.listdir(self.directory)
+                       if n.endswith((".prof", ".txt"))})
+        for old in runs[:-self.keep]:
+            for ext in (".prof", ".txt"):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(os.path.join(self.directory, old + ext))
+
+PROFILER = CalculationProfiler()
+
+def stage(name):
+    """Mark a stage of a calculation for PROFILER; free when nothing is profiled."""
+    return PROFILER.stage(name)
+
+def stage_iter(iterable, name):
+    return PROFILER.stage_iter(iterable, name)
+
+def track_send(kwargs):
+    return PROFILER.track_send(kwargs)
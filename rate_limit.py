@@ -0,0 +1,171 @@
+# rate_limit.py
+
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """
+    Classic token bucket: holds up to `capacity` tokens and refills at `rate`
+    tokens per second. Thread-safe.
+    """
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """
+        Take `tokens` if they are available and return 0.
+        Otherwise take nothing and return the seconds to wait until they would be.
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1):
+        """Block until `tokens` could be taken."""
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return
+            time.sleep(wait)
+
+class KeyedRateLimiter:
+    """
+    One TokenBucket per key (e.g. chat ID), created on first use.
+    Only the `max_keys` most recently used buckets are kept; an evicted key
+    simply starts again with a full bucket.
+    """
+    def __init__(self, rate: float, capacity: float, max_keys: int = 10000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, key, tokens: float = 1) -> float:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.capacity)
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+        return bucket.try_acquire(tokens)
+
+class FairScheduler:
+    """
+    Runs submitted jobs on a small pool of worker threads, round-robin across
+    users: every user with pending work gets one job started before anyone
+    gets a second one, so a single busy chat cannot starve the others.
+    """
+    def __init__(self, workers: int = 2, name: str = "scheduler"):
+        self.workers = workers
+        self.name = name
+        self._queues = OrderedDict()  # user_id -> deque of (func, args)
+        self._cond = threading.Condition()
+        self._threads = []
+        self._running = 0
+        self._halt = False
+
+    def submit(self, user_id, func, *args) -> int:
+        """
+        Queue func(*args) for user_id.
+        Returns how many queued jobs will be started before this one.
+        """
+        with self._cond:
+            if not self._threads:
+                self._start_workers()
+
+            queue = self._queues.get(user_id)
+            if queue is None:
+                queue = self._queues[user_id] = deque()
+            queue.append((func, args))
+            ahead = self._jobs_ahead(user_id, len(queue))
+            self._cond.notify()
+        return ahead
+
+    def _jobs_ahead(self, user_id, rank):
+        # The job is its user's `rank`-th, so it starts in round `rank`. Users
+        # earlier in the rotation get `rank` turns before it, later ones rank-1.
+        ahead = rank - 1
+        before = True
+        for other, queue in self._queues.items():
+            if other == user_id:
+                before = False
+                continue
+            ahead += min(len(queue), rank if before else rank - 1)
+        return ahead
+
+    def depth(self) -> int:
+        """Number of jobs waiting to start."""
+        with self._cond:
+            return sum(len(q) for q in self._queues.values())
+
+    def _next_job(self):
+        user_id, queue = self._queues.popitem(last=False)
+        job = queue.popleft()
+        if queue:
+            # back of the line for this user's next job
+            self._queues[user_id] = queue
+        return job
+
+    def _start_workers(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def shutdown(self, timeout):
+        """
+        Start no more jobs, and wait up to `timeout` seconds for the running
+        ones to finish. Returns True if they did; jobs not started are dropped.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._halt = True
+            self._cond.notify_all()
+            while self._running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queues and not self._halt:
+                    self._cond.wait()
+                if self._halt:
+                    return
+                func, args = self._next_job()
+                self._running += 1
+            try:
+                func(*args)
+            except Exception:
+                logger.exception(f"{self.name}: job {func.__name__} failed")
+            finally:
+                with self._cond:
+                    self._running -= 1
+                    self._cond.notify_all()
@@ -0,0 +1,151 @@
+# restart_drill.py
+#
+# Restarts the bot in the middle of a burst of calculations and checks that
+# every chat still gets its report, exactly once (durable jobs, see
+# job_queue.py).
+#
+# Each instance is a child process running commands.register_handlers on
+# fake_bot.FakeBot behind the real outbox, against the Binance stub, with
+# one job database shared by both. The first instance receives a /dca from
+# every chat and is stopped part way through, with SIGTERM (the graceful
+# shutdown of bot.py) or, with --kill, SIGKILL. A second instance then
+# recovers the unfinished jobs and receives the same messages again, as
+# Telegram redelivers updates a stopped bot hadn't confirmed.
+#
+#   python restart_drill.py --chats 200 --stop-after 3 [--kill]
+#
+# Exits with status 1 if a chat got no report or more than one.
+
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+DCA_COMMAND = "/dca 1000 BTCUSDT 1y weekly"
+FIRST_CHAT = 100_001
+FIRST_MESSAGE_ID = 5_000_000
+
+def run_instance(chats, deliveries_path):
+    """One bot process: recover unfinished jobs, receive the burst, run until done or SIGTERM."""
+    import binance_api
+    from binance_stub import start_stub
+    from rate_limit import TokenBucket
+    from fake_bot import FakeBot
+    from outbox import Outbox, OutboundBot
+    from data_store import DataStore
+    from job_queue import JOBS, QUEUED, RUNNING
+    import commands
+    import bot as bot_main
+
+    stub = start_stub()
+    binance_api.BINANCE_API_URL = stub.url
+    binance_api.WEIGHT_LIMITER = TokenBucket(rate=1e9, capacity=1e9)
+
+    deliveries = open(deliveries_path, "a", buffering=1)
+    lock = threading.Lock()
+
+    class RecordingBot(FakeBot):
+        # every report, one line each, written through before it counts as delivered
+        def send_photo(self, chat_id, photo, caption=None, **kwargs):
+            with lock:
+                deliveries.write(f"{chat_id}\t{os.getpid()}\n")
+            return super().send_photo(chat_id, photo, caption, **kwargs)
+
+    fake = RecordingBot()
+    outbox = Outbox(fake, rate=1000, per_chat_rate=1000)
+    outbox.start()
+    outbound = OutboundBot(fake, outbox)
+    store = DataStore()
+    commands.register_handlers(outbound, store)
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    recovered = commands.recover_calculations(outbound, store)
+
+    print(json.dumps({"recovered": recovered}), flush=True)
+    # the first instance receives the burst, the second the same messages again
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        for n in range(chats):
+            pool.submit(fake.send_text, FIRST_CHAT + n, DCA_COMMAND, FIRST_MESSAGE_ID + n)
+
+    while not stop.is_set():
+        counts = JOBS.counts()
+        if not counts.get(QUEUED) and not counts.get(RUNNING) and outbox.depth() == 0:
+            break
+        stop.wait(0.1)
+    bot_main.shutdown(outbox)
+    stub.shutdown()
+
+def run_drill(chats, stop_after, kill, timeout):
+    workdir = tempfile.mkdtemp(prefix="dca-restart-")
+    env = dict(
+        os.environ,
+        CALC_JOBS_FILE=os.path.join(workdir, "calc_jobs.sqlite3"),
+        PRICE_STORE_DIR=os.path.join(workdir, "price_data"),
+        PYTHONPATH=os.path.dirname(os.path.abspath(__file__)),
+    )
+    deliveries_path = os.path.join(workdir, "deliveries.tsv")
+
+    def start(*flags):
+        return subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--instance", "--chats", str(chats),
+             "--deliveries", deliveries_path, *flags],
+            cwd=workdir, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+        )
+
+    began = time.perf_counter()
+    first = start()
+    time.sleep(stop_after)
+    first.send_signal(signal.SIGKILL if kill else signal.SIGTERM)
+    first.wait(timeout)
+    with open(deliveries_path) as f:
+        before = sum(1 for _ in f)
+
+    second = start()
+    out, _ = second.communicate(timeout=timeout)
+    recovered = json.loads(out.splitlines()[0])["recovered"] if out.strip() else None
+    elapsed = time.perf_counter() - began
+
+    with open(deliveries_path) as f:
+        per_chat = Counter(int(line.split("\t")[0]) for line in f if line.strip())
+    missing = sum(1 for n in range(chats) if per_chat[FIRST_CHAT + n] == 0)
+    duplicates = sum(count - 1 for count in per_chat.values() if count > 1)
+    return {
+        "ok": missing == 0 and duplicates == 0,
+        "stop": "SIGKILL" if kill else "SIGTERM",
+        "chats": chats,
+        "reports_before_restart": before,
+        "jobs_recovered": recovered,
+        "reports": sum(per_chat.values()),
+        "missing_reports": missing,
+        "duplicate_reports": duplicates,
+        "elapsed_s": round(elapsed, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Restart the bot mid-burst and check no report is lost or repeated.")
+    parser.add_argument("--chats", type=int, default=200, help="chats sending /dca at once")
+    parser.add_argument("--stop-after", type=float, default=3.0, help="seconds before the first instance is stopped")
+    parser.add_argument("--kill", action="store_true", help="stop it with SIGKILL instead of SIGTERM")
+    parser.add_argument("--timeout", type=float, default=300.0, help="max seconds per instance")
+    parser.add_argument("--instance", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--deliveries", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.instance:
+        run_instance(args.chats, args.deliveries)
+        return
+    report = run_drill(args.chats, args.stop_after, args.kill, args.timeout)
+    print(json.dumps(report, indent=2))
+    if not report["ok"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+# result_cache.py
+#
+# Memoized DCA results. Everything historical in a calculate_dca() result (the
+# schedule, purchase prices, coins, average cost) only depends on the pair, the
+# points the schedule buys at and the fee, and the amount just scales it. So
+# results are cached per normalized plan, and a repeated plan only has to be
+# revalued at the live price.
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from binance_api import fetch_current_price, interval_ms
+from dca_calculator import PurchaseHistory, plan_schedule, calculate_dca, reprice
+from metrics import Counter, Gauge
+
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "4096"))
+# Even fully historical results are recomputed after this long, in case the
+# price data they were built from was incomplete.
+RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", "86400"))
+
+RESULT_CACHE_REQUESTS = Counter(
+    "dca_result_cache_requests_total", "Lookups of memoized DCA results.", ["result"]
+)
+RESULT_CACHE_ENTRIES = Gauge("dca_result_cache_entries", "Memoized DCA results.")
+
+def plan_key(symbol, start_dt, end_dt, freq_value, is_hourly, fee_percent, execution="close", seed=0):
+    """
+    Plans that buy at the same points are the same plan, whatever time of day
+    they were asked for. Returns None if the schedule has no points at all.
+    """
+    base_interval, _, step, points = plan_schedule(start_dt, end_dt, freq_value, is_hourly)
+    if not len(points):
+        return None
+    return (
+        symbol, base_interval, int(points[0]), int(points[-1]), int(step.total_seconds()),
+        float(fee_percent), execution, seed if execution == "random" else 0
+    )
+
+class _Entry:
+    __slots__ = ("result", "open_until", "expires")
+
+    def __init__(self, result, open_until, expires):
+        self.result = result
+        self.open_until = open_until
+        self.expires = expires
+
+class ResultCache:
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, ttl_seconds=RESULT_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get(self, key):
+        now_ms = int(time.time() * 1000)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                RESULT_CACHE_REQUESTS.inc(result="miss")
+                return None
+            # once the last purchase's candle has closed its final price is
+            # only in the klines, so the result has to be recomputed
+            if now_ms >= entry.expires or (entry.open_until is not None and now_ms >= entry.open_until):
+                del self._entries[key]
+                RESULT_CACHE_REQUESTS.inc(result="expired")
+                return None
+            self._entries.move_to_end(key)
+        RESULT_CACHE_REQUESTS.inc(result="hit")
+        return entry
+
+    def put(self, key, dca_result):
+        history = dca_result["purchase_history"]
+        now_ms = int(time.time() * 1000)
+        # the candle of the last purchase may still be open, in which case its
+        # "close" is simply the live price until it closes
+        candle_end = int(history.times[-1]) + interval_ms("1h" if history.is_hourly else "1d")
+        open_until = candle_end if candle_end > now_ms else None
+        execution = dca_result.get("execution", "close")
+        if open_until is not None and execution != "close":
+            if execution != "open":
+                # the fill depends on the candle's high and low, which are
+                # still moving; not worth keeping for the rest of the candle
+                return
+            open_until = None  # an open price is final as soon as the candle opens
+        entry = _Entry(dca_result, open_until, now_ms + self.ttl_seconds * 1000)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def calculate(self, total_investment, symbol, start_dt, end_dt, freq_value, is_hourly, fee_percent=0.0,
+                  execution="close", seed=0):
+        """
+        Same as calculate_dca(), but a plan seen before is served from the
+        cache: scaled to total_investment and revalued at the live price.
+        """
+        key = plan_key(symbol, start_dt, end_dt, freq_value, is_hourly, fee_percent, execution, seed)
+        entry = self._get(key) if key is not None else None
+        if entry is None:
+            result = calculate_dca(
+                total_investment=total_investment,
+                symbol=symbol,
+                start_dt=start_dt,
+                end_dt=end_dt,
+                freq_value=freq_value,
+                is_hourly=is_hourly,
+                fee_percent=fee_percent,
+                execution=execution,
+                seed=seed
+            )
+            if key is not None:
+                self.put(key, result)
+            return result
+        return _revalue(entry, total_investment, start_dt, end_dt, fetch_current_price(symbol))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+def _revalue(entry, total_investment, start_dt, end_dt, current_price):
+    base = entry.result
+    factor = total_investment / base["total_investment"]
+    history = base["purchase_history"].scaled(factor)
+    total_coins = base["total_coins_purchased"] * factor
+    lump_sum_coins = base["lump_sum_coins"] * factor
+
+    if entry.open_until is not None:
+        # the last purchase was at the open candle's close, i.e. the price at
+        # the time; move it to the current one (same amount invested)
+        prices = history.prices.copy()
+        coins = history.coins
+        new_coins = coins[-1] * prices[-1] / current_price
+        total_coins += new_coins - coins[-1]
+        if len(coins) == 1:
+            lump_sum_coins = lump_sum_coins * prices[-1] / current_price
+        prices[-1] = current_price
+        coins[-1] = new_coins
+        history = PurchaseHistory(history.times, prices, coins, history.is_hourly)
+
+    result = dict(base)
+    result.update(
+        start_dt=start_dt,
+        end_dt=end_dt,
+        total_investment=total_investment,
+        purchase_history=history,
+        total_coins_purchased=total_coins,
+        avg_purchase_price=total_investment / total_coins,
+        lump_sum_coins=lump_sum_coins
+    )
+    return reprice(result, current_price)
+
+# One cache per process, shared by every chat and the cache warmer.
+RESULT_CACHE = ResultCache()
+RESULT_CACHE_ENTRIES.set_function(lambda: len(RESULT_CACHE))
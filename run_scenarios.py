@@ -0,0 +1,330 @@
+# run_scenarios.py
+#
+# Run many DCA scenarios from a file, without Telegram, e.g.
+#
+#   python run_scenarios.py scenarios.csv -o results.csv --workers 4 --offline
+#
+# Each scenario is one CSV row / JSON object:
+#
+#   id, symbol, amount, period | start [, end], frequency, fee, execution, seed
+#
+# ("period" is like "1 year" and ends at --as-of; "frequency" is like
+# "weekly" or "every 4 hours"; everything but symbol has a default.)
+#
+# Scenarios are grouped by pair and schedule resolution (1h/1d). Each group
+# loads its price series once, covering all of its scenarios, and evaluates
+# them with dca_on_prices. Groups are split into shards of at most
+# --shard-size scenarios and run on a process pool. Results are written as
+# each shard finishes.
+#
+# Online, the main process loads the groups' series one at a time (through
+# the kline cache, price store and the one Binance rate limiter) and ships
+# each shard the part of it that shard needs; at most 2 x --workers shards
+# are in flight, so only a few series are held at once. With --offline
+# nothing is downloaded: workers map the series straight from the local
+# price store, and the "current" price is the last stored close.
+
+import os
+import csv
+import sys
+import json
+import time
+import logging
+import argparse
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from datetime import datetime
+
+import numpy as np
+
+from binance_api import PriceSeries, get_closing_prices, fetch_current_price, to_ms
+from dca_calculator import (
+    dca_on_prices,
+    parse_investment_period,
+    parse_investment_frequency,
+    parse_minute_frequency,
+    EXECUTION_MODELS
+)
+from price_store import PriceStore, PRICE_STORE_DIR, OHLCV_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+SHARD_SIZE = 500
+DEFAULT_AMOUNT = 1000.0
+
+RESULT_COLUMNS = (
+    "id", "symbol", "start", "end", "freq_value", "is_hourly", "fee_percent",
+    "execution", "seed", "total_investment", "number_of_investments",
+    "total_coins_purchased", "avg_purchase_price", "current_price",
+    "current_portfolio_value", "roi_percent", "lump_sum_roi", "error",
+)
+
+# ---- input ----
+
+def read_scenarios(path):
+    """Raw scenario dicts from a CSV (with a header row), JSON list or JSON lines file."""
+    if path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            return list(csv.DictReader(f))
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+def _date(text):
+    return datetime.strptime(str(text).strip(), "%Y-%m-%d")
+
+def parse_scenario(raw, number, as_of):
+    """
+    Normalize one raw scenario into a plan dict, or raise ValueError. Missing
+    fields default to $1000 weekly over the year up to as_of, no fee, close
+    fills.
+    """
+    fields = {k.strip().lower(): v for k, v in raw.items() if v not in (None, "")}
+    symbol = str(fields.get("symbol", "")).replace("/", "").replace("-", "").upper()
+    if not symbol:
+        raise ValueError("missing symbol")
+
+    if "start" in fields:
+        start_dt = _date(fields["start"])
+        end_dt = _date(fields["end"]) if "end" in fields else as_of
+    else:
+        end_dt = as_of
+        start_dt = end_dt - parse_investment_period(str(fields.get("period", "1 year")))
+    if start_dt >= end_dt:
+        raise ValueError("start must be before end")
+
+    frequency = str(fields.get("frequency", "weekly"))
+    if parse_minute_frequency(frequency):
+        raise ValueError("sub-hour schedules aren't supported in batch runs")
+    freq_value, is_hourly = parse_investment_frequency(frequency)
+
+    execution = str(fields.get("execution", "close")).lower()
+    if execution not in EXECUTION_MODELS:
+        raise ValueError(f"unknown execution model {execution!r}")
+    return {
+        "id": str(fields.get("id", number)),
+        "symbol": symbol,
+        "amount": float(fields.get("amount", DEFAULT_AMOUNT)),
+        "start_dt": start_dt,
+        "end_dt": end_dt,
+        "freq_value": freq_value,
+        "is_hourly": is_hourly,
+        "fee_percent": float(str(fields.get("fee", 0)).rstrip("%")),
+        "execution": execution,
+        "seed": int(fields.get("seed", 0)),
+    }
+
+def group_plans(plans):
+    """{(symbol, "1h"/"1d"): plans}: plans that can share one price series."""
+    groups = defaultdict(list)
+    for plan in plans:
+        groups[(plan["symbol"], "1h" if plan["is_hourly"] else "1d")].append(plan)
+    return groups
+
+def make_shards(plans, shard_size=SHARD_SIZE):
+    """
+    Group plans by (symbol, 1h/1d) and cut each group into shards of at most
+    shard_size plans. Returns [(symbol, interval, plans)], largest first so
+    the pool isn't left waiting on a big shard at the end.
+    """
+    shards = [
+        (symbol, interval, group[lo:lo + shard_size])
+        for (symbol, interval), group in group_plans(plans).items()
+        for lo in range(0, len(group), shard_size)
+    ]
+    return sorted(shards, key=lambda shard: -len(shard[2]))
+
+# ---- evaluation (worker processes) ----
+
+def load_series(symbol, interval, start_dt, end_dt, store_root=None):
+    """
+    (PriceSeries, current price) for a shard. With a store_root the data
+    comes only from that price store; otherwise through get_closing_prices
+    and the live ticker.
+    """
+    if store_root is None:
+        return get_closing_prices(symbol, start_dt, end_dt, interval), fetch_current_price(symbol)
+    store = PriceStore(store_root)
+    prices = PriceSeries.from_columns(
+        interval, store.range(symbol, interval, to_ms(start_dt), to_ms(end_dt), OHLCV_COLUMNS)
+    )
+    latest = store.columns(symbol, interval)
+    if latest is None or not len(latest["close"]):
+        raise ValueError(f"no stored {interval} prices for {symbol}")
+    return prices, float(latest["close"][-1])
+
+def result_row(plan, dca_result=None, error=None):
+    row = {
+        "id": plan["id"], "symbol": plan["symbol"],
+        "start": plan["start_dt"].strftime("%Y-%m-%d %H:%M"),
+        "end": plan["end_dt"].strftime("%Y-%m-%d %H:%M"),
+        "freq_value": plan["freq_value"], "is_hourly": plan["is_hourly"],
+        "fee_percent": plan["fee_percent"], "execution": plan["execution"], "seed": plan["seed"],
+        "error": error or "",
+    }
+    if dca_result is not None:
+        row.update({name: dca_result[name] for name in RESULT_COLUMNS if name in dca_result})
+    return row
+
+def _span(plans):
+    return min(plan["start_dt"] for plan in plans), max(plan["end_dt"] for plan in plans)
+
+def run_shard(symbol, interval, plans, store_root=None, loaded=None):
+    """
+    Evaluate one shard's plans on `loaded` (prices, current price), as the
+    main process loads them online, or on a single load of its series from
+    the price store at store_root. Returns result rows in order.
+    """
+    try:
+        prices, current_price = loaded if loaded is not None else load_series(
+            symbol, interval, *_span(plans), store_root
+        )
+    except Exception as e:
+        return [result_row(plan, error=str(e)) for plan in plans]
+
+    rows = []
+    for plan in plans:
+        try:
+            dca_result = dca_on_prices(
+                prices, plan["amount"], symbol, plan["start_dt"], plan["end_dt"],
+                plan["freq_value"], plan["is_hourly"], plan["fee_percent"],
+                plan["execution"], plan["seed"], current_price=current_price
+            )
+            rows.append(result_row(plan, dca_result))
+        except ValueError as e:
+            rows.append(result_row(plan, error=str(e)))
+    return rows
+
+# ---- output ----
+
+class ResultWriter:
+    """Writes result rows as CSV or JSON lines, by the output file's extension."""
+    def __init__(self, fileobj, fmt):
+        self.fileobj = fileobj
+        self.fmt = fmt
+        if fmt == "csv":
+            self._csv = csv.DictWriter(fileobj, fieldnames=RESULT_COLUMNS, extrasaction="ignore")
+            self._csv.writeheader()
+
+    def write(self, rows):
+        if self.fmt == "csv":
+            self._csv.writerows(rows)
+        else:
+            self.fileobj.writelines(json.dumps(row) + "\n" for row in rows)
+        self.fileobj.flush()
+
+def _trim(prices, start_dt, end_dt):
+    # the rows of [start_dt, end_dt] as plain arrays: views into the price
+    # store's memory map don't pickle, and a shard needs no more than this
+    lo = np.searchsorted(prices.open_times, to_ms(start_dt), side="left")
+    hi = np.searchsorted(prices.open_times, to_ms(end_dt), side="right")
+    return PriceSeries(prices.interval, *(
+        None if values is None else np.array(values[lo:hi])
+        for values in (prices.open_times, prices.closes, prices.opens, prices.highs, prices.lows)
+    ))
+
+def _tasks(plans, shard_size, store_root):
+    """
+    Yield (symbol, interval, shard plans, loaded, error) per shard, largest
+    groups first. Online, each group's series is loaded here, in this
+    process and so through its rate limiter, once for all of its shards,
+    and released before the next group is loaded; `error` is set if that
+    failed.
+    """
+    groups = sorted(group_plans(plans).items(), key=lambda item: -len(item[1]))
+    for (symbol, interval), group in groups:
+        shards = [group[lo:lo + shard_size] for lo in range(0, len(group), shard_size)]
+        if store_root is not None:
+            for shard in shards:
+                yield symbol, interval, shard, None, None
+            continue
+        try:
+            prices, current_price = load_series(symbol, interval, *_span(group))
+        except Exception as e:
+            logger.warning(f"Could not load {symbol} {interval}: {e}")
+            for shard in shards:
+                yield symbol, interval, shard, None, str(e)
+            continue
+        for shard in shards:
+            yield symbol, interval, shard, (_trim(prices, *_span(shard)), current_price), None
+        del prices
+
+def run_scenarios(raw_scenarios, writer, workers=None, store_root=None,
+                  as_of=None, shard_size=SHARD_SIZE, progress=None):
+    """
+    Parse, shard and evaluate scenarios on a process pool, writing each
+    shard's rows as it completes. Scenarios that don't parse are written
+    first, with their error. Returns (scenarios written, errors).
+    """
+    as_of = as_of or datetime.utcnow()
+    plans, invalid = [], []
+    for number, raw in enumerate(raw_scenarios, 1):
+        try:
+            plans.append(parse_scenario(raw, number, as_of))
+        except (ValueError, TypeError) as e:
+            invalid.append({"id": str(raw.get("id", number)), "symbol": raw.get("symbol", ""), "error": str(e)})
+    writer.write(invalid)
+    written, errors = len(invalid), len(invalid)
+
+    total = len(make_shards(plans, shard_size))
+    done = 0
+
+    def record(rows, symbol, interval):
+        nonlocal written, errors, done
+        writer.write(rows)
+        written += len(rows)
+        errors += sum(1 for row in rows if row["error"])
+        done += 1
+        if progress:
+            progress(done, total, symbol, interval, written, len(raw_scenarios))
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        for symbol, interval, shard_plans, loaded, error in _tasks(plans, shard_size, store_root):
+            if error is not None:
+                record([result_row(plan, error=error) for plan in shard_plans], symbol, interval)
+                continue
+            while len(pending) >= 2 * workers:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record(future.result(), *pending.pop(future))
+            pending[pool.submit(run_shard, symbol, interval, shard_plans, store_root, loaded)] = (symbol, interval)
+            loaded = None
+        for future in as_completed(pending):
+            record(future.result(), *pending[future])
+    return written, errors
+
+def main():
+    parser = argparse.ArgumentParser(description="Run DCA scenarios from a CSV or JSON file.")
+    parser.add_argument("scenarios", help="scenario file (.csv, .json or .jsonl)")
+    parser.add_argument("-o", "--output", default="-", help="results file, .csv or .jsonl (default: CSV on stdout)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--offline", action="store_true", help="use only the local price store, never Binance")
+    parser.add_argument("--store", default=PRICE_STORE_DIR, help=f"price store directory for --offline (default {PRICE_STORE_DIR})")
+    parser.add_argument("--as-of", type=_date, default=None, help="YYYY-MM-DD that periods end at (default: now)")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE, help=f"scenarios per task (default {SHARD_SIZE})")
+    args = parser.parse_args()
+
+    raw_scenarios = read_scenarios(args.scenarios)
+
+    def progress(done, total, symbol, interval, written, scenarios):
+        print(f"[{done}/{total}] {symbol} {interval}: {written}/{scenarios} scenarios", file=sys.stderr)
+
+    started = time.perf_counter()
+    out = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    try:
+        writer = ResultWriter(out, "jsonl" if args.output.endswith(".jsonl") else "csv")
+        written, errors = run_scenarios(
+            raw_scenarios, writer, args.workers, args.store if args.offline else None,
+            args.as_of, args.shard_size, progress
+        )
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"Ran {written} scenarios ({errors} failed) in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
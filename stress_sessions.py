@@ -0,0 +1,153 @@
+# stress_sessions.py
+#
+# Hammers session handling from many threads at once and checks what the
+# per-chat session locks promise, in-process (fake_bot.FakeBot, Binance
+# stub):
+#
+#   - sessions: threads increment a field of shared sessions under
+#     DataStore.lock; no increment may be lost and each chat has exactly
+#     one session.
+#   - calculations: every chat sends the same /dca command from several
+#     threads at once; exactly one calculation may run per chat, the other
+#     messages are told it is still running.
+#
+#   python stress_sessions.py --chats 200 --threads 32 --burst 8
+#
+# Exits with status 1 if any check fails.
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import binance_api
+from binance_stub import start_stub
+from rate_limit import TokenBucket
+
+DCA_COMMAND = "/dca 1000 BTCUSDT 1y weekly"
+
+def stress_sessions(store, chats, threads, rounds):
+    """Increment fee_percent of every chat's session `rounds` times from each thread."""
+    start = threading.Barrier(threads)
+
+    def worker():
+        start.wait()
+        for _ in range(rounds):
+            for chat_id in range(1, chats + 1):
+                with store.lock(chat_id):
+                    store.get_session(chat_id).fee_percent += 1
+
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for future in [pool.submit(worker) for _ in range(threads)]:
+            future.result()
+    elapsed = time.perf_counter() - began
+
+    expected = threads * rounds
+    lost = sum(expected - int(store.get_session(c).fee_percent) for c in range(1, chats + 1))
+    return {
+        "increments": chats * expected,
+        "lost_updates": lost,
+        "sessions": len(store.user_sessions),
+        "expected_sessions": chats,
+        "elapsed_s": round(elapsed, 2),
+    }
+
+def stress_calculations(bot, chats, burst, timeout):
+    """
+    Send DCA_COMMAND `burst` times at once from every chat and count what
+    comes back. The calculation workers are kept busy until every message
+    has been handled, so all of them arrive while the chat's first
+    calculation is still pending.
+    """
+    import commands
+
+    chat_ids = range(100_001, 100_001 + chats)
+    start = threading.Barrier(burst * chats)
+    gate = threading.Event()
+    for worker in range(commands.calc_scheduler.workers):
+        commands.calc_scheduler.submit(-1 - worker, gate.wait)
+
+    def send(chat_id):
+        start.wait()
+        bot.send_text(chat_id, DCA_COMMAND)
+
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=burst * chats) as pool:
+        for future in [pool.submit(send, c) for c in chat_ids for _ in range(burst)]:
+            future.result()
+    gate.set()
+    for chat_id in chat_ids:
+        bot.wait_for(chat_id, ("photo",), 0, timeout)
+    # give a duplicate calculation, if any, the time to show up
+    time.sleep(1.0)
+    elapsed = time.perf_counter() - began
+
+    from localization import MessageId, tr
+    pending = tr(MessageId.CALCULATION_PENDING, "en")
+    photos = duplicates = missing = pending_replies = 0
+    for chat_id in chat_ids:
+        history = bot.sent.get(chat_id, [])
+        count = sum(1 for kind, _, _ in history if kind == "photo")
+        photos += count
+        duplicates += max(0, count - 1)
+        missing += count == 0
+        pending_replies += sum(1 for _, text, _ in history if text == pending)
+    return {
+        "messages": burst * chats,
+        "reports": photos,
+        "duplicate_calculations": duplicates,
+        "missing_reports": missing,
+        "still_running_replies": pending_replies,
+        "elapsed_s": round(elapsed, 2),
+    }
+
+def run_stress(chats, threads, rounds, burst, timeout):
+    from fake_bot import FakeBot
+    from data_store import DataStore
+    import commands
+
+    stub = start_stub()
+    binance_api.BINANCE_API_URL = stub.url
+    binance_api.WEIGHT_LIMITER = TokenBucket(rate=1e9, capacity=1e9)
+
+    cwd = os.getcwd()
+    os.chdir(tempfile.mkdtemp(prefix="dca-stress-"))
+    try:
+        sessions = stress_sessions(DataStore(), chats, threads, rounds)
+        bot = FakeBot()
+        commands.register_handlers(bot, DataStore())
+        calculations = stress_calculations(bot, chats, burst, timeout)
+    finally:
+        os.chdir(cwd)
+        stub.shutdown()
+
+    ok = (
+        sessions["lost_updates"] == 0
+        and sessions["sessions"] == sessions["expected_sessions"]
+        and calculations["duplicate_calculations"] == 0
+        and calculations["missing_reports"] == 0
+        and calculations["still_running_replies"] == chats * (burst - 1)
+    )
+    return {"ok": ok, "sessions": sessions, "calculations": calculations}
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrency stress test for per-chat session locking.")
+    parser.add_argument("--chats", type=int, default=100, help="number of chats")
+    parser.add_argument("--threads", type=int, default=32, help="threads updating sessions")
+    parser.add_argument("--rounds", type=int, default=50, help="increments per thread and chat")
+    parser.add_argument("--burst", type=int, default=8, help="identical /dca messages per chat, sent at once")
+    parser.add_argument("--timeout", type=float, default=120.0, help="max wait for a report (s)")
+    args = parser.parse_args()
+
+    report = run_stress(args.chats, args.threads, args.rounds, args.burst, args.timeout)
+    print(json.dumps(report, indent=2))
+    if not report["ok"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+# symbol_index.py
+#
+# Local index of Binance spot symbols (api/v3/exchangeInfo), so a pair is
+# validated, and typos corrected, the moment the user types it instead of
+# failing at calculation time.
+#
+# The index starts from SYMBOL_INDEX_FILE if an earlier refresh saved one, else
+# from the snapshot bundled with the bot (exchange_info_snapshot.json), and is
+# refreshed from Binance in the background once it is older than
+# SYMBOL_INDEX_REFRESH_SECONDS. Regenerate the bundled snapshot with
+#
+#   python symbol_index.py
+#
+# The bundled snapshot is only a fallback: it is refreshed right away, and
+# until a refresh has succeeded, pairs it doesn't know aren't rejected (see
+# ensure_current).
+
+import os
+import re
+import json
+import time
+import logging
+import difflib
+import threading
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "exchange_info_snapshot.json")
+SYMBOL_INDEX_FILE = os.getenv("SYMBOL_INDEX_FILE", "exchange_info.json")
+SYMBOL_INDEX_REFRESH_SECONDS = int(os.getenv("SYMBOL_INDEX_REFRESH_SECONDS", "86400"))
+# how long a symbol check waits for the first refresh after a fresh deploy
+SYMBOL_INDEX_WAIT_SECONDS = float(os.getenv("SYMBOL_INDEX_WAIT_SECONDS", "5"))
+# a failed refresh isn't retried on demand more often than this
+REFRESH_RETRY_SECONDS = 60
+EXCHANGE_INFO_WEIGHT = 20
+
+# Quote assets suggested first when the user only names a coin.
+PREFERRED_QUOTES = ("USDT", "FDUSD", "USDC", "BTC", "ETH", "BNB", "EUR", "TRY")
+
+# Names people type instead of tickers.
+COIN_ALIASES = {
+    "BITCOIN": "BTC", "ETHEREUM": "ETH", "ETHER": "ETH", "BINANCE": "BNB",
+    "RIPPLE": "XRP", "CARDANO": "ADA", "SOLANA": "SOL", "DOGECOIN": "DOGE",
+    "LITECOIN": "LTC", "POLKADOT": "DOT", "TRON": "TRX", "CHAINLINK": "LINK",
+    "AVALANCHE": "AVAX", "TONCOIN": "TON", "SHIBA": "SHIB", "STELLAR": "XLM",
+    "بیتکوین": "BTC", "بیت‌کوین": "BTC", "اتریوم": "ETH", "تتر": "USDT",
+    "دوج": "DOGE", "ریپل": "XRP", "کاردانو": "ADA", "سولانا": "SOL",
+}
+
+SymbolInfo = namedtuple("SymbolInfo", ["symbol", "base", "quote", "status"])
+
+def normalize_symbol(text: str) -> str:
+    """'btc/usdt', 'BTC-USDT', ' btc usdt ' -> 'BTCUSDT'."""
+    return re.sub(r"[^A-Z0-9]", "", text.upper())
+
+def _quote_rank(quote):
+    return PREFERRED_QUOTES.index(quote) if quote in PREFERRED_QUOTES else len(PREFERRED_QUOTES)
+
+class SymbolIndex:
+    def __init__(self, path=SYMBOL_INDEX_FILE, snapshot=SNAPSHOT_FILE,
+                 refresh_seconds=SYMBOL_INDEX_REFRESH_SECONDS):
+        self.path = path
+        self.snapshot = snapshot
+        self.refresh_seconds = refresh_seconds
+        # (symbols, by_base, sorted_symbols, updated); replaced as a whole
+        self._data = None
+        self._listed = {}  # symbol -> first candle open time (ms)
+        self._lock = threading.Lock()
+        self._refreshing = False
+        # set once the index holds a list downloaded from Binance, rather
+        # than only the bundled snapshot
+        self._current = threading.Event()
+        self._failed_at = None
+        self._attempt = threading.Event()  # set when the latest refresh ends
+
+    # ---- loading ----
+    def _ensure_loaded(self):
+        if self._data is None:
+            with self._lock:
+                if self._data is None:
+                    for path in (self.path, self.snapshot):
+                        if os.path.exists(path):
+                            with open(path) as f:
+                                self._load(json.load(f))
+                            if path == self.path:
+                                self._current.set()
+                            break
+                    else:
+                        self._load({"updated": 0, "symbols": []})
+        if time.time() - self._data[3] > self.refresh_seconds:
+            self._refresh_async()
+        return self._data
+
+    def _load(self, doc):
+        symbols = {}
+        for symbol, base, quote, status, listed_ms in doc["symbols"]:
+            symbols[symbol] = SymbolInfo(symbol, base, quote, status)
+            if listed_ms is not None:
+                self._listed.setdefault(symbol, listed_ms)
+        by_base = {}
+        for info in symbols.values():
+            by_base.setdefault(info.base, []).append(info.symbol)
+        for base_symbols in by_base.values():
+            base_symbols.sort(key=lambda s: (_quote_rank(symbols[s].quote), s))
+        self._data = (symbols, by_base, sorted(symbols), doc["updated"])
+
+    def _save(self):
+        symbols, _, sorted_symbols, updated = self._data
+        doc = {
+            "updated": updated,
+            "symbols": [
+                [s, symbols[s].base, symbols[s].quote, symbols[s].status, self._listed.get(s)]
+                for s in sorted_symbols
+            ],
+        }
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(doc, f, separators=(",", ":"))
+        os.replace(self.path + ".tmp", self.path)
+
+    # ---- refreshing ----
+    def refresh(self):
+        """Download exchangeInfo and replace the index. Raises on errors."""
+        from binance_api import _get_json, BINANCE_API_URL
+
+        data = _get_json(f"{BINANCE_API_URL}/api/v3/exchangeInfo", {}, EXCHANGE_INFO_WEIGHT, "exchange_info")
+        rows = [
+            [s["symbol"], s["baseAsset"], s["quoteAsset"], s["status"], self._listed.get(s["symbol"])]
+            for s in data["symbols"]
+            if s.get("isSpotTradingAllowed", True)
+        ]
+        if not rows:
+            raise ValueError("exchangeInfo returned no spot symbols")
+        with self._lock:
+            self._load({"updated": int(time.time()), "symbols": rows})
+            self._save()
+        self._current.set()
+        logger.info(f"Symbol index refreshed: {len(rows)} symbols")
+
+    def _refresh_async(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            attempt = self._attempt = threading.Event()
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Symbol index refresh failed: {e}")
+                self._failed_at = time.monotonic()
+                # don't retry on every lookup; try again after another period
+                with self._lock:
+                    symbols, by_base, sorted_symbols, _ = self._data
+                    self._data = (symbols, by_base, sorted_symbols,
+                                  time.time() - self.refresh_seconds + min(self.refresh_seconds, 600))
+            finally:
+                self._refreshing = False
+                attempt.set()
+
+        threading.Thread(target=run, name="symbol-index-refresh", daemon=True).start()
+
+    def ensure_current(self, timeout=SYMBOL_INDEX_WAIT_SECONDS):
+        """
+        True once the index holds Binance's own list. While only the bundled
+        snapshot is loaded, start a refresh (unless one failed within
+        REFRESH_RETRY_SECONDS) and wait up to `timeout` for it; False if it
+        hasn't succeeded by then. The snapshot may miss pairs Binance lists,
+        so callers shouldn't reject a pair on it alone.
+        """
+        self._ensure_loaded()
+        if self._current.is_set():
+            return True
+        failed_at = self._failed_at
+        if failed_at is not None and time.monotonic() - failed_at < REFRESH_RETRY_SECONDS:
+            return False
+        self._refresh_async()
+        self._attempt.wait(timeout)
+        return self._current.is_set()
+
+    # ---- lookups ----
+    def get(self, symbol):
+        """SymbolInfo for a normalized symbol, or None if Binance doesn't list it."""
+        return self._ensure_loaded()[0].get(symbol)
+
+    def trading(self, quote):
+        """Every trading pair quoted in `quote`, sorted."""
+        symbols, _, sorted_symbols, _ = self._ensure_loaded()
+        return [s for s in sorted_symbols if symbols[s].quote == quote and symbols[s].status == "TRADING"]
+
+    def quote_assets(self):
+        """Every asset some trading pair is quoted in."""
+        symbols = self._ensure_loaded()[0]
+        return {info.quote for info in symbols.values() if info.status == "TRADING"}
+
+    def suggest(self, text, limit=3):
+        """Up to `limit` trading symbols the user probably meant by `text`."""
+        symbols, by_base, sorted_symbols, _ = self._ensure_loaded()
+        query = normalize_symbol(text)
+        alias = COIN_ALIASES.get(query) or COIN_ALIASES.get(text.strip().replace(" ", ""))
+        found = []
+
+        def add(candidates):
+            for s in candidates:
+                if len(found) < limit and s not in found and symbols[s].status == "TRADING":
+                    found.append(s)
+
+        # a bare coin: "BTC", "bitcoin"
+        add(by_base.get(alias or query, ()))
+        # a name plus a quote: "BITCOINUSDT"
+        for quote in PREFERRED_QUOTES:
+            if query.endswith(quote) and len(query) > len(quote):
+                base = query[:-len(quote)]
+                add([s for s in [COIN_ALIASES.get(base, base) + quote] if s in symbols])
+        # a truncated symbol: "BTCUSD"
+        if query:
+            lo = bisect_left(sorted_symbols, query)
+            hi = bisect_left(sorted_symbols, query + "\x7f")
+            add(sorted(sorted_symbols[lo:hi], key=lambda s: (_quote_rank(symbols[s].quote), len(s)))[:limit])
+        # typos: compare against symbols starting with the same letter only
+        if query and len(found) < limit:
+            lo = bisect_left(sorted_symbols, query[0])
+            hi = bisect_left(sorted_symbols, chr(ord(query[0]) + 1))
+            add(difflib.get_close_matches(query, sorted_symbols[lo:hi], n=limit, cutoff=0.75))
+        return found
+
+    def listed_at(self, symbol, fetch=True):
+        """
+        When the pair's first candle opened on Binance, as a naive UTC datetime.
+        Unknown dates are looked up with a single one-candle request when
+        `fetch` is true, otherwise None is returned.
+        """
+        self._ensure_loaded()
+        if "/" in symbol:
+            # a synthetic pair (cross_rates.py) exists once both legs do
+            from cross_rates import legs
+            dates = [self.listed_at(leg.symbol, fetch) for leg in legs(symbol) if leg is not None]
+            return None if None in dates else max(dates)
+        listed_ms = self._listed.get(symbol)
+        if listed_ms is None and fetch:
+            listed_ms = self._fetch_listing(symbol)
+        return None if listed_ms is None else datetime.utcfromtimestamp(listed_ms / 1000)
+
+    def prefetch_listing(self, symbol):
+        """Look the listing date up in the background so later checks needn't wait."""
+        if "/" in symbol:
+            from cross_rates import legs
+            for leg in legs(symbol):
+                if leg is not None:
+                    self.prefetch_listing(leg.symbol)
+            return
+        if symbol not in self._listed:
+            threading.Thread(
+                target=self._fetch_listing, args=(symbol,), name="symbol-listing", daemon=True
+            ).start()
+
+    def _fetch_listing(self, symbol):
+        from binance_api import _get_json, BINANCE_API_URL, KLINES_WEIGHT
+
+        try:
+            data = _get_json(
+                f"{BINANCE_API_URL}/api/v3/klines",
+                {"symbol": symbol, "interval": "1d", "startTime": 0, "limit": 1},
+                KLINES_WEIGHT, "klines"
+            )
+        except Exception as e:
+            logger.error(f"Could not look up the listing date of {symbol}: {e}")
+            return None
+        if not isinstance(data, list) or not data:
+            return None
+        self._listed[symbol] = int(data[0][0])
+        try:
+            with self._lock:
+                self._save()
+        except OSError as e:
+            logger.warning(f"Could not save the symbol index: {e}")
+        return self._listed[symbol]
+
+# Shared instance used by the bot.
+SYMBOL_INDEX = SymbolIndex()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    # keep the listing dates already in the snapshot
+    index = SymbolIndex(path=SNAPSHOT_FILE, refresh_seconds=float("inf"))
+    index.get("BTCUSDT")
+    index.refresh()
+    print(f"Wrote {SNAPSHOT_FILE}")
@@ -0,0 +1,22 @@
+# conftest.py
+#
+# The bot's modules live at the repository root. Everything they write by
+# default (price store, symbol index, job database, ...) goes to a scratch
+# directory instead of the working tree; modules read these at import time.
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_SCRATCH = tempfile.mkdtemp(prefix="dca-tests-")
+for name, default in (
+    ("PRICE_STORE_DIR", "price_data"),
+    ("SYMBOL_INDEX_FILE", "exchange_info.json"),
+    ("CALC_JOBS_FILE", "calc_jobs.sqlite3"),
+    ("TRACKED_PLANS_FILE", "tracked_plans.json"),
+    ("LEADERBOARD_FILE", "leaderboard.json"),
+    ("PROFILE_DIR", "profiles"),
+):
+    os.environ.setdefault(name, os.path.join(_SCRATCH, default))
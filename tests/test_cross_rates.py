@@ -0,0 +1,55 @@
+# test_cross_rates.py
+#
+# A synthetic SOL/TRY series built from the SOLUSDT and USDTTRY legs on the
+# Binance stub. A join made while a leg could not be fetched is not memoized.
+
+from datetime import datetime
+
+import pytest
+
+import binance_api
+import cross_rates
+from binance_stub import start_stub
+from cross_rates import CrossRates, Leg
+from price_store import PriceStore
+from rate_limit import TokenBucket
+
+START, END = datetime(2025, 1, 1), datetime(2025, 3, 1)
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    server = start_stub()
+    monkeypatch.setattr(binance_api, "BINANCE_API_URL", server.url)
+    monkeypatch.setattr(binance_api, "WEIGHT_LIMITER", TokenBucket(rate=1e9, capacity=1e9))
+    monkeypatch.setattr(binance_api, "PRICE_STORE", PriceStore(str(tmp_path / "price_data")))
+    monkeypatch.setattr(binance_api, "MAX_RETRIES", 0)
+    monkeypatch.setattr(cross_rates, "legs", lambda symbol: (Leg("SOLUSDT", False), Leg("USDTTRY", True)))
+    binance_api.clear_cache()
+    yield server
+    server.shutdown()
+    binance_api.clear_cache()
+
+def test_outage_is_not_memoized(stub, monkeypatch):
+    rates = CrossRates()
+    # nothing listens on the discard port
+    monkeypatch.setattr(binance_api, "BINANCE_API_URL", "http://127.0.0.1:9")
+    assert len(rates.prices("SOL/TRY", START, END)) == 0
+
+    monkeypatch.setattr(binance_api, "BINANCE_API_URL", stub.url)
+    binance_api.clear_cache()
+    prices = rates.prices("SOL/TRY", START, END)
+    assert len(prices) == 60
+
+    # complete and settled: served from memory now
+    requests = stub.request_count
+    assert len(rates.prices("SOL/TRY", datetime(2025, 2, 1), END)) == 29
+    assert stub.request_count == requests
+
+def test_settled_entries_expire(stub):
+    key, start_ms, end_ms = ("SOL/TRY", "1d"), cross_rates.to_ms(START), cross_rates.to_ms(END)
+    rates = CrossRates(ttl_seconds=0)
+    rates.prices("SOL/TRY", START, END)
+    assert rates._get(key, start_ms, end_ms) is not None
+    rates = CrossRates(ttl_seconds=0, settled_seconds=0)
+    rates.prices("SOL/TRY", START, END)
+    assert rates._get(key, start_ms, end_ms) is None
@@ -0,0 +1,79 @@
+# test_import_archives.py
+#
+# Archive import -> price store merge -> get_closing_prices, on two daily
+# BTCUSDT 1h archives a day apart (tests/fixtures, cut from the Binance stub's
+# synthetic series). The day between them has to come from the API.
+
+import os
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import binance_api
+from binance_stub import start_stub, synthetic_klines
+from import_archives import import_archives, iter_chunks, parse_archive_name
+from price_store import PriceStore
+from rate_limit import TokenBucket
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+ARCHIVES = [os.path.join(FIXTURES, name) for name in ("BTCUSDT-1h-2024-01-01.zip", "BTCUSDT-1h-2024-01-03.zip")]
+HOUR_MS = 3_600_000
+JAN_1_MS = 1704067200000
+
+@pytest.fixture
+def store(tmp_path):
+    return PriceStore(str(tmp_path / "price_data"))
+
+@pytest.fixture
+def stub(store, monkeypatch):
+    server = start_stub()
+    monkeypatch.setattr(binance_api, "BINANCE_API_URL", server.url)
+    monkeypatch.setattr(binance_api, "WEIGHT_LIMITER", TokenBucket(rate=1e9, capacity=1e9))
+    monkeypatch.setattr(binance_api, "PRICE_STORE", store)
+    binance_api.clear_cache()
+    binance_api._KNOWN_GAPS.clear()
+    yield server
+    server.shutdown()
+    binance_api.clear_cache()
+
+def test_parse_archive():
+    assert parse_archive_name(ARCHIVES[0]) == ("BTCUSDT", "1h")
+    chunks = list(iter_chunks(ARCHIVES[0], chunk_rows=10))
+    assert [len(c["open_time"]) for c in chunks] == [10, 10, 4]
+    assert chunks[0]["open_time"][0] == JAN_1_MS
+    assert chunks[0]["close"].dtype == np.float64
+
+def test_import_leaves_hole(store):
+    added = import_archives(ARCHIVES, store, workers=1)
+    assert added[("BTCUSDT", "1h")] == 48
+    times = store.columns("BTCUSDT", "1h")["open_time"]
+    assert np.count_nonzero(np.diff(times) != HOUR_MS) == 1
+    # the pyramid is built from what was imported: two whole days
+    assert added[("BTCUSDT", "1d")] == 2
+
+def test_closing_prices_fill_hole(store, stub):
+    import_archives(ARCHIVES, store, workers=1)
+    prices = binance_api.get_closing_prices("BTCUSDT", datetime(2024, 1, 1), datetime(2024, 1, 3, 23), "1h")
+
+    assert len(prices) == 72
+    assert np.all(np.diff(prices.open_times) == HOUR_MS)
+    expected = synthetic_klines("BTCUSDT", "1h", JAN_1_MS, JAN_1_MS + 72 * HOUR_MS - 1, 1000)
+    assert np.allclose(prices.closes, [float(k[4]) for k in expected])
+    assert np.allclose(prices.highs, [float(k[2]) for k in expected])
+
+    # the missing day was written through, so the next request needs no API call
+    assert len(store.columns("BTCUSDT", "1h")["open_time"]) == 72
+    requests = stub.request_count
+    again = binance_api.get_closing_prices("BTCUSDT", datetime(2024, 1, 1), datetime(2024, 1, 3, 23), "1h")
+    assert stub.request_count == requests
+    assert np.array_equal(again.closes, prices.closes)
+
+def test_stream_fills_hole(store, stub):
+    import_archives(ARCHIVES, store, workers=1)
+    chunks = list(binance_api.iter_closing_prices(
+        "BTCUSDT", datetime(2024, 1, 1), datetime(2024, 1, 3, 23), "1h", chunk_rows=16
+    ))
+    open_times = np.concatenate([c.open_times for c in chunks])
+    assert len(open_times) == 72
+    assert np.all(np.diff(open_times) == HOUR_MS)
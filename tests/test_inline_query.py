@@ -0,0 +1,54 @@
+# test_inline_query.py
+#
+# An inline "@bot 1000 BTCUSDT 1y weekly" query through register_handlers on
+# fake_bot.FakeBot, against the Binance stub: the first one is calculated,
+# the same query again is answered from INLINE_ANSWERS.
+
+import pytest
+
+import binance_api
+import commands
+from binance_stub import start_stub
+from data_store import DataStore
+from fake_bot import FakeBot
+from rate_limit import TokenBucket
+
+QUERY = "1000 BTCUSDT 1y weekly"
+USER = 4242
+
+@pytest.fixture
+def bot(monkeypatch):
+    server = start_stub()
+    monkeypatch.setattr(binance_api, "BINANCE_API_URL", server.url)
+    monkeypatch.setattr(binance_api, "WEIGHT_LIMITER", TokenBucket(rate=1e9, capacity=1e9))
+    monkeypatch.setattr(commands, "INLINE_ANSWERS", commands.InlineAnswers())
+    fake = FakeBot()
+    commands.register_handlers(fake, DataStore())
+    fake.stub = server
+    yield fake
+    server.shutdown()
+
+def _count(result):
+    return commands.INLINE_QUERIES._values.get((result,), 0)
+
+def test_repeat_query_is_cached(bot):
+    computed, cached = _count("computed"), _count("cached")
+    assert bot.query(USER, QUERY)
+    kind, titles, _ = bot.wait_for(USER, kinds=("inline",), timeout=30)
+    assert kind == "inline" and len(titles) == 1 and "BTCUSDT" in titles[0]
+    assert _count("computed") == computed + 1
+
+    requests = bot.stub.request_count
+    since = bot.history_len(USER)
+    assert bot.query(USER, QUERY)
+    # a cached answer is sent from the handler itself, without a calculation
+    assert bot.history_len(USER) == since + 1
+    assert bot.sent[USER][-1][1] == titles
+    assert _count("cached") == cached + 1
+    assert _count("computed") == computed + 1
+    assert bot.stub.request_count == requests
+
+def test_invalid_query_gets_help(bot):
+    assert bot.query(USER + 1, "how much")
+    kind, titles, _ = bot.wait_for(USER + 1, kinds=("inline",), timeout=5)
+    assert titles == []
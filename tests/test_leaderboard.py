@@ -0,0 +1,64 @@
+# test_leaderboard.py
+#
+# Leaderboard rebuilds against the Binance stub. A pair that can't be
+# loaded keeps its previous rows, and a rebuild where most pairs failed
+# keeps the whole previous table.
+
+import pytest
+
+import binance_api
+from binance_stub import start_stub
+from leaderboard import Leaderboard
+from price_store import PriceStore
+from rate_limit import TokenBucket
+
+SYMBOLS = ["BTCUSDT", "ETHUSDT"]
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    server = start_stub()
+    monkeypatch.setattr(binance_api, "BINANCE_API_URL", server.url)
+    monkeypatch.setattr(binance_api, "WEIGHT_LIMITER", TokenBucket(rate=1e9, capacity=1e9))
+    monkeypatch.setattr(binance_api, "PRICE_STORE", PriceStore(str(tmp_path / "price_data")))
+    monkeypatch.setattr(binance_api, "MAX_RETRIES", 0)
+    binance_api.clear_cache()
+    yield server
+    server.shutdown()
+    binance_api.clear_cache()
+
+@pytest.fixture
+def board(tmp_path, stub):
+    board = Leaderboard(path=str(tmp_path / "leaderboard.json"), workers=2, weight_reserve=0.0)
+    assert board.rebuild(SYMBOLS) is not None
+    return board
+
+def _symbols(board, label="1y"):
+    return sorted(board._table["periods"][label]["symbol"].tolist())
+
+def test_outage_keeps_table(board, tmp_path, monkeypatch):
+    before = board._table
+    # nothing stored or cached either, as on a fresh deployment
+    monkeypatch.setattr(binance_api, "PRICE_STORE", PriceStore(str(tmp_path / "empty")))
+    binance_api.clear_cache()
+    # nothing listens on the discard port
+    monkeypatch.setattr(binance_api, "BINANCE_API_URL", "http://127.0.0.1:9")
+    assert board.rebuild(SYMBOLS) is None
+    assert board._table is before
+    assert _symbols(Leaderboard(path=board.path)) == SYMBOLS
+
+def test_failed_pair_keeps_rows(board, monkeypatch):
+    before = board._table["periods"]["1y"]
+    load = binance_api.get_closing_prices
+
+    def failing(symbol, *args):
+        if symbol == "ETHUSDT":
+            raise ValueError("unreachable")
+        return load(symbol, *args)
+
+    monkeypatch.setattr("leaderboard.get_closing_prices", failing)
+    monkeypatch.setattr("leaderboard.LEADERBOARD_MAX_FAILED", 0.5)
+    assert board.rebuild(SYMBOLS) is not None
+    after = board._table["periods"]["1y"]
+    assert sorted(after["symbol"].tolist()) == SYMBOLS
+    eth = lambda columns: float(columns["dca_coins"][columns["symbol"].tolist().index("ETHUSDT")])
+    assert eth(after) == eth(before)
@@ -0,0 +1,61 @@
+# test_plan_tracker.py
+#
+# PlanTracker ticks against the Binance stub. A tick during an outage must
+# not move plans past purchases it had no prices for; the next tick, with
+# Binance back, applies them.
+
+from datetime import datetime
+
+import pytest
+
+import binance_api
+from binance_stub import start_stub
+from plan_tracker import PlanTracker
+from price_store import PriceStore
+from rate_limit import TokenBucket
+
+DAY_MS = 86_400_000
+NOW_MS = 1704067200000 + 10 * DAY_MS  # 2024-01-11
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    server = start_stub()
+    monkeypatch.setattr(binance_api, "BINANCE_API_URL", server.url)
+    monkeypatch.setattr(binance_api, "WEIGHT_LIMITER", TokenBucket(rate=1e9, capacity=1e9))
+    monkeypatch.setattr(binance_api, "PRICE_STORE", PriceStore(str(tmp_path / "price_data")))
+    monkeypatch.setattr(binance_api, "MAX_RETRIES", 0)
+    binance_api.clear_cache()
+    yield server
+    server.shutdown()
+    binance_api.clear_cache()
+
+@pytest.fixture
+def tracker(tmp_path):
+    tracker = PlanTracker(path=str(tmp_path / "tracked_plans.json"))
+    tracker.add(1, "BTCUSDT", 100.0, 1, False, datetime(2024, 1, 1))
+    return tracker
+
+def test_failed_fetch_is_retried(stub, tracker, monkeypatch):
+    # nothing listens on the discard port
+    monkeypatch.setattr(binance_api, "BINANCE_API_URL", "http://127.0.0.1:9")
+    assert tracker.tick(NOW_MS) == 0
+    plan, = tracker.plans(1)
+    assert plan["next_ms"] == plan["start_ms"]
+    assert plan["purchases"] == 0
+
+    monkeypatch.setattr(binance_api, "BINANCE_API_URL", stub.url)
+    binance_api.clear_cache()
+    # Jan 1..9 have closed by Jan 11 00:00 (Jan 10 closes at midnight + settle)
+    assert tracker.tick(NOW_MS) == 9
+    plan, = tracker.plans(1)
+    assert plan["purchases"] == 9
+    assert plan["invested"] == 900.0
+    assert plan["next_ms"] == plan["start_ms"] + 9 * DAY_MS
+
+def test_short_series_advances_to_last_candle(stub, tracker, monkeypatch):
+    series = binance_api.get_closing_prices("BTCUSDT", datetime(2024, 1, 1), datetime(2024, 1, 4), "1d")
+    assert len(series) == 4
+    monkeypatch.setattr("plan_tracker.get_closing_prices", lambda *args: series)
+    assert tracker.tick(NOW_MS) == 4
+    plan, = tracker.plans(1)
+    assert plan["next_ms"] == plan["start_ms"] + 4 * DAY_MS
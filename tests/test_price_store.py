@@ -0,0 +1,78 @@
+# test_price_store.py
+#
+# PriceStore merges and rewrites, the derived pyramid, and get_closing_prices
+# writing downloaded candles through to it, against the Binance stub.
+
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import binance_api
+from binance_stub import start_stub
+from price_store import PriceStore
+from rate_limit import TokenBucket
+
+DAY_MS = 86_400_000
+HOUR_MS = 3_600_000
+
+@pytest.fixture
+def store(tmp_path):
+    return PriceStore(str(tmp_path / "price_data"))
+
+def test_out_of_order_merge_rewrites(store):
+    store.merge("BTCUSDT", "1d", [3 * DAY_MS, 4 * DAY_MS], [3.0, 4.0])
+    first = store.columns("BTCUSDT", "1d")
+    # older rows and a corrected close: a new generation
+    assert store.merge("BTCUSDT", "1d", [DAY_MS, 2 * DAY_MS, 4 * DAY_MS], [1.0, 2.0, 40.0]) == 2
+    cols = store.columns("BTCUSDT", "1d")
+    assert cols["open_time"].tolist() == [DAY_MS, 2 * DAY_MS, 3 * DAY_MS, 4 * DAY_MS]
+    assert cols["close"].tolist() == [1.0, 2.0, 3.0, 40.0]
+    # arrays handed out before the rewrite still read the old data
+    assert first["close"].tolist() == [3.0, 4.0]
+
+def test_maps_follow_meta(store):
+    for day in range(20, 0, -1):
+        store.merge("BTCUSDT", "1d", [day * DAY_MS], [float(day)])
+        store.columns("BTCUSDT", "1d")
+    store.merge("ETHUSDT", "1d", [DAY_MS], [1.0])
+    store.columns("ETHUSDT", "1d")
+    # one cached map set per series, not one per generation or row count
+    assert len(store._maps) == 2
+    assert len(store.columns("BTCUSDT", "1d")["close"]) == 20
+
+def _hours(first_day, days):
+    times = np.arange(first_day * 24, (first_day + days) * 24) * HOUR_MS
+    return times, np.arange(len(times), dtype=np.float64)
+
+def test_pyramid_fills_hole(store):
+    # days 0-9 and 20-29 first, the days between imported later
+    for first_day in (0, 20):
+        store.merge("BTCUSDT", "1h", *_hours(first_day, 10))
+    store.refresh_pyramid("BTCUSDT")
+    assert len(store.columns("BTCUSDT", "1d")["open_time"]) == 20
+
+    store.merge("BTCUSDT", "1h", *_hours(10, 10))
+    assert store.refresh_pyramid("BTCUSDT")["1d"] == 10
+    days = store.columns("BTCUSDT", "1d")["open_time"]
+    assert days.tolist() == [day * DAY_MS for day in range(30)]
+    assert len(store.columns("BTCUSDT", "4h")["open_time"]) == 30 * 6
+
+def test_download_written_through(store, monkeypatch):
+    server = start_stub()
+    monkeypatch.setattr(binance_api, "BINANCE_API_URL", server.url)
+    monkeypatch.setattr(binance_api, "WEIGHT_LIMITER", TokenBucket(rate=1e9, capacity=1e9))
+    monkeypatch.setattr(binance_api, "PRICE_STORE", store)
+    binance_api.clear_cache()
+    try:
+        # the range ends at a candle's open time, as plan ranges usually do
+        prices = binance_api.get_closing_prices("BTCUSDT", datetime(2024, 1, 1), datetime(2024, 3, 1), "1d")
+        assert len(prices) == 61
+        assert store.coverage("BTCUSDT", "1d") == (int(prices.open_times[0]), int(prices.open_times[-1]))
+        requests = server.request_count
+        again = binance_api.get_closing_prices("BTCUSDT", datetime(2024, 1, 1), datetime(2024, 3, 1), "1d")
+        assert server.request_count == requests
+        assert np.array_equal(again.closes, prices.closes)
+    finally:
+        server.shutdown()
+        binance_api.clear_cache()
@@ -0,0 +1,33 @@
+# test_profiler.py
+#
+# A profiled calculation is labelled with the plan it computes: the job's
+# saved session, not the chat's live one.
+
+import contextlib
+
+import commands
+from data_store import DataStore
+from job_queue import JobQueue
+
+def test_label_from_job(tmp_path, monkeypatch):
+    jobs = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(commands, "JOBS", jobs)
+    store = DataStore()
+    session = store.get_session(1)
+    session.symbol, session.period_str = "ETHUSDT", "1 year"
+    job_id = jobs.add("1:1", 1, session.snapshot())
+    # the chat moved on before the job ran
+    session.symbol = "BTCUSDT"
+
+    labels = []
+
+    @contextlib.contextmanager
+    def profile(label, notify_chat=None):
+        labels.append(label)
+        yield None
+
+    monkeypatch.setattr(commands.PROFILER, "profile", profile)
+    monkeypatch.setattr(commands.PROFILER, "arm", lambda *args: None)
+    monkeypatch.setattr(commands, "run_calculation", lambda *args: None)
+    commands.run_profiled_calculation(None, store, 1, job_id, None)
+    assert labels == ["ETHUSDT 1d 1 year (chat 1)"]